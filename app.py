@@ -2,40 +2,90 @@
 Command-line calculator with REPL functionality, 
 supporting arithmetic operations, 
 plugins, and logging.
+Commands can also be streamed non-interactively (script mode) through a
+parse -> dispatch -> write generator pipeline with buffered output.
+In the REPL, plugin commands run in a commands.pool.PluginPool with a timeout; a
+trailing "&" runs one in the background, and jobs / wait ID / cancel ID manage them.
+With HISTORY_AUTOSAVE set, a calculator.autosave.Autosaver writes the history in the
+background and once more on exit.
 """
+import concurrent.futures
+import contextlib
+import io
 import logging
 import logging.config
 import os
 import sys
+import time
+from collections.abc import Iterator
+import orjson  # Third-party import
 from dotenv import load_dotenv  # Third-party import
+from async_logging import async_logging_settings, enable_async_logging, stop_async_logging  # First-party import
 from calculator import Calculator  # First-party import
-from commands import CommandsFactory  # First-party import
+from calculator.autosave import Autosaver  # First-party import
+from commands import ArgumentError, CommandsFactory, OperationCommand  # First-party import
+from instrumentation import METRICS  # First-party import
 
 class App:
     """Main application class for the command-line calculator with REPL functionality."""    
-    def __init__(self):
-        os.makedirs('logs', exist_ok=True)  # Ensure 'logs' directory exists
-        self.configure_logging()  # Set up logging
-        load_dotenv()  # Load environment variables from a .env file
-        self.settings = self.load_environment_variables()
-        self.calculator = Calculator()  # Initialize calculator instance
-        self.command_handler = CommandsFactory()  # Initialize command handler for plugins
+    def __init__(self, script_mode=False):
+        self.startup_timings = []  # (phase, seconds) pairs, reported by --startup-profile
+        self.script_mode = script_mode
+        self.plugins_loaded = False
+        self._plugin_pool = None  # Created on the first plugin command
+        self.autosaver = None  # Background history writer, started with the REPL
+        self._background_jobs = []  # Jobs started with "&" whose output has not been shown
+        with self.startup_phase("dotenv"):
+            load_dotenv()  # Load environment variables from a .env file (may select LOG_ASYNC)
+        with self.startup_phase("logging"):
+            os.makedirs('logs', exist_ok=True)  # Ensure 'logs' directory exists
+            self.configure_logging()  # Set up logging
+        with self.startup_phase("environment"):
+            self.settings = self.load_environment_variables()
+        with self.startup_phase("calculator"):
+            self.calculator = Calculator()  # Initialize calculator instance; history loads on first use
+        with self.startup_phase("command handler"):
+            self.command_handler = CommandsFactory()  # Initialize command handler for plugins
+            self.command_handler.register_commands(self.calculator.commands)
+
+    @contextlib.contextmanager
+    def startup_phase(self, phase):
+        """Record how long the wrapped startup phase takes."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.startup_timings.append((phase, time.perf_counter() - started))
 
     def configure_logging(self):
         """Configure logging settings from a file or set basic configuration."""
         logging_conf_path = 'logging.conf'
+        stop_async_logging()  # Hand any queued handlers back before they are reconfigured
         if os.path.exists(logging_conf_path):
             logging.config.fileConfig(logging_conf_path, disable_existing_loggers=False)
         else:
             # Default logging configuration
             logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+        if self.script_mode:
+            self.quiet_console_logging()
+        async_enabled, batch_size = async_logging_settings(logging_conf_path)
+        if async_enabled:
+            enable_async_logging(batch_size=batch_size)
         logging.info("Logging configured.")
 
+    @staticmethod
+    def quiet_console_logging():
+        """Keep stdout for command results: move console logging to stderr, warnings and up."""
+        root_logger = logging.getLogger()
+        for handler in root_logger.handlers:
+            if isinstance(handler, logging.StreamHandler) and handler.stream is sys.stdout:
+                handler.setStream(sys.stderr)
+        root_logger.setLevel(logging.WARNING)
+
     def load_environment_variables(self):
-        """Load and return environment variables as a dictionary."""
-        settings = {key: value for key, value in os.environ.items()}
+        """Return the environment variables as a live mapping (os.environ, not a copy)."""
         logging.info("Environment variables loaded.")
-        return settings
+        return os.environ
 
     def get_environment_variable(self, env_var: str = 'ENVIRONMENT'):
         """Return the value of the specified environment variable."""
@@ -45,71 +95,264 @@ class App:
         """Run the Read-Eval-Print Loop (REPL) for user input and command processing."""
         while True:
             try:
+                self.report_background_jobs()
                 user_input = input(">>> ").strip()
                 if not user_input:  # Skip empty input
                     logging.warning("No command entered.")
                     continue
 
+                parse_started = time.perf_counter()
                 user_input_parts = user_input.split()
                 operation = user_input_parts[0]
                 arguments = user_input_parts[1:]
+                parse_seconds = time.perf_counter() - parse_started
 
                 # Handle 'exit' and 'menu' commands
                 if operation.lower() == 'exit':
                     logging.info("Exiting the calculator.")
                     print("Exiting the calculator.")
+                    self.shutdown()
                     sys.exit(0)
                 if operation.lower() == 'menu':
                     self.show_menu()
                     continue
+                if operation == 'stats':
+                    print(self.stats_command(*arguments))
+                    continue
+                if operation in ('jobs', 'wait', 'cancel'):
+                    self.jobs_command(operation, *arguments)
+                    continue
 
-                # Check for valid arithmetic and history commands
-                if operation in self.get_supported_commands():
-                    result = self.calculator.execute(operation, *arguments)
-                    if result is not None:
-                        print(f"Result: {result}")
-                # Handle plugin commands
-                elif operation in self.command_handler.commands:
-                    self.execute_plugin_command(operation, *arguments)
-                else:
+                # Arithmetic, history and plugin commands share one registry
+                command = self.command_handler.commands.get(operation)
+                if command is None:
                     logging.error("Unknown command: %s", operation)
                     print(f"No such command: unknown_command")
+                    continue
+                METRICS.record(operation, "parse", parse_seconds)
+                with METRICS.command(operation), METRICS.phase("execute"):
+                    if isinstance(command, OperationCommand):
+                        result = command.execute(*arguments)
+                        if isinstance(result, Iterator):  # Streamed output such as history rows
+                            for line in result:
+                                print(line)
+                        elif result is not None:
+                            print(f"Result: {result}")
+                    else:
+                        self.execute_plugin_command(operation, *arguments)
 
+            except ArgumentError as e:
+                logging.error("%s", e)
+                print(f"Error: {e}")
             except Exception as e:
                 logging.error("Unexpected error: %s", e)
                 print(f"An unexpected error occurred: {e}")
 
+    def shutdown(self):
+        """Write pending history, stop plugin workers and flush queued log records before exiting."""
+        if self.autosaver is not None:
+            self.autosaver.stop()
+            self.autosaver = None
+        if self._plugin_pool is not None:
+            self._plugin_pool.shutdown()
+            self._plugin_pool = None
+        stop_async_logging()
+
     def show_menu(self):
         """Display available commands to the user."""
-        available_commands = self.get_supported_commands() + self.command_handler.all_plugins()
+        available_commands = (self.get_supported_commands() + ['stats', 'jobs', 'wait', 'cancel']
+                              + self.command_handler.all_plugins())
         print("Available commands:")
         for cmd in available_commands:
             print(f" - {cmd}")
         logging.info("Displayed available commands.")
 
     def get_supported_commands(self):
-        """Return a list of supported arithmetic and history commands."""
-        return ['add', 'subtract', 'multiply', 'divide', 'save_history', 'load_history', 'clear_history', 'delete_history_record']
+        """Return the names of the calculator's arithmetic and history commands."""
+        return list(self.calculator.commands)
+
+    @staticmethod
+    def stats_command(*arguments):
+        """Show per-command latency statistics and plugin cache hits, or `export [FILE]` / `reset` them."""
+        if not arguments:
+            return METRICS.report() + "\n" + CommandsFactory().cache.report()
+        if arguments[0] == "export" and len(arguments) <= 2:
+            return f"Command stats exported to {METRICS.export(*arguments[1:2])}."
+        if arguments == ("reset",):
+            METRICS.reset()
+            return "Command stats reset."
+        return "Usage: stats [export [FILE] | reset]"
+
+    @property
+    def plugin_pool(self):
+        """Return the plugin worker pool, configured by the PLUGIN_* settings on first use."""
+        if self._plugin_pool is None:
+            from commands.pool import PluginPool  # pylint: disable=import-outside-toplevel
+            self._plugin_pool = PluginPool.from_environment(self.command_handler)
+        return self._plugin_pool
 
     def execute_plugin_command(self, operation, *arguments):
-        """Execute a plugin command."""
+        """Execute a plugin command in the worker pool; a trailing "&" runs it in the background."""
+        background = arguments[-1:] == ("&",)
+        if background:
+            arguments = arguments[:-1]
         try:
-            self.command_handler.commands[operation].execute(*arguments)
+            job = self.plugin_pool.submit(operation, *arguments)
+            if background:
+                self._background_jobs.append(job)
+                print(f"[{job.id}] {operation} running in the background.")
+                return
+            self.wait_for_job(job)
             logging.info("Executed plugin command: %s", operation)
         except Exception as e:
             logging.error("Error executing command '%s': %s", operation, e)
             print(f"Error: Failed to execute '{operation}'. {e}")
 
-    def start(self):
-        """Initialize the calculator, load plugins, and start the REPL."""
-        plugin_file_path = os.getenv("PLUGIN_FILE_PATH")
-        if plugin_file_path:
-            self.command_handler.import_plugins(plugin_file_path)
-            logging.info("Plugins loaded from: %s", plugin_file_path)
+    def wait_for_job(self, job):
+        """Print a job's output once it finishes; Ctrl-C cancels it instead of leaving the REPL."""
+        try:
+            print(job.future.result(), end="")
+        except KeyboardInterrupt:
+            self.plugin_pool.cancel(job)
+            print(f"\n[{job.id}] {job.name} cancelled.")
+        except concurrent.futures.CancelledError:
+            print(f"[{job.id}] {job.name} cancelled.")
+
+    def report_background_jobs(self):
+        """Print the output of background jobs that finished since the last prompt."""
+        for job in [job for job in self._background_jobs if job.future.done()]:
+            self._background_jobs.remove(job)
+            print(f"[{job.id}] {job.status}: {' '.join((job.name,) + job.args)}")
+            if job.status == "done":
+                print(job.future.result(), end="")
+            elif not job.future.cancelled():
+                print(f"Error: {job.future.exception()}")
+
+    def jobs_command(self, operation, *arguments):
+        """List plugin jobs, wait for one to finish, or cancel one."""
+        if operation == 'jobs':
+            jobs = self._plugin_pool.jobs.values() if self._plugin_pool else []
+            print("\n".join(job.describe() for job in jobs) or "No plugin jobs.")
+            return
+        job = self._plugin_pool.jobs.get(int(arguments[0])) if self._plugin_pool and \
+            len(arguments) == 1 and arguments[0].isdigit() else None
+        if job is None:
+            print(f"Usage: {operation} JOB_ID (see 'jobs')")
+        elif operation == 'wait':
+            if job in self._background_jobs:
+                self._background_jobs.remove(job)
+            try:
+                self.wait_for_job(job)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                print(f"Error: {e}")
         else:
-            logging.warning("No plugin file path specified in environment variables.")
+            print(f"[{job.id}] {job.name} cancelled." if self.plugin_pool.cancel(job)
+                  else f"[{job.id}] {job.name} already finished.")
+
+    @staticmethod
+    def parse_commands(lines):
+        """Yield (line number, operation, arguments) for each non-blank, non-comment line."""
+        for line_number, line in enumerate(lines, 1):
+            parts = line.split()
+            if parts and not parts[0].startswith("#"):
+                yield line_number, parts[0], parts[1:]
+
+    def dispatch_commands(self, commands):
+        """Execute parsed commands and yield one result record per command."""
+        for line_number, operation, arguments in commands:
+            if operation.lower() == 'exit':
+                return
+            record = {"line": line_number, "command": operation}
+            command = self.command_handler.commands.get(operation)
+            try:
+                if operation == 'stats':
+                    record["output"] = self.stats_command(*arguments) + "\n"
+                elif command is None:
+                    record["error"] = f"No such command: {operation}"
+                elif isinstance(command, OperationCommand):
+                    with METRICS.command(operation), METRICS.phase("execute"):
+                        result = command.execute(*arguments)
+                    record["lines" if isinstance(result, Iterator) else "result"] = result
+                else:
+                    plugin_output = io.StringIO()
+                    with METRICS.command(operation), METRICS.phase("execute"), \
+                            contextlib.redirect_stdout(plugin_output):
+                        self.command_handler.execute_command(operation, *arguments)
+                    record["output"] = plugin_output.getvalue()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                record["error"] = str(e)
+            yield record
+
+    @staticmethod
+    def format_records(records, json_lines=False):
+        """Yield the output text for each result record, as plain text or JSON lines.
+
+        A record's "lines" (e.g. history rows) are written one at a time as they are rendered.
+        """
+        for record in records:
+            if json_lines:
+                if "lines" in record:
+                    record["lines"] = list(record["lines"])
+                yield orjson.dumps(record, option=orjson.OPT_SERIALIZE_NUMPY).decode() + "\n"
+            elif "error" in record:
+                yield f"Error: {record['error']}\n"
+            elif "lines" in record:
+                yield from (f"{line}\n" for line in record["lines"])
+            elif "output" in record:
+                yield record["output"]
+            elif record.get("result") is not None:
+                yield f"Result: {record['result']}\n"
 
+    @staticmethod
+    def write_buffered(chunks, output, buffer_size=1024):
+        """Write text chunks to output in batches of buffer_size instead of one write each."""
+        pending = []
+        for chunk in chunks:
+            pending.append(chunk)
+            if len(pending) >= buffer_size:
+                output.write("".join(pending))
+                pending.clear()
+        output.write("".join(pending))
+        output.flush()
+
+    def run_script(self, lines, output=None, json_lines=False):
+        """Stream commands from an iterable of lines without prompting (script mode)."""
+        output = output if output is not None else sys.stdout
+        self.calculator.echo = False
+        records = self.dispatch_commands(self.parse_commands(lines))
+        self.write_buffered(self.format_records(records, json_lines), output)
+
+    def load_plugins(self):
+        """Load plugins from the directory named by PLUGIN_FILE_PATH (once)."""
+        if self.plugins_loaded:
+            return
+        with self.startup_phase("plugins"):
+            plugin_file_path = os.getenv("PLUGIN_FILE_PATH")
+            if plugin_file_path:
+                self.command_handler.import_plugins(plugin_file_path)
+                logging.info("Plugins loaded from: %s", plugin_file_path)
+            else:
+                logging.warning("No plugin file path specified in environment variables.")
+        self.plugins_loaded = True
+
+    def startup_report(self):
+        """Return a table of startup phase timings."""
+        lines = [f"{phase:<16}{seconds * 1000:9.2f} ms" for phase, seconds in self.startup_timings]
+        total = sum(seconds for _, seconds in self.startup_timings)
+        lines.append(f"{'total':<16}{total * 1000:9.2f} ms")
+        lines.append(f"pandas loaded: {'yes' if 'pandas' in sys.modules else 'no'}")
+        return "\n".join(lines)
+
+    def start(self):
+        """Initialize the calculator, load plugins, and start the REPL."""
+        self.load_plugins()
         logging.info("Calculator REPL started.")
         logging.info("Type 'exit' to exit.")
         logging.info("Type 'menu' to get available commands.")
-        self.repl()
+        self.autosaver = Autosaver.from_environment(self.calculator.data_frame_facade)
+        if self.autosaver is not None:
+            self.autosaver.start()
+        try:
+            self.repl()
+        finally:
+            self.shutdown()  # Also on Ctrl-C or end of input
@@ -0,0 +1,113 @@
+"""
+async_logging module
+This module moves log I/O off the calling thread. Handlers configured on a logger
+(normally the root logger set up from logging.conf) are replaced by a single
+QueueHandler, and a BatchingQueueListener thread drains the queue and writes the
+records to the original handlers, joining each batch into one write and one flush
+per stream handler. Asynchronous mode is selected with the [async] section of
+logging.conf or the LOG_ASYNC environment variable.
+"""
+import atexit
+import configparser
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+
+DEFAULT_BATCH_SIZE = 256
+_active = None  # (logger, queue handler, listener) while asynchronous logging is enabled
+
+class BatchingQueueListener:
+    """Background thread that drains queued log records and emits them in batches."""
+    _sentinel = None
+
+    def __init__(self, log_queue, handlers, batch_size=DEFAULT_BATCH_SIZE):
+        self.queue = log_queue
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self._thread = None
+
+    def start(self):
+        """Start the listener thread."""
+        self._thread = threading.Thread(target=self._run, name="log-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Flush every queued record, then stop the listener thread."""
+        if self._thread is not None:
+            self.queue.put(self._sentinel)
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        """Collect up to batch_size records at a time and emit them until stopped."""
+        while True:
+            batch = [self.queue.get()]
+            while batch[-1] is not self._sentinel and len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = batch[-1] is self._sentinel
+            self.emit_batch(batch[:-1] if stopping else batch)
+            if stopping:
+                return
+
+    def emit_batch(self, records):
+        """Emit records to each handler, with one write and flush per stream handler."""
+        for handler in self.handlers:
+            accepted = [record for record in records
+                        if record.levelno >= handler.level and handler.filter(record)]
+            if not accepted:
+                continue
+            if not isinstance(handler, logging.StreamHandler) or handler.stream is None:
+                for record in accepted:
+                    handler.handle(record)
+                continue
+            with handler.lock:
+                try:
+                    handler.stream.write("".join(handler.format(record) + handler.terminator
+                                                 for record in accepted))
+                    handler.flush()
+                except Exception:  # pylint: disable=broad-exception-caught
+                    handler.handleError(accepted[0])
+
+def async_logging_settings(config_path="logging.conf"):
+    """Return (enabled, batch_size) from logging.conf's [async] section and LOG_ASYNC."""
+    parser = configparser.ConfigParser(interpolation=None)
+    parser.read(config_path)
+    enabled = parser.getboolean("async", "enabled", fallback=False)
+    batch_size = parser.getint("async", "batch_size", fallback=DEFAULT_BATCH_SIZE)
+    if os.getenv("LOG_ASYNC"):
+        enabled = os.getenv("LOG_ASYNC").strip().lower() in ("1", "true", "yes", "on")
+    return enabled, batch_size
+
+def enable_async_logging(logger=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Route the logger's handlers through a queue and a batching listener thread."""
+    global _active  # pylint: disable=global-statement
+    stop_async_logging()
+    logger = logger or logging.getLogger()
+    handlers = list(logger.handlers)
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    for handler in handlers:
+        logger.removeHandler(handler)
+    logger.addHandler(queue_handler)
+    listener = BatchingQueueListener(log_queue, handlers, batch_size)
+    listener.start()
+    _active = (logger, queue_handler, listener)
+    return listener
+
+def stop_async_logging():
+    """Flush and stop the active listener, giving its handlers back to the logger."""
+    global _active  # pylint: disable=global-statement
+    if _active is not None:
+        logger, queue_handler, listener = _active
+        _active = None
+        logger.removeHandler(queue_handler)
+        listener.stop()
+        for handler in listener.handlers:
+            logger.addHandler(handler)
+
+atexit.register(stop_async_logging)
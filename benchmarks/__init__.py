@@ -0,0 +1,74 @@
+"""
+benchmarks package
+Microbenchmarks for the calculator, history and plugin hot paths.
+
+A benchmark is a function registered with @benchmark(name) that does its setup and
+returns a zero-argument callable; only that callable is timed. Each benchmark runs
+`repeat` times with fresh setup and the fastest run is kept, which filters out most
+scheduling noise. Results can be stored as a baseline (benchmarks/baseline.json) and
+later runs compared against it, flagging anything slower by more than a threshold.
+
+    python -m benchmarks                    # run everything and print the timings
+    python -m benchmarks --save             # store the timings as the new baseline
+    python -m benchmarks --compare          # exit 1 if anything regressed by > 20%
+"""
+import json
+import platform
+import time
+
+BASELINE_FILE = "benchmarks/baseline.json"
+DEFAULT_THRESHOLD = 0.2  # 20% slower than the baseline counts as a regression
+REGISTRY = {}  # name -> setup function returning the callable to time
+
+def benchmark(name):
+    """Register a setup function under `name`."""
+    def register(setup):
+        REGISTRY[name] = setup
+        return setup
+    return register
+
+def measure(setup, repeat=3):
+    """Return the fastest of `repeat` timed runs, each after a fresh setup."""
+    best = float("inf")
+    for _ in range(repeat):
+        timed = setup()
+        started = time.perf_counter()
+        timed()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def run_benchmarks(pattern="", repeat=3, report=None):
+    """Run every registered benchmark whose name contains `pattern`; return name -> seconds."""
+    results = {}
+    for name, setup in REGISTRY.items():
+        if pattern in name:
+            results[name] = measure(setup, repeat)
+            if report is not None:
+                report(name, results[name])
+    return results
+
+def save_baseline(results, path=BASELINE_FILE):
+    """Store results, merged into any existing baseline, along with the machine they came from."""
+    baseline = load_baseline(path)
+    baseline.update(results)
+    with open(path, "w", encoding="utf-8") as baseline_file:
+        json.dump({"machine": platform.platform(), "python": platform.python_version(),
+                   "results": dict(sorted(baseline.items()))}, baseline_file, indent=2)
+        baseline_file.write("\n")
+
+def load_baseline(path=BASELINE_FILE):
+    """Return the stored name -> seconds baseline, or an empty one."""
+    try:
+        with open(path, encoding="utf-8") as baseline_file:
+            return json.load(baseline_file)["results"]
+    except (OSError, ValueError, KeyError):
+        return {}
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Return (name, baseline seconds, seconds, ratio, regressed) for results with a baseline."""
+    rows = []
+    for name, seconds in results.items():
+        if name in baseline:
+            ratio = seconds / baseline[name] if baseline[name] else float("inf")
+            rows.append((name, baseline[name], seconds, ratio, ratio > 1 + threshold))
+    return rows
@@ -0,0 +1,45 @@
+"""Run the benchmark suite: python -m benchmarks [--filter TEXT] [--save | --compare]."""
+import argparse
+import shutil
+import sys
+from benchmarks import (BASELINE_FILE, DEFAULT_THRESHOLD, compare, load_baseline,
+                        run_benchmarks, save_baseline)
+from benchmarks import cases
+
+def parse_arguments(argv=None):
+    """Parse command-line options."""
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__)
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains TEXT")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark; the fastest is kept")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="baseline file to save or compare with")
+    parser.add_argument("--save", action="store_true", help="store the results as the baseline")
+    parser.add_argument("--compare", action="store_true",
+                        help="compare with the baseline and exit 1 on a regression")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="slowdown fraction that counts as a regression (default 0.2)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Run the selected benchmarks, then save or compare the results."""
+    args = parse_arguments(argv)
+    try:
+        results = run_benchmarks(args.filter, args.repeat,
+                                 report=lambda name, seconds: print(f"{name:<36}{seconds * 1000:12.2f} ms"))
+    finally:
+        shutil.rmtree(cases.WORKDIR, ignore_errors=True)
+    if args.save:
+        save_baseline(results, args.baseline)
+        print(f"Baseline saved to {args.baseline}.")
+    if args.compare:
+        rows = compare(results, load_baseline(args.baseline), args.threshold)
+        print(f"\n{'benchmark':<36}{'baseline':>12}{'current':>12}{'change':>9}")
+        for name, baseline, seconds, ratio, regressed in rows:
+            print(f"{name:<36}{baseline * 1000:10.2f}ms{seconds * 1000:10.2f}ms{ratio - 1:+9.0%}"
+                  + ("  REGRESSION" if regressed else ""))
+        regressions = sum(row[-1] for row in rows)
+        print(f"{regressions} regression(s) beyond {args.threshold:.0%}.")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""The benchmark cases, registered with benchmarks.benchmark when this module is imported."""
+import contextlib
+import glob
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import numpy as np
+from benchmarks import benchmark
+from calculator import Calculator, DataFrameFacade
+from commands import PLUGIN_MANIFEST, CommandsFactory
+
+WORKDIR = tempfile.mkdtemp(prefix="calc-bench-")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CSV_ROWS = 500_000
+
+def fresh_facade(name, rows=0):
+    """Return a facade over a new history file in the scratch directory, with `rows` saved records."""
+    path = os.path.join(WORKDIR, name)
+    for stale in glob.glob(f"{os.path.splitext(path)[0]}.*"):  # The log, its lock and its segments
+        os.remove(stale)
+    facade = DataFrameFacade(path)
+    if rows:
+        values = np.arange(rows, dtype=np.float64)
+        facade.add_entries("add", values, values, 2 * values)
+        facade.save_history()
+    return facade
+
+def quiet_calculator():
+    """Return a calculator that does not print and keeps its history in the scratch directory."""
+    calculator = Calculator()
+    calculator.echo = False
+    calculator.data_frame_facade = fresh_facade("execute.csv")
+    return calculator
+
+@benchmark("calculator.execute[10k]")
+def execute_dispatch():
+    """Dispatch 10,000 arithmetic commands through Calculator.execute."""
+    calculator = quiet_calculator()
+    return lambda: [calculator.execute("multiply", "6", "7") for _ in range(10_000)]
+
+def add_entries(rows):
+    """Return a setup that appends `rows` records one add_entry call at a time."""
+    def setup():
+        facade = fresh_facade("add_entry.csv")
+        facade.history  # pylint: disable=pointless-statement  # Load before timing
+        return lambda: [facade.add_entry("add", i, i, 2 * i) for i in range(rows)]
+    return setup
+
+for _rows, _label in ((1_000, "1k"), (100_000, "100k"), (1_000_000, "1M")):
+    benchmark(f"history.add_entry[{_label}]")(add_entries(_rows))
+
+@benchmark("history.save[100k]")
+def save_history():
+    """Append 100,000 unsaved records to a new log."""
+    facade = fresh_facade("save.csv")
+    values = np.arange(100_000, dtype=np.float64)
+    facade.add_entries("multiply", values, values, values * values)
+    return facade.save_history
+
+@benchmark("history.load[100k]")
+def load_history():
+    """Replay a 100,000-record log."""
+    fresh_facade("load.csv", rows=100_000)
+    return lambda: DataFrameFacade(os.path.join(WORKDIR, "load.csv")).history
+
+@benchmark("history.delete_entry[100x100k]")
+def delete_entries():
+    """Delete 100 saved records from the front of a 100,000-record history."""
+    facade = fresh_facade("delete.csv", rows=100_000)
+    facade.compact_ratio = 1.0  # Time the deletes themselves, not a compaction
+    return lambda: [facade.delete_entry(0) for _ in range(100)]
+
+@benchmark("history.rotate[100k]")
+def rotate_history():
+    """Compress a 100,000-record active log into a segment."""
+    facade = fresh_facade("rotate.csv", rows=100_000)
+    return facade.rotate_history
+
+@benchmark("history.page_archived[100k]")
+def page_archived():
+    """Read one page from the middle of a rotated 100,000-record history."""
+    fresh_facade("archived.csv", rows=100_000).rotate_history()
+    return lambda: DataFrameFacade(os.path.join(WORKDIR, "archived.csv")).recent_records(20, skip=50_000)
+
+@benchmark("plugins.import_plugins")
+def import_plugins():
+    """Discover the bundled plugins without a cached manifest."""
+    manifest = os.path.join(ROOT, "plugins", PLUGIN_MANIFEST)
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(manifest)
+    return lambda: CommandsFactory().import_plugins(os.path.join(ROOT, "plugins"))
+
+def product_file():
+    """Return the path of a generated CSV_ROWS-row products file, creating it once."""
+    path = os.path.join(WORKDIR, "products.csv")
+    if not os.path.exists(path):
+        rng = np.random.default_rng(0)
+        with open(path, "w", encoding="utf-8") as products:
+            products.write("ProductID,ProductName,Category,Price,Stock\n")
+            for product_id, category, price, stock in zip(
+                    range(CSV_ROWS), rng.integers(0, 8, CSV_ROWS),
+                    rng.uniform(1, 100, CSV_ROWS).round(2), rng.integers(0, 500, CSV_ROWS)):
+                products.write(f"{product_id},Item {product_id},Category{category},{price},{stock}\n")
+    return path
+
+def csv_command(*args):
+    """Return a setup that runs the csv plugin on the generated file with its cache cleared."""
+    def setup():
+        from plugins.csv import Csv  # pylint: disable=import-outside-toplevel
+        os.environ["PRODUCT_FILE_PATH"] = product_file()
+        Csv._cache.clear()  # pylint: disable=protected-access
+        def run():
+            with contextlib.redirect_stdout(io.StringIO()):
+                Csv.execute(*args)
+        return run
+    return setup
+
+benchmark("plugins.csv.page[500k]")(csv_command("page", "2"))
+benchmark("plugins.csv.group_sum[500k]")(csv_command("group", "Category", "sum", "Price*Stock"))
+
+@benchmark("app.cold_start")
+def cold_start():
+    """Start a new interpreter that runs an empty script and exits."""
+    command = [sys.executable, "main.py", "--script", "-"]
+    return lambda: subprocess.run(command, cwd=ROOT, input=b"", check=True, capture_output=True)
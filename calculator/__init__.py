@@ -1,157 +1,541 @@
 """
 calculator module
 This module provides a calculator class that performs basic arithmetic operations
-and manages a history of calculations using a Pandas DataFrame. The history can 
-be saved to and loaded from a CSV file, and users can view, clear, or delete 
+and manages a history of calculations as typed records (see calculator.history).
+The history is persisted to an append-only CSV log, and users can view, clear, or delete 
 specific records from the history.
 """
+import itertools
 import logging
-import os
-import pandas as pd
-from commands import Command
+import math
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+import numpy as np
+from commands import ArgumentError, Command, operation, operation_commands
+from instrumentation import METRICS
+from calculator.expression import compile_expression
+from calculator.backends import default_history_file, open_history_store
+from calculator.history import (DIVIDE_BY_ZERO, LOG_COLUMNS, NOT_REAL, OPERATION_CODES, TOO_LARGE, HistoryBuffer,
+                                HistoryStats, combine_summaries, format_summary, iter_rendered, power_errors,
+                                records_to_frame, render_entry, window_summary)
+
+DEFAULT_HISTORY_ROWS = 20  # Rows shown by "history" and "history tail" without a count
+HISTORY_USAGE = "Usage: history [tail [N] | page K [SIZE] | range FROM TO]"
+HISTORY_STATS_USAGE = "Usage: history_stats [SECONDS | FROM TO]"
+
+BatchResult = namedtuple("BatchResult", ["results", "invalid"])
+PendingChanges = namedtuple("PendingChanges", ["clear", "deletes", "records", "ids"])
 
 class Calculator(Command):
     """The main calculator class that performs basic arithmetic operations and manages plugins."""
     def __init__(self):
-        self.data_frame_facade = DataFrameFacade()    
+        self.data_frame_facade = DataFrameFacade(default_history_file())
+        self.echo = True  # Print entries and errors; script mode turns this off
+        self.last_result = 0.0  # Available to expressions as "_"
+        self.commands = operation_commands(self)  # name -> OperationCommand, see @operation
+    def _echo(self, text):
+        """Print text for interactive use unless echo is disabled."""
+        if self.echo:
+            print(text)
     def execute(self, operation, *args):
-        """Execute a specific operation based on the command provided."""
-        if operation in ['save_history', 'load_history', 'clear_history', 'delete_history_record']:
-                if operation == "save_history":
-                    return self.save_history()
-                if operation == "load_history":
-                    return self.load_history()
-                if operation == "clear_history":
-                    return self.clear_history()
-                if operation == "delete_history_record":
-                    print("delete_history_record")
-                    if len(args) == 1 and args[0].isdigit():
-                        return self.delete_history_record(int(args[0]))
-                    logging.error("Invalid index provided for delete_history_record.")
-        if len(args) != 2:
-             logging.error("please enter 2 arguments ")             
+        """Execute a registered operation: one dictionary lookup, then its argument schema."""
+        command = self.commands.get(operation)
+        if command is None:
+            logging.error("Unknown operation: %s", operation)
+            return None
         try:
-            arg1, arg2 = args
-            arg1, arg2 = float(arg1), float(arg2)  # Convert inputs to numbers
-        except ValueError:
-            logging.error("Invalid arguments for arithmetic operation. Arguments must be numbers.")
-            return
-        if operation == "add":
-            return self.add( arg1, arg2)
-        if operation == "subtract":
-            return self.subtract( arg1, arg2)
-        if operation == "multiply":
-            return self.multiply( arg1, arg2)
-        if operation == "divide":
-            try:
-                result = self.divide(arg1, arg2)
-                return result
-            except ZeroDivisionError:
-                logging.error("Division by zero error.")
-                print("Error: Division by zero is not allowed.")
-                return
-        logging.error("Unknown operation: %s", operation)
+            return command.execute(*args)
+        except ArgumentError as e:
+            logging.error("%s", e)
+            self._echo(f"Error: {e}")
+            return None
+    batch_operations = {"add": np.add, "subtract": np.subtract, "multiply": np.multiply,
+                        "divide": np.divide, "power": np.power, "modulo": np.mod,
+                        "sqrt": lambda a, _: np.sqrt(a)}
+    def execute_batch(self, operation, a_array, b_array=None):
+        """Evaluate an operation element-wise over operand arrays and record the batch.
+
+        Division (or modulo) by zero, powers without a finite real result and square roots
+        of negative numbers do not raise: those elements are NaN in `results`, flagged in
+        the `invalid` mask, and left out of the history. sqrt ignores `b_array`.
+        """
+        if operation not in self.batch_operations:
+            raise ValueError(f"Unknown batch operation: {operation}")
+        a_array, b_array = np.broadcast_arrays(np.asarray(a_array, dtype=np.float64),
+                                               np.asarray(b_array, dtype=np.float64))
+        if operation in ("divide", "modulo"):
+            invalid = b_array == 0.0
+            with np.errstate(divide="ignore", invalid="ignore"):
+                results = self.batch_operations[operation](a_array, b_array)
+            results[invalid] = np.nan
+            problem = "Division by zero"
+        elif operation == "sqrt":
+            b_array = np.full(a_array.shape, np.nan)  # Recorded like the scalar sqrt
+            invalid = a_array < 0.0
+            with np.errstate(invalid="ignore"):
+                results = self.batch_operations[operation](a_array, b_array)
+            results[invalid] = np.nan
+            problem = "Square root of a negative number"
+        elif operation == "power":
+            with np.errstate(divide="ignore", over="ignore", invalid="ignore"):
+                results = self.batch_operations[operation](a_array, b_array)
+            invalid = power_errors(a_array, b_array, results) != ""
+            results[invalid] = np.nan
+            problem = "No finite real power"
+        else:
+            invalid = np.zeros(a_array.shape, dtype=bool)
+            results = self.batch_operations[operation](a_array, b_array)
+        valid = ~invalid
+        self.data_frame_facade.add_entries(operation, a_array[valid], b_array[valid], results[valid])
+        if invalid.any():
+            logging.error("%s in %d of %d batch elements.", problem, invalid.sum(), invalid.size)
+        logging.info("Executed batch %s over %d elements.", operation, results.size)
+        return BatchResult(results, invalid)
+    @operation(("expression", str), rest=True, name="eval")
+    def evaluate(self, expression, **variables):
+        """Evaluate an arithmetic expression; "_" refers to the last result.
+
+        Variables may be NumPy arrays, in which case the result is an array.
+        """
+        compiled = compile_expression(expression)
+        result = compiled.evaluate({"_": self.last_result, **variables})
+        if not isinstance(result, np.ndarray):
+            result = float(result)
+            self.last_result = result
+        logging.info("Evaluated %s = %s", expression, result)
+        return result
+    def _record(self, operation, a, b, result, echo=True):
+        """Append a calculation to the history, log it and return its result."""
+        entry = render_entry(operation, a, b, result)
+        if METRICS.current() is None:  # Nothing is timing this command: skip the phase bookkeeping
+            self.data_frame_facade.add_entry(operation, a, b, result)
+            logging.info(entry)
+        else:
+            with METRICS.phase("history"):
+                self.data_frame_facade.add_entry(operation, a, b, result)
+            with METRICS.phase("logging"):
+                logging.info(entry)
+        self.last_result = result
+        if echo:
+            self._echo(entry)
+        return result
+    @operation(("a", float), ("b", float))
     def add(self, a, b):
         """Return the sum of a and b."""
-        result = a + b
-        entry = f"Added {a} + {b} = {result}"
-        self.data_frame_facade.add_entry(entry)
-        logging.info(entry)
-        print(entry)
-        return result
+        return self._record("add", a, b, a + b)
+    @operation(("a", float), ("b", float))
     def subtract(self, a, b):
         """Return the result of a minus b."""
-        result = a - b
-        entry = f"Subtracted {a} - {b} = {result}"
-        self.data_frame_facade.add_entry(entry)
-        logging.info(entry)
-        print(entry)
-        return result
+        return self._record("subtract", a, b, a - b)
+    @operation(("a", float), ("b", float))
     def multiply(self, a, b):
         """Return the product of a and b."""
-        result = a * b
-        entry = f"Multiplied {a} * {b} = {result}"
-        self.data_frame_facade.add_entry(entry)
-        logging.info(entry)
-        print(entry)
-        return result
+        return self._record("multiply", a, b, a * b)
+    @operation(("a", float), ("b", float))
     def divide(self, a, b):
         """Return the result of a divided by b, or handle division by zero."""
         if b == 0.0:
             logging.error("Division by zero attempted.")
-            print("Cannot divide by zero.")
+            self._echo("Cannot divide by zero.")
             raise ValueError("Cannot divide by zero.")
-        result = a / b
-        entry = f"Divided {a} / {b} = {result}"
-        self.data_frame_facade.add_entry(entry)
-        logging.info(entry)
-        return result
+        return self._record("divide", a, b, a / b, echo=False)
+    @operation(("a", float), ("b", float))
+    def power(self, a, b):
+        """Return a raised to the power b."""
+        try:
+            result = a ** b
+        except ZeroDivisionError as e:
+            raise ValueError(DIVIDE_BY_ZERO) from e
+        except OverflowError as e:
+            raise ValueError(TOO_LARGE) from e
+        if isinstance(result, complex):
+            raise ValueError(NOT_REAL)
+        return self._record("power", a, b, result)
+    @operation(("a", float), ("b", float))
+    def modulo(self, a, b):
+        """Return the remainder of a divided by b, with the sign of b."""
+        if b == 0.0:
+            logging.error("Modulo by zero attempted.")
+            raise ValueError("Cannot divide by zero.")
+        return self._record("modulo", a, b, a % b)
+    @operation(("a", float))
+    def sqrt(self, a):
+        """Return the square root of a."""
+        if a < 0:
+            logging.error("Square root of a negative number attempted.")
+            raise ValueError("Cannot take the square root of a negative number.")
+        return self._record("sqrt", a, np.nan, math.sqrt(a))
     def show_history(self):
         """Show the current calculation history."""
         return self.data_frame_facade.show_history()
+    @operation(optional=(("view", str), ("first", str), ("second", str)))
+    def history(self, view="tail", *bounds):
+        """Stream part of the history, one line per record.
+
+        `tail [N]` shows the newest N records, `page K [SIZE]` the K-th page counting
+        back from the newest, and `range FROM TO` the records timestamped between two
+        times (epoch seconds or ISO 8601). Only that slice is read from the store.
+        """
+        try:
+            if view == "tail" and len(bounds) <= 1:
+                count = int(bounds[0]) if bounds else DEFAULT_HISTORY_ROWS
+                page = 1
+            elif view == "page" and 1 <= len(bounds) <= 2:
+                page = int(bounds[0])
+                count = int(bounds[1]) if len(bounds) == 2 else DEFAULT_HISTORY_ROWS
+            elif view == "range" and len(bounds) == 2:
+                start, end = (parse_time(value) for value in bounds)
+                return self._stream_history(self.data_frame_facade.records_between(start, end))
+            else:
+                raise ArgumentError(HISTORY_USAGE)
+        except ValueError as e:
+            raise ArgumentError(HISTORY_USAGE) from e
+        if count < 1 or page < 1:
+            raise ArgumentError(HISTORY_USAGE)
+        return self._stream_history(self.data_frame_facade.recent_records(count, (page - 1) * count))
+    @staticmethod
+    def _stream_history(records):
+        """Return a generator of the records' display lines, or a single line if there are none."""
+        return iter_rendered(records) if len(records) else iter(["No history available."])
+    @operation()
     def save_history(self):
         """Save the current history to a CSV file."""
         self.data_frame_facade.save_history()
         return "History saved."
+    @operation()
     def load_history(self):
-        """Load history from a CSV file and return it as a string."""
-        loaded_history = self.data_frame_facade.load_history()
-        if not loaded_history.empty:
-            logging.info(loaded_history.to_string(index=False))
-            return loaded_history.to_string(index=False)
+        """Reload the history file and return its record count with the newest records."""
+        count = self.data_frame_facade.reload_history()
+        if count:
+            logging.info("Loaded %d history records.", count)
+            lines = list(iter_rendered(self.data_frame_facade.recent_records(DEFAULT_HISTORY_ROWS)))
+            return "\n".join([f"History loaded: {count} records. The newest {len(lines)}:"] + lines)
         return "No history found."
+    @operation()
     def clear_history(self):
         """Clear the current calculation history."""
         self.data_frame_facade.clear_history()
         return "History cleared."
+    @operation()
+    def compact_history(self):
+        """Rewrite the history log without deleted records."""
+        kept = self.data_frame_facade.compact_history()
+        return f"History compacted: {kept} records kept."
+    @operation()
+    def rotate_history(self):
+        """Close the active history log as a compressed segment."""
+        rotated = self.data_frame_facade.rotate_history()
+        return f"History rotated: {rotated} records archived."
+    @operation(optional=(("path", str),))
+    def export_history(self, path="calcHistory_export.csv"):
+        """Export the history to a CSV file."""
+        self.data_frame_facade.export_history(path)
+        return f"History exported to {path}."
+    @operation(optional=(("from", str), ("to", str)))
+    def history_stats(self, *window):
+        """Summarize the history: all of it, the last N seconds, or between two times.
+
+        Times are epoch seconds or ISO 8601 date-times.
+        """
+        if not window:
+            return format_summary(self.data_frame_facade.history_stats())
+        try:
+            if len(window) == 1:
+                start, end = time.time() - float(window[0]), time.time()
+            else:
+                start, end = (parse_time(value) for value in window[:2])
+        except ValueError as e:
+            raise ArgumentError(HISTORY_STATS_USAGE) from e
+        return format_summary(self.data_frame_facade.history_window(start, end))
+    @operation(("index", int))
     def delete_history_record(self, index):
         """Delete a specific record from the history."""
         return self.data_frame_facade.delete_entry(index)
+def parse_time(value):
+    """Parse epoch seconds or an ISO 8601 date-time into epoch seconds."""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
 class DataFrameFacade:
-    """Facade class for managing history using Pandas DataFrame."""    
-    def __init__(self, history_file="calcHistory.csv"):
+    """Facade class for managing history using typed records and a pluggable history store."""    
+    def __init__(self, history_file="calcHistory.csv", compact_ratio=0.5):
         self.history_file = history_file
-        self.history_df = pd.DataFrame(columns=["Calculation"])  # Initialize an empty DataFrame
-        if os.path.exists(self.history_file):
-            self.history_df = pd.read_csv(self.history_file)
-        else:
-            self.save_history()  # Create an empty history file if it doesn't exist
-    def add_entry(self, entry):
-        """Add a new entry to the history DataFrame."""
-        new_entry = {"Calculation": entry}
-        self.history_df = pd.concat([self.history_df, pd.DataFrame([new_entry])], ignore_index=True)
+        self.compact_ratio = compact_ratio  # Dead fraction of the log that triggers compaction
+        self.store = open_history_store(history_file)  # CSV log, binary (.bin) or SQLite (.db)
+        self._history = None  # Loaded from the store on first use
+        self.stats = HistoryStats()
+        self._saved_id = -1  # Highest record id already written to the store
+        self.lock = threading.RLock()  # Guards the records; writers hold it only to take or settle changes
+        self._write_lock = threading.Lock()  # Serializes writes to the store
+        self.autosaver = None  # A calculator.autosave.Autosaver that defers deletes and clears
+        self._pending_deletes = []  # Ids of saved records deleted while autosave was on
+        self._pending_clear = False  # Set by a clear that autosave has not written yet
+    @property
+    def history(self):
+        """Return the history buffer, replaying the log the first time it is needed."""
+        if self._history is None:
+            with self.lock:
+                if self._history is None:
+                    self._replay_log()
+        return self._history
+    def _replay_log(self):
+        """Rebuild the in-memory history from the log, upgrading older file formats."""
+        records, needs_rewrite = self.store.replay()
+        self._history = HistoryBuffer.wrap(records)
+        self.stats = HistoryStats()  # Rebuilt from the buffer when first read
+        if self.archive is not None:  # Ids continue after the archived records
+            self._history.next_id = max(self._history.next_id, self.archive.last_id + 1)
+        self._saved_id = self._history.next_id - 1
+        if needs_rewrite:
+            self.compact_history()  # Create the log, or convert a pre-log history file
+    @property
+    def archive(self):
+        """Return the store's SegmentArchive of rotated records, or None."""
+        return self.store.archive
+    @property
+    def history_df(self):
+        """Return the history as a DataFrame, materialized from the typed records."""
+        return self.history.to_frame()
+    def _changed(self, count=1):
+        """Tell the autosaver, if any, that `count` changes are waiting to be written."""
+        if self.autosaver is not None:
+            self.autosaver.notify(count)
+    def add_entry(self, operation, a, b, result, timestamp=None):
+        """Append a new record to the history buffer in amortized O(1)."""
+        with self.lock:
+            self.history.append(operation, a, b, result, timestamp)
+            self.stats.add(OPERATION_CODES[operation], result)
+        if self.autosaver is not None:  # Inlined _changed(): this is the per-calculation hot path
+            self.autosaver.notify()
+    def add_entries(self, operation, a, b, result):
+        """Append a whole batch of records for one operation as a single bulk copy."""
+        with self.lock:
+            self.history.append_batch(operation, np.ravel(a), np.ravel(b), np.ravel(result))
+            self.stats.add(OPERATION_CODES[operation], result)
+        self._changed(np.size(result))
+    def add_records(self, records):
+        """Append records calculated elsewhere (e.g. by bulk workers) under new ids."""
+        with self.lock:
+            records["id"] = np.arange(self.history.next_id, self.history.next_id + len(records))
+            self.history.extend(records)
+            for code in np.unique(records["operation"]):
+                self.stats.add(code, records["result"][records["operation"] == code])
+        self._changed(len(records))
     def delete_entry(self, index):
-        """Delete a specific entry by index."""
-        if len(self.history_df) == 0:
+        """Delete a specific entry by index, logging a tombstone if it was already saved.
+
+        Indexes count from the oldest record; those before the in-memory history refer to
+        archived records, and deleting one rewrites only its segment. With autosave on,
+        the tombstone is written by the next flush instead.
+        """
+        with self.lock:
+            return self._delete_entry(index)
+    def _delete_entry(self, index):
+        archived = self.archive.rows if self.archive is not None else 0
+        if len(self.history) + archived == 0:
             logging.info("empty dataframe")
             return "Invalid index. No record deleted."  # Return directly if empty
-        if 0 <= index < len(self.history_df):
-            deleted_record = self.history_df.iloc[index]
-            self.history_df = self.history_df.drop(index).reset_index(drop=True)
-            self.history_df.to_csv(self.history_file, index=False)
-            logging.info("Deleted record: %s", deleted_record['Calculation'])
-            return f"Deleted record: {deleted_record['Calculation']}"
+        if 0 <= index < archived:
+            record = self.archive.delete_row(index)
+            deleted_record = render_entry(int(record["operation"]), record["a"], record["b"], record["result"])
+            logging.info("Deleted archived record: %s", deleted_record)
+            return f"Deleted record: {deleted_record}"
+        index -= archived
+        if 0 <= index < len(self.history):
+            deleted_record = self.history.render(index)
+            record = self.history.delete(index)
+            self.stats.remove(record["operation"], record["result"])
+            if record["id"] <= self._saved_id and self.autosaver is not None:
+                self._pending_deletes.append(int(record["id"]))
+                self._changed()
+            elif record["id"] <= self._saved_id:
+                self._delete_saved([record["id"]])
+            logging.info("Deleted record: %s", deleted_record)
+            return f"Deleted record: {deleted_record}"
         logging.error("Invalid index provided for deletion.")
         return "Invalid index. No record deleted."
+    def _delete_saved(self, record_ids):
+        """Tombstone saved records in the store, compacting it once enough of it is dead."""
+        self.store.delete(record_ids)
+        if self.store.dead and self.store.dead >= self.compact_ratio * self.store.rows:
+            self.compact_history()
     def save_history(self):
-        """Save the DataFrame to a CSV file."""
-        self.history_df.to_csv(self.history_file, index=False)
+        """Write every pending change to the store now, on the calling thread."""
+        self.flush_changes()
         logging.info("History saved to '%s'.", self.history_file)
+    def flush_changes(self):
+        """Write pending changes: a deferred clear, deferred deletes and the unsaved records.
+
+        The lock is held only to collect the changes and to settle the saved ids, never
+        while the store is written, so other threads keep adding records meanwhile.
+        Returns True if anything was written.
+        """
+        with self._write_lock:
+            with self.lock:
+                changes = self._take_changes()
+            if not (changes.clear or changes.deletes or len(changes.records)):
+                return False
+            try:
+                if changes.clear:
+                    self.store.rewrite(changes.records[:0])
+                    if self.archive is not None:
+                        self.archive.clear()
+                if changes.deletes:
+                    self._delete_saved(changes.deletes)
+                if len(changes.records):
+                    self.store.append(changes.records)  # May renumber them in place
+            except BaseException:
+                with self.lock:  # Keep the changes for the next flush
+                    self._pending_clear = self._pending_clear or changes.clear
+                    self._pending_deletes[:0] = changes.deletes
+                raise
+            with self.lock:
+                self._settle(changes)
+            return True
+    def _take_changes(self):
+        """Collect and reset the pending changes (lock held)."""
+        start = self.history.unsaved_from(self._saved_id)
+        records = self.history.records[start:].copy()
+        changes = PendingChanges(self._pending_clear, self._pending_deletes, records, records["id"].copy())
+        self._pending_clear, self._pending_deletes = False, []
+        return changes
+    def _settle(self, changes):
+        """Mark the written records as saved, following the store's renumbering (lock held).
+
+        Records deleted while they were being written get a tombstone in the next flush,
+        and records added meanwhile keep their order after the renumbered ones.
+        """
+        old_ids, new_ids = changes.ids, changes.records["id"]
+        if len(new_ids):
+            ids = self.history.column("id")
+            if not self._pending_clear:
+                self._pending_deletes.extend(new_ids[~np.isin(old_ids, ids)].tolist())
+            if new_ids[0] != old_ids[0]:  # Another process appended first
+                written = (ids >= old_ids[0]) & (ids <= old_ids[-1])
+                newer = ids > old_ids[-1]
+                ids[written] = new_ids[np.searchsorted(old_ids, ids[written])]
+                ids[newer] += new_ids[-1] - old_ids[-1]
+                self.history.next_id += int(new_ids[-1] - old_ids[-1])
+            self._saved_id = max(self._saved_id, int(new_ids[-1]))
+            self.history.next_id = max(self.history.next_id, self._saved_id + 1)
+        self._drop_archived()
+    def _drop_archived(self):
+        """Forget in-memory records that the store has rotated into its archive."""
+        if self.archive is None or not len(self.history):
+            return
+        keep = self.history.column("id") > self.archive.last_id
+        if not keep.all():
+            next_id = self.history.next_id
+            self._history = HistoryBuffer.wrap(self.history.records[keep])
+            self._history.next_id = next_id
+            self.stats = HistoryStats()
+    def rotate_history(self):
+        """Save, then move every saved record into a new compressed segment; returns how many."""
+        self.save_history()
+        with self._write_lock:
+            rotated = self.store.rotate() if self.archive is not None else 0
+            with self.lock:
+                self._drop_archived()
+        logging.info("History log '%s' rotated: %d records archived.", self.history_file, rotated)
+        return rotated
+    def compact_history(self):
+        """Rewrite the store with only its live records, dropping tombstones.
+
+        The store re-reads its file under a lock, so records appended by other
+        processes since this history was loaded are kept.
+        """
+        kept = self.store.compact()
+        logging.info("History log '%s' compacted to %d records.", self.history_file, kept)
+        return kept
+    def history_stats(self):
+        """Return the aggregates over the whole history: incremental in memory, per segment when archived."""
+        with self.lock:
+            summary = self.stats.summary(self.history)
+        if self.archive is not None and self.archive.segments:
+            summary = combine_summaries([self.archive.summary(), summary])
+        return summary
+    def history_window(self, start, end):
+        """Return aggregates over records timestamped between start and end."""
+        return window_summary(HistoryBuffer.wrap(self.records_between(start, end)))
+    def recent_records(self, count, skip=0):
+        """Return up to `count` records, oldest first, ending `skip` records before the newest.
+
+        Before the history is loaded, only that slice is read from the store.
+        """
+        if self._history is None:
+            newest = self.store.tail_records(count + skip)
+        else:
+            with self.lock:
+                newest = self.history.records[-(count + skip):].copy()
+        if len(newest) < count + skip and self.archive is not None:  # Continue into the archive
+            archived = self.archive.rows
+            end = archived + len(newest) - skip
+            start = max(end - count, 0)
+            return np.concatenate([self.archive.slice(start, min(max(end, 0), archived)),
+                                   newest[max(start - archived, 0):max(end - archived, 0)]])
+        end = max(len(newest) - skip, 0)
+        return newest[max(end - count, 0):end]
+    def records_between(self, start, end):
+        """Return the records timestamped in [start, end], read from the store if not loaded.
+
+        Archived segments are decompressed only if their time range overlaps the window.
+        """
+        if self._history is None:
+            records = self.store.records_between(start, end)
+        else:
+            with self.lock:
+                timestamps = self.history.column("timestamp")
+                records = self.history.records[(timestamps >= start) & (timestamps <= end)]
+        if self.archive is not None and self.archive.segments:
+            records = np.concatenate([self.archive.records_between(start, end), records])
+        return records
+    def export_history(self, path):
+        """Write the whole history, archived segments first, to a CSV file one segment at a time."""
+        archived = self.archive.iter_records() if self.archive is not None else ()
+        with self.lock:
+            current = self.history.records.copy()
+        for number, records in enumerate(itertools.chain(archived, [current])):
+            records_to_frame(records).to_csv(path, mode="a" if number else "w", header=not number, index=False)
+        logging.info("History exported to '%s'.", path)
+    def reload_history(self):
+        """Replay the log again and return the record count, or None if there is no history file."""
+        if not self.store.exists():
+            logging.warning("No history file found.")
+            return None
+        with self._write_lock, self.lock:
+            self._replay_log()
+        logging.info("History loaded from '%s'.", self.history_file)
+        return len(self._history) + (self.archive.rows if self.archive is not None else 0)
     def load_history(self):
-        """Load the history from a CSV file."""
-        if os.path.exists(self.history_file):
-            self.history_df = pd.read_csv(self.history_file)
-            logging.info("History loaded from '%s'.", self.history_file)
+        """Load the history by replaying the log, migrating older file formats if needed."""
+        if self.reload_history() is not None:
             return self.history_df
-        logging.warning("No history file found.")
-        return pd.DataFrame(columns=["Calculation"])  # Return empty DataFrame if file not found
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+        return pd.DataFrame(columns=LOG_COLUMNS)  # Return empty DataFrame if file not found
     def clear_history(self):
-        """Clear the history DataFrame."""
-        self.history_df = pd.DataFrame(columns=["Calculation"])
-        self.history_df.to_csv(self.history_file, index=False)
+        """Clear the history records and truncate the log (in the next flush with autosave on).
+
+        Archived segments are removed right away either way, so stats, tails and deletes
+        never see them again while the truncation of the log is still pending.
+        """
+        with self.lock:
+            self.history.clear()
+            self.stats = HistoryStats()
+            self._saved_id = self.history.next_id - 1
+            if self.autosaver is not None:
+                self._pending_clear, self._pending_deletes = True, []
+                self._changed()
+            else:
+                self.store.rewrite(self.history.records)
+            if self.archive is not None:
+                self.archive.clear()
         logging.info("History cleared.")
     def show_history(self):
         """Return a string representation of the current history."""
-        if not self.history_df.empty:
-            return self.history_df.to_string(index=False)
+        if len(self.history):
+            import pandas as pd  # pylint: disable=import-outside-toplevel
+            return pd.DataFrame({"Calculation": self.history.render_all()}).to_string(index=False)
         return "No history available."
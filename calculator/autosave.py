@@ -0,0 +1,84 @@
+"""
+autosave module
+Autosaver writes a DataFrameFacade's changes to its history store on a background
+thread, so the REPL never waits for the disk. While it is attached, deletes and
+clears are also left to the flush instead of being written on the calling thread.
+
+A flush runs every `interval` seconds, or `debounce` seconds after `max_pending`
+changes have piled up, so a burst of changes is coalesced into one write. Appends are
+a single synced write to the log, and rewrites go through a temporary file that
+replaces the log. stop() writes whatever is still pending, so nothing is lost on exit.
+
+HISTORY_AUTOSAVE=<seconds> turns it on for the REPL, and HISTORY_AUTOSAVE_ENTRIES=<N>
+sets max_pending.
+"""
+import logging
+import os
+import threading
+
+DEFAULT_INTERVAL = 5.0  # seconds between flushes
+DEFAULT_MAX_PENDING = 100  # changes that trigger an early flush
+DEFAULT_DEBOUNCE = 0.05  # seconds to wait for the rest of a burst
+
+class Autosaver:
+    """Background thread that flushes a facade's pending history changes, debounced."""
+    def __init__(self, facade, interval=DEFAULT_INTERVAL, max_pending=DEFAULT_MAX_PENDING,
+                 debounce=DEFAULT_DEBOUNCE):
+        self.facade = facade
+        self.interval = interval
+        self.max_pending = max_pending
+        self.debounce = debounce
+        self.flushes = 0  # Flushes that wrote something
+        self._pending = 0  # Changes since the last flush
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="history-autosave", daemon=True)
+
+    @classmethod
+    def from_environment(cls, facade):
+        """Return an autosaver configured by HISTORY_AUTOSAVE and HISTORY_AUTOSAVE_ENTRIES, or None if off."""
+        interval = float(os.getenv("HISTORY_AUTOSAVE", "0") or 0)
+        if interval <= 0:
+            return None
+        return cls(facade, interval, int(os.getenv("HISTORY_AUTOSAVE_ENTRIES", str(DEFAULT_MAX_PENDING))))
+
+    def start(self):
+        """Attach to the facade and start the flush thread."""
+        self.facade.autosaver = self
+        self._thread.start()
+        return self
+
+    def notify(self, count=1):
+        """Count changes made to the facade, waking the thread once max_pending have piled up."""
+        self._pending += count
+        if self._pending >= self.max_pending:
+            self._wake.set()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            if self._wake.wait(self.interval):
+                self._stopping.wait(self.debounce)  # Let the rest of the burst arrive
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Write the facade's pending changes now; returns True if anything was written."""
+        self._pending = 0
+        try:
+            written = self.facade.flush_changes()
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logging.error("History autosave failed: %s", e)
+            return False
+        if written:
+            self.flushes += 1
+            logging.debug("History autosaved to '%s'.", self.facade.history_file)
+        return written
+
+    def stop(self):
+        """Stop the thread, write any remaining changes and detach from the facade."""
+        self._stopping.set()
+        self._wake.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.flush()
+        self.facade.autosaver = None
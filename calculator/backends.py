@@ -0,0 +1,618 @@
+"""
+backends module
+This module defines where DataFrameFacade persists history records. Every store
+implements the HistoryStore interface (replay, append, delete, rewrite) and keeps
+count of its physical and dead rows so the facade can decide when to compact:
+
+- HistoryLog: append-only CSV log; deletions are appended as tombstone rows.
+- BinaryHistoryFile: fixed-width packed records, memory-mapped on load (O(1)),
+  with deleted ids listed in a side file so mapped records never change.
+
+Both file stores are safe for several processes writing the same file: every read
+and write happens under an advisory lock on "<file>.lock", and appends renumber
+the new records past the highest id already in the file, so concurrent writers
+interleave their records instead of overwriting each other. Compaction re-reads
+the file under the lock, so it never drops records another process appended.
+- SqliteHistoryStore: an SQLite table in WAL mode, indexed by id and timestamp,
+  with each batch of appends or deletes committed in one transaction. Several
+  processes can share it safely.
+
+Every store can also return just the newest records (tail_records) or a time range
+(records_between). The CSV log reads its tail backwards from its end, SQLite uses its
+indexes, and the binary file is already memory-mapped. A time range on the CSV log is
+filtered from the whole active log: concurrent writers and the autosaver can append
+records out of timestamp order, so no prefix of the log can be skipped.
+
+The CSV log also rotates. Once the active log holds HISTORY_SEGMENT_ROWS live records
+(or its oldest record is HISTORY_SEGMENT_SECONDS old), its records are moved into a
+gzip-compressed segment and the log starts over empty. SegmentArchive lists the closed
+segments in a JSON manifest with their row counts, id and time ranges and aggregates.
+Only the active log is replayed into memory. A segment is decompressed only when a
+query or delete reaches its rows or its time range.
+
+The store is chosen from the history file's extension; Calculator derives the file
+from the HISTORY_BACKEND (csv, binary or sqlite) and HISTORY_FILE environment variables.
+"""
+import contextlib
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+from calculator.history import (LOG_COLUMNS, OPERATION_CODES, RECORD_DTYPE, HistoryBuffer, combine_summaries,
+                                records_from_frame, records_to_frame, window_summary)
+
+TOMBSTONE = "delete"
+BINARY_MAGIC = b"CALCHIST"
+BINARY_VERSION = 1
+BINARY_HEADER_DTYPE = np.dtype([("magic", "S8"), ("version", "<u4"), ("record_size", "<u4"), ("dead", "<u8")])
+DELETED_OPERATION = -1  # Operation code of a record deleted in place by older binary history files
+DEFAULT_HISTORY_FILES = {"csv": "calcHistory.csv", "binary": "calcHistory.bin", "sqlite": "calcHistory.db"}
+DEFAULT_SEGMENT_ROWS = 250_000  # Live records in the active CSV log that trigger a rotation
+_held_locks = threading.local()
+
+@contextlib.contextmanager
+def file_lock(path):
+    """Hold an exclusive advisory lock on "<path>.lock" for the enclosed block.
+
+    The lock is re-entrant within a thread, so a locked method may call another one.
+    """
+    held = _held_locks.__dict__.setdefault("paths", set())
+    if path in held:
+        yield
+        return
+    held.add(path)
+    try:
+        with _locked_file(path):
+            yield
+    finally:
+        held.discard(path)
+
+@contextlib.contextmanager
+def _locked_file(path):
+    with open(f"{path}.lock", "a+b") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+def read_lines_backwards(path, block_size=65536):
+    """Yield the non-empty lines of a file from last to first, reading blocks from the end."""
+    with open(path, "rb") as lines_file:
+        end = lines_file.seek(0, os.SEEK_END)
+        partial = b""
+        while end > 0:
+            start = max(end - block_size, 0)
+            lines_file.seek(start)
+            lines = (lines_file.read(end - start) + partial).split(b"\n")
+            end = start
+            partial = lines.pop(0)  # May continue in the previous block
+            for line in reversed(lines):
+                if line.rstrip(b"\r"):
+                    yield line.rstrip(b"\r")
+        if partial.rstrip(b"\r"):
+            yield partial.rstrip(b"\r")
+
+def renumber_after(records, max_id):
+    """Renumber records in place so their ids follow max_id, unless they already do."""
+    if len(records) and records["id"][0] <= max_id:
+        records["id"] = np.arange(max_id + 1, max_id + 1 + len(records))
+
+class HistoryStore:
+    """Interface of a persistent history store.
+
+    `rows` counts the physical rows in the store and `dead` those that no longer hold
+    a live record (deleted records and tombstones); both are kept up to date by replay,
+    append, delete and rewrite. A store that rotates old records out has an `archive`
+    (a SegmentArchive); those records are older than every record the store itself
+    holds and are not returned by replay, tail_records or records_between.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self.dead = 0
+        self.archive = None
+    def exists(self):
+        """Return True if the store exists on disk."""
+        return os.path.exists(self.path)
+    def replay(self):
+        """Return (live records in id order, needs_rewrite).
+
+        needs_rewrite is True when the store is missing or in an older format and has
+        to be rewritten before anything can be appended to it.
+        """
+        raise NotImplementedError
+    def append(self, records):
+        """Persist new records. A store may renumber their ids in place to keep them unique."""
+        raise NotImplementedError
+    def delete(self, record_ids):
+        """Mark the records with the given ids as deleted."""
+        raise NotImplementedError
+    def rewrite(self, records):
+        """Replace the store's contents with just `records` (clearing and migration)."""
+        raise NotImplementedError
+    def compact(self):
+        """Drop dead rows, keeping every live record in the store, and return how many remain."""
+        records, _ = self.replay()
+        self.rewrite(records)
+        return len(records)
+    def tail_records(self, count, skip=0):
+        """Return up to `count` live records, oldest first, ending `skip` records before the newest."""
+        records, _ = self.replay()
+        end = max(len(records) - skip, 0)
+        return records[max(end - count, 0):end]
+    def records_between(self, start, end):
+        """Return the live records timestamped in [start, end]."""
+        records, _ = self.replay()
+        timestamps = records["timestamp"]
+        return records[(timestamps >= start) & (timestamps <= end)]
+
+class SegmentArchive:
+    """Closed history segments: gzip-compressed CSV files listed in a JSON manifest.
+
+    Segments are kept oldest first. Each manifest entry records the segment's live row
+    count, its id and timestamp ranges and the summary of its results, so row positions,
+    time windows and statistics are answered without decompressing anything. The
+    manifest also keeps the highest id ever archived, so ids are never reused.
+    """
+    def __init__(self, path):
+        base, extension = os.path.splitext(path)
+        self.path = path  # The history file; its lock guards the archive too
+        self.manifest_path = f"{base}.segments.json"
+        self._segment_name = f"{base}.{{:05d}}{extension}.gz"
+        self._manifest = (None, None)  # (manifest file stat, parsed manifest)
+        self._cached = (None, None)  # (segment file stat, records) of the last segment read
+    def _load(self):
+        """Return the manifest, re-reading it only when the file has changed."""
+        try:
+            stat = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return {"next": 1, "last_id": -1, "segments": []}
+        key = (stat.st_mtime_ns, stat.st_size)
+        if self._manifest[0] != key:
+            with open(self.manifest_path, encoding="utf-8") as manifest_file:
+                self._manifest = (key, json.load(manifest_file))
+        return self._manifest[1]
+    def _save(self, manifest):
+        temp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as manifest_file:
+            json.dump(manifest, manifest_file, indent=1)
+        os.replace(temp_path, self.manifest_path)
+    @property
+    def segments(self):
+        """Return the manifest entries, oldest segment first."""
+        return self._load()["segments"]
+    @property
+    def rows(self):
+        """Return the number of live records in all segments."""
+        return sum(entry["rows"] for entry in self.segments)
+    @property
+    def last_id(self):
+        """Return the highest record id ever archived, or -1."""
+        return self._load()["last_id"]
+    def _offsets(self, segments):
+        """Return the row position at which each segment starts, plus the total."""
+        return np.concatenate([[0], np.cumsum([entry["rows"] for entry in segments], dtype=np.int64)])
+    def _write(self, entry, records):
+        """Compress records into the entry's segment file and refresh its manifest fields."""
+        file = os.path.join(os.path.dirname(self.manifest_path), entry["file"])
+        temp_path = f"{file}.{os.getpid()}.tmp"
+        records_to_frame(records).to_csv(temp_path, index=False, compression="gzip")
+        os.replace(temp_path, file)
+        timestamps = records["timestamp"]
+        entry.update(rows=len(records), first_id=int(records["id"][0]), last_id=int(records["id"][-1]),
+                     start=float(np.nanmin(timestamps)) if np.isfinite(timestamps).any() else None,
+                     end=float(np.nanmax(timestamps)) if np.isfinite(timestamps).any() else None,
+                     summary=window_summary(HistoryBuffer.wrap(records)))
+    def add(self, records):
+        """Close a segment holding `records` (in id order) and list it in the manifest."""
+        with file_lock(self.path):
+            manifest = self._load()
+            entry = {"file": os.path.basename(self._segment_name.format(manifest["next"]))}
+            self._write(entry, records)
+            manifest["segments"].append(entry)
+            manifest["next"] += 1
+            manifest["last_id"] = max(manifest["last_id"], entry["last_id"])
+            self._save(manifest)
+    def read(self, entry):
+        """Decompress one segment's records; the last segment read is kept in memory."""
+        file = os.path.join(os.path.dirname(self.manifest_path), entry["file"])
+        stat = os.stat(file)
+        key = (file, stat.st_mtime_ns, stat.st_size)
+        if self._cached[0] != key:
+            import pandas as pd  # pylint: disable=import-outside-toplevel
+            self._cached = (key, records_from_frame(pd.read_csv(file, compression="gzip")))
+        return self._cached[1]
+    def slice(self, start, stop):
+        """Return the archived records at row positions [start, stop), reading only the segments they span."""
+        with file_lock(self.path):
+            segments = self.segments
+            offsets = self._offsets(segments)
+            parts = [self.read(entry)[max(start - offsets[i], 0):stop - offsets[i]]
+                     for i, entry in enumerate(segments) if offsets[i] < stop and offsets[i + 1] > start]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=RECORD_DTYPE)
+    def records_between(self, start, end):
+        """Return the archived records timestamped in [start, end], reading only overlapping segments."""
+        with file_lock(self.path):
+            parts = [self.read(entry) for entry in self.segments
+                     if entry["start"] is not None and entry["start"] <= end and entry["end"] >= start]
+            parts = [records[(records["timestamp"] >= start) & (records["timestamp"] <= end)] for records in parts]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=RECORD_DTYPE)
+    def iter_records(self):
+        """Yield each segment's records, oldest segment first."""
+        for entry in self.segments:
+            with file_lock(self.path):
+                yield self.read(entry)
+    def delete_row(self, row):
+        """Delete the archived record at row position `row` and return it, rewriting only its segment."""
+        with file_lock(self.path):
+            manifest = self._load()
+            offsets = self._offsets(manifest["segments"])
+            index = int(np.searchsorted(offsets, row, side="right")) - 1
+            entry = manifest["segments"][index]
+            records = self.read(entry)
+            record = records[row - offsets[index]].copy()
+            remaining = np.delete(records, row - offsets[index])
+            if len(remaining):
+                self._write(entry, remaining)
+            else:
+                os.remove(os.path.join(os.path.dirname(self.manifest_path), entry["file"]))
+                del manifest["segments"][index]
+            self._save(manifest)
+        return record
+    def summary(self):
+        """Return the aggregates over every archived record, from the manifest alone."""
+        return combine_summaries([entry["summary"] for entry in self.segments])
+    def clear(self):
+        """Delete every segment, keeping the highest archived id so ids are not reused."""
+        with file_lock(self.path):
+            manifest = self._load()
+            for entry in manifest["segments"]:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(os.path.join(os.path.dirname(self.manifest_path), entry["file"]))
+            if manifest["segments"]:
+                manifest["segments"] = []
+                self._save(manifest)
+
+class HistoryLog(HistoryStore):
+    """Append-only CSV log of history records; deletions are appended as tombstone rows.
+
+    The log is the active segment: when an append leaves it with `segment_rows` live
+    records, or its oldest record is `segment_seconds` old, its records are rotated
+    into the archive. 0 disables either limit.
+    """
+    def __init__(self, path, segment_rows=None, segment_seconds=None):
+        super().__init__(path)
+        self.archive = SegmentArchive(path)
+        self.segment_rows = int(os.getenv("HISTORY_SEGMENT_ROWS", str(DEFAULT_SEGMENT_ROWS))) \
+            if segment_rows is None else segment_rows
+        self.segment_seconds = float(os.getenv("HISTORY_SEGMENT_SECONDS", "0")) \
+            if segment_seconds is None else segment_seconds
+    def _has_content(self):
+        return self.exists() and os.path.getsize(self.path) > 0
+    def _last_record_id(self):
+        """Return the id of the last non-tombstone row, or else the last archived id."""
+        if self._has_content():
+            for line in read_lines_backwards(self.path):
+                fields = line.split(b",")
+                if fields[0] == b"id":
+                    break
+                if len(fields) > 1 and fields[1] != TOMBSTONE.encode():
+                    return int(fields[0])
+        return self.archive.last_id
+    def _reads_backwards(self):
+        """Return True if the log is in the current format, so it can be read from its end."""
+        if not self._has_content():
+            return False
+        with open(self.path, "rb") as log_file:
+            return log_file.readline().rstrip(b"\r\n").decode() == ",".join(LOG_COLUMNS)
+    def _live_rows_backwards(self):
+        """Yield the live records as tuples, newest first, skipping those with a tombstone."""
+        deleted = set()
+        for line in read_lines_backwards(self.path):
+            fields = line.decode().split(",")
+            if fields[0] == "id":
+                return
+            if fields[1] == TOMBSTONE:
+                deleted.add(int(fields[0]))
+            elif int(fields[0]) not in deleted:
+                yield (int(fields[0]), OPERATION_CODES[fields[1]],
+                       *(float(value) if value else np.nan for value in fields[2:]))
+    def tail_records(self, count, skip=0):
+        """Return up to `count` live records, oldest first, reading only the end of the log."""
+        if not self._reads_backwards():
+            return super().tail_records(count, skip)
+        with file_lock(self.path):
+            rows = list(itertools.islice(self._live_rows_backwards(), skip, skip + count))
+        return np.array(rows[::-1], dtype=RECORD_DTYPE)
+    def replay(self):
+        """Replay the log under the file lock, dropping records that have a tombstone."""
+        with file_lock(self.path):
+            return self._replay()
+    def _replay(self):
+        if not self._has_content():
+            self.rows = self.dead = 0
+            return np.empty(0, dtype=RECORD_DTYPE), True
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+        frame = pd.read_csv(self.path)
+        self.rows = len(frame)
+        if "id" not in frame.columns:
+            self.dead = 0
+            return records_from_frame(frame), True
+        tombstones = frame["operation"] == TOMBSTONE
+        deleted_ids = frame.loc[tombstones, "id"]
+        live = frame[~tombstones & ~frame["id"].isin(deleted_ids)]
+        self.dead = self.rows - len(live)
+        return records_from_frame(live), False
+    def append(self, records):
+        """Append records to the end of the log, numbered after the last id in the file."""
+        with file_lock(self.path):
+            renumber_after(records, self._last_record_id())
+            self._append_rows(records_to_frame(records))
+            self.rows += len(records)
+            if self._rotation_due():
+                self.rotate()
+    def _append_rows(self, frame):
+        """Append rows to the log in a single write and sync it to disk."""
+        text = frame.to_csv(header=not self._has_content(), index=False)
+        with open(self.path, "a", encoding="utf-8", newline="") as log_file:
+            log_file.write(text)
+            log_file.flush()
+            os.fsync(log_file.fileno())
+    def _rotation_due(self):
+        if self.segment_rows and self.rows - self.dead >= self.segment_rows:
+            return True
+        if self.segment_seconds and self._has_content():
+            with open(self.path, "rb") as log_file:
+                log_file.readline()  # Header
+                fields = log_file.readline().split(b",")
+            return len(fields) == len(LOG_COLUMNS) and fields[-1].strip() != b"" and \
+                time.time() - float(fields[-1]) >= self.segment_seconds
+        return False
+    def rotate(self):
+        """Move the log's live records into a new compressed segment and empty the log."""
+        with file_lock(self.path):
+            records, _ = self._replay()
+            if len(records):
+                self.archive.add(records)
+                self._rewrite(records[:0])
+        return len(records)
+    def delete(self, record_ids):
+        """Append tombstone rows marking `record_ids` as deleted."""
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+        frame = pd.DataFrame({"id": record_ids, "operation": TOMBSTONE, "a": np.nan,
+                              "b": np.nan, "result": np.nan, "timestamp": time.time()},
+                             columns=LOG_COLUMNS)
+        with file_lock(self.path):
+            self._append_rows(frame)
+        self.rows += len(record_ids)
+        self.dead += 2 * len(record_ids)  # The deleted records and their tombstones
+    def _rewrite(self, records):
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8", newline="") as log_file:
+            records_to_frame(records).to_csv(log_file, index=False)
+            log_file.flush()
+            os.fsync(log_file.fileno())
+        os.replace(temp_path, self.path)
+        self.rows, self.dead = len(records), 0
+    def rewrite(self, records):
+        """Atomically replace the log with just `records`."""
+        with file_lock(self.path):
+            self._rewrite(records)
+    def compact(self):
+        """Re-read the log and rewrite its live records, all under one lock."""
+        with file_lock(self.path):
+            records, _ = self._replay()
+            self._rewrite(records)
+        return len(records)
+
+class BinaryHistoryFile(HistoryStore):
+    """Fixed-width binary history file, memory-mapped on load, with deletes kept aside.
+
+    Layout: a BINARY_HEADER_DTYPE header followed by packed RECORD_DTYPE records in
+    ascending id order. Records are never modified once written: that is what makes
+    the copy-on-write map safe to use while other processes write the file. Deleting
+    records appends their ids to "<file>.deleted", and rewrite() drops them and
+    removes that file. (Older files may still flag deletes in place with
+    DELETED_OPERATION, counted in the header's dead field; those are dropped too.)
+    """
+    def __init__(self, path):
+        super().__init__(path)
+        self.deleted_path = f"{path}.deleted"
+    def _read_header(self):
+        header = np.fromfile(self.path, dtype=BINARY_HEADER_DTYPE, count=1)
+        if len(header) != 1 or header["magic"][0] != BINARY_MAGIC or \
+                header["record_size"][0] != RECORD_DTYPE.itemsize:
+            raise ValueError(f"'{self.path}' is not a binary history file.")
+        return header[0]
+    def _deleted_ids(self):
+        """Return the ids listed in the tombstone file."""
+        if not os.path.exists(self.deleted_path):
+            return np.empty(0, dtype=np.int64)
+        return np.fromfile(self.deleted_path, dtype="<i8")
+    def _map(self, mode="c"):
+        """Memory-map the records; "c" gives a private copy-on-write view."""
+        count = (os.path.getsize(self.path) - BINARY_HEADER_DTYPE.itemsize) // RECORD_DTYPE.itemsize
+        if count <= 0:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        return np.memmap(self.path, dtype=RECORD_DTYPE, mode=mode,
+                         offset=BINARY_HEADER_DTYPE.itemsize, shape=(count,))
+    def replay(self):
+        """Map the file; without deleted records the map itself is returned (O(1))."""
+        with file_lock(self.path):
+            return self._replay()
+    def _replay(self):
+        if not self.exists():
+            self.rows = self.dead = 0
+            return np.empty(0, dtype=RECORD_DTYPE), True
+        flagged = int(self._read_header()["dead"])
+        deleted = self._deleted_ids()
+        records = self._map()
+        self.rows = len(records)
+        self.dead = flagged + len(deleted)
+        if self.dead:
+            live = ~np.isin(records["id"], deleted)
+            if flagged:
+                live &= records["operation"] != DELETED_OPERATION
+            records = np.ascontiguousarray(records[live])
+        return records, False
+    def append(self, records):
+        """Append packed records to the end of the file, numbered after its last id."""
+        with file_lock(self.path):
+            mapped = self._map(mode="r")
+            renumber_after(records, int(mapped["id"][-1]) if len(mapped) else -1)
+            del mapped
+            with open(self.path, "ab") as history_file:
+                history_file.write(np.ascontiguousarray(records, dtype=RECORD_DTYPE).tobytes())
+        self.rows += len(records)
+    def delete(self, record_ids):
+        """Append the ids of records to delete to the tombstone file; ids are checked by binary search.
+
+        Ids that are no longer in the file (another process compacted them away) or
+        are already deleted are skipped, so none is counted twice.
+        """
+        with file_lock(self.path):
+            records = self._map(mode="r")
+            if not len(records):
+                return
+            record_ids = np.unique(np.asarray(record_ids, dtype=np.int64))
+            positions = np.minimum(np.searchsorted(records["id"], record_ids), len(records) - 1)
+            record_ids = record_ids[(records["id"][positions] == record_ids)
+                                    & (records["operation"][positions] != DELETED_OPERATION)
+                                    & ~np.isin(record_ids, self._deleted_ids())]
+            del records
+            with open(self.deleted_path, "ab") as deleted_file:
+                deleted_file.write(record_ids.astype("<i8").tobytes())
+        self.dead += len(record_ids)
+    def _rewrite(self, records):
+        header = np.zeros(1, dtype=BINARY_HEADER_DTYPE)
+        header["magic"], header["version"], header["record_size"] = \
+            BINARY_MAGIC, BINARY_VERSION, RECORD_DTYPE.itemsize
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as history_file:
+            history_file.write(header.tobytes())
+            history_file.write(np.ascontiguousarray(records, dtype=RECORD_DTYPE).tobytes())
+        os.replace(temp_path, self.path)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.deleted_path)  # Its ids are gone from the new file
+        self.rows, self.dead = len(records), 0
+    def rewrite(self, records):
+        """Atomically replace the file with just `records`."""
+        with file_lock(self.path):
+            self._rewrite(records)
+    def compact(self):
+        """Re-read the file and rewrite its live records, all under one lock."""
+        with file_lock(self.path):
+            records, _ = self._replay()
+            self._rewrite(np.array(records))
+        return len(records)
+
+class SqliteHistoryStore(HistoryStore):
+    """History table in an SQLite database (WAL mode), indexed by id and timestamp.
+
+    Deleted rows are removed outright, so the store never has dead rows to compact.
+    Appends take the next free ids inside the inserting transaction, which keeps ids
+    unique when several processes share the database.
+    """
+    def __init__(self, path):
+        super().__init__(path)
+        self._connection = None
+    @property
+    def connection(self):
+        """Open the database on first use, enabling WAL and creating the schema."""
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, timeout=30, isolation_level=None,
+                                               check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS history (id INTEGER PRIMARY KEY, operation INTEGER NOT NULL, "
+                "a REAL, b REAL, result REAL, timestamp REAL)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS history_timestamp ON history (timestamp)")
+        return self._connection
+    @contextlib.contextmanager
+    def transaction(self):
+        """Run the enclosed statements in one immediate (write-locked) transaction."""
+        connection = self.connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+    def replay(self):
+        """Read every record in id order; opening the connection already created the table."""
+        rows = self.connection.execute(
+            "SELECT id, operation, a, b, result, timestamp FROM history ORDER BY id").fetchall()
+        self.rows, self.dead = len(rows), 0
+        return np.array(rows, dtype=RECORD_DTYPE), False
+    def append(self, records):
+        """Insert records in one transaction, renumbering them past the current maximum id."""
+        with self.transaction() as connection:
+            (max_id,) = connection.execute("SELECT COALESCE(MAX(id), -1) FROM history").fetchone()
+            renumber_after(records, max_id)
+            connection.executemany("INSERT INTO history VALUES (?, ?, ?, ?, ?, ?)", records.tolist())
+        self.rows += len(records)
+    def delete(self, record_ids):
+        """Delete records by primary key in one transaction."""
+        with self.transaction() as connection:
+            connection.executemany("DELETE FROM history WHERE id = ?",
+                                   [(int(record_id),) for record_id in record_ids])
+        self.rows -= len(record_ids)
+    def rewrite(self, records):
+        """Replace the table's contents with just `records` in one transaction."""
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM history")
+            connection.executemany("INSERT INTO history VALUES (?, ?, ?, ?, ?, ?)", records.tolist())
+        self.rows, self.dead = len(records), 0
+    def compact(self):
+        """Return the row count: deleted rows are already gone, so nothing is rewritten.
+
+        Rewriting the table here would drop rows other processes insert meanwhile.
+        """
+        with self.transaction() as connection:
+            (count,) = connection.execute("SELECT COUNT(*) FROM history").fetchone()
+        self.rows, self.dead = count, 0
+        return count
+    def tail_records(self, count, skip=0):
+        """Return up to `count` records, oldest first, ending `skip` records before the newest."""
+        rows = self.connection.execute(
+            "SELECT id, operation, a, b, result, timestamp FROM history "
+            "ORDER BY id DESC LIMIT ? OFFSET ?", (count, skip)).fetchall()
+        return np.array(rows[::-1], dtype=RECORD_DTYPE)
+    def records_between(self, start, end):
+        """Return the records timestamped in [start, end] using the timestamp index."""
+        rows = self.connection.execute(
+            "SELECT id, operation, a, b, result, timestamp FROM history "
+            "WHERE timestamp BETWEEN ? AND ? ORDER BY id", (start, end)).fetchall()
+        return np.array(rows, dtype=RECORD_DTYPE)
+
+STORE_TYPES = {".bin": BinaryHistoryFile, ".db": SqliteHistoryStore, ".sqlite": SqliteHistoryStore}
+
+def open_history_store(path):
+    """Return the store for a history file, chosen by its extension (CSV log by default)."""
+    return STORE_TYPES.get(os.path.splitext(path)[1], HistoryLog)(path)
+
+def default_history_file():
+    """Return the history file named by HISTORY_FILE, or the default for HISTORY_BACKEND."""
+    backend = os.getenv("HISTORY_BACKEND", "csv").strip().lower()
+    if backend not in DEFAULT_HISTORY_FILES:
+        raise ValueError(f"Unknown HISTORY_BACKEND '{backend}'; expected one of {', '.join(DEFAULT_HISTORY_FILES)}.")
+    return os.getenv("HISTORY_FILE") or DEFAULT_HISTORY_FILES[backend]
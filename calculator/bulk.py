@@ -0,0 +1,128 @@
+"""
+bulk module
+This module runs large job files in parallel. A job file is JSON lines of
+{"op": "add", "a": 1, "b": 2} requests ("sqrt" takes no "b"). The main process reads it in shards of
+shard_rows lines and hands them to a process pool. Each worker parses its shard
+into typed arrays, evaluates every operation with one vectorized NumPy call, and
+formats its own output lines. Results come back in input order and are written as
+they arrive, with at most a few shards in flight. The calculated records are merged
+into the main history and saved once at the end.
+"""
+import collections
+import itertools
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import orjson
+from calculator.history import DIVIDE_BY_ZERO, OPERATIONS, OPERATION_CODES, RECORD_DTYPE, power_errors
+
+DEFAULT_SHARD_ROWS = 50_000
+UFUNCS = (np.add, np.subtract, np.multiply, np.divide, np.power, np.mod,
+          lambda a, _: np.sqrt(a))  # Indexed by operation code
+INVALID = {  # operation code -> (test for invalid operands, error)
+    OPERATION_CODES["divide"]: (lambda a, b: b == 0.0, DIVIDE_BY_ZERO),
+    OPERATION_CODES["modulo"]: (lambda a, b: b == 0.0, DIVIDE_BY_ZERO),
+    OPERATION_CODES["sqrt"]: (lambda a, b: a < 0.0, "Cannot take the square root of a negative number."),
+}
+
+BulkReport = collections.namedtuple("BulkReport", ["rows", "errors", "seconds"])
+
+def read_shards(job_file, shard_rows=DEFAULT_SHARD_ROWS):
+    """Yield (first line number, raw bytes) for consecutive blocks of shard_rows lines."""
+    first_line = 1
+    while True:
+        lines = list(itertools.islice(job_file, shard_rows))
+        if not lines:
+            return
+        yield first_line, b"".join(lines)
+        first_line += len(lines)
+
+def parse_shard(lines):
+    """Parse request lines into operation codes and operands, collecting per-line errors."""
+    codes = np.full(len(lines), -1, dtype=np.int8)
+    a, b = np.full(len(lines), np.nan), np.full(len(lines), np.nan)
+    errors = {}
+    for index, line in enumerate(lines):
+        if not line.strip():
+            continue
+        try:
+            request = orjson.loads(line)
+            if request["op"] not in OPERATION_CODES:
+                errors[index] = f"Unknown operation: {request['op']}"
+                continue
+            codes[index] = OPERATION_CODES[request["op"]]
+            a[index] = float(request["a"])
+            b[index] = np.nan if request["op"] == "sqrt" else float(request["b"])
+        except KeyError as e:
+            errors[index] = f"Missing field: {e}"
+        except (orjson.JSONDecodeError, TypeError, ValueError) as e:
+            errors[index] = f"Invalid request: {e}"
+    codes[list(errors)] = -1
+    return codes, a, b, errors
+
+def evaluate_shard(first_line, data):
+    """Evaluate one shard; return (output bytes, history records, error count)."""
+    lines = data.splitlines()
+    codes, a, b, errors = parse_shard(lines)
+    results = np.full(len(lines), np.nan)
+    for code, ufunc in enumerate(UFUNCS):
+        mask = codes == code
+        if code in INVALID:
+            is_invalid, error = INVALID[code]
+            with np.errstate(invalid="ignore"):
+                invalid = mask & is_invalid(a, b)
+            for index in np.flatnonzero(invalid):
+                errors[index] = error
+            mask &= ~invalid
+        with np.errstate(divide="ignore", over="ignore", invalid="ignore"):
+            results[mask] = ufunc(a[mask], b[mask])
+        if code == OPERATION_CODES["power"]:  # Same errors as Calculator.power for non-finite results
+            indices = np.flatnonzero(mask)
+            for index, error in zip(indices, power_errors(a[indices], b[indices], results[indices])):
+                if error:
+                    errors[index] = str(error)
+    valid = codes >= 0
+    valid[list(errors)] = False
+    output = []
+    for index in range(len(lines)):
+        record = {"line": first_line + index}
+        if index in errors:
+            record["error"] = errors[index]
+        elif valid[index]:
+            record["command"], record["result"] = OPERATIONS[codes[index]], results[index]
+        else:
+            continue  # Blank line
+        output.append(orjson.dumps(record, option=orjson.OPT_SERIALIZE_NUMPY))
+    records = np.empty(int(valid.sum()), dtype=RECORD_DTYPE)
+    records["operation"], records["a"], records["b"] = codes[valid], a[valid], b[valid]
+    records["result"], records["timestamp"] = results[valid], time.time()
+    return b"\n".join(output) + b"\n" if output else b"", records, len(errors)
+
+def run_bulk(calculator, job_file, output, workers=None, shard_rows=DEFAULT_SHARD_ROWS):
+    """Run a JSON lines job file (opened in binary mode) across a process pool.
+
+    Output lines go to `output` (a binary stream) in input order; the calculated
+    records are added to the calculator's history, which is saved once at the end.
+    """
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    rows = errors = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = collections.deque()
+        for shard in itertools.chain(read_shards(job_file, shard_rows), [None]):
+            if shard is not None:
+                pending.append(pool.submit(evaluate_shard, *shard))
+            while pending and (shard is None or len(pending) > 2 * workers):
+                chunk, records, shard_errors = pending.popleft().result()
+                output.write(chunk)
+                calculator.data_frame_facade.add_records(records)
+                rows += len(records) + shard_errors
+                errors += shard_errors
+    output.flush()
+    calculator.data_frame_facade.save_history()
+    report = BulkReport(rows, errors, time.perf_counter() - started)
+    logging.info("Bulk run: %d requests (%d errors) in %.3f s with %d workers.",
+                 report.rows, report.errors, report.seconds, workers)
+    return report
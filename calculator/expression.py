@@ -0,0 +1,75 @@
+"""
+expression module
+This module parses arithmetic expressions such as "(3 + 4) * 2 / 7" into reusable
+compiled evaluators. Only numbers, variables (for example "_" for the last result),
+the operators + - * / % ** and parentheses are accepted. Compiled expressions are
+kept in an LRU cache, so evaluating a known formula with new inputs skips parsing,
+and because evaluation is plain arithmetic it works on NumPy arrays as well as scalars.
+Integer constants are compiled as floats, so results overflow to an error instead
+of growing without bound, and non-real results are rejected like Calculator.power does.
+"""
+import ast
+from functools import lru_cache
+import numpy as np
+
+EXPRESSION_CACHE_SIZE = 256
+ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Constant, ast.Name, ast.Load,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Mod, ast.Pow, ast.UAdd, ast.USub,
+)
+
+class ExpressionError(ValueError):
+    """Raised when an expression cannot be parsed or evaluated."""
+
+class CompiledExpression:
+    """An expression compiled once and evaluated against any set of variables."""
+    def __init__(self, source, code, variables):
+        self.source = source
+        self.code = code
+        self.variables = variables
+    def evaluate(self, variables=None):
+        """Evaluate the expression; variables may be numbers or NumPy arrays."""
+        variables = variables or {}
+        missing = self.variables.difference(variables)
+        if missing:
+            raise ExpressionError(f"Undefined variable(s): {', '.join(sorted(missing))}")
+        try:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                result = eval(self.code, {"__builtins__": {}}, dict(variables))  # pylint: disable=eval-used
+        except ZeroDivisionError as e:
+            raise ExpressionError("Division by zero.") from e
+        except OverflowError as e:
+            raise ExpressionError("Result is too large.") from e
+        except TypeError as e:  # e.g. "%" applied to the complex result of a negative base ** fraction
+            raise ExpressionError("Result is not a real number.") from e
+        if np.iscomplexobj(result):
+            raise ExpressionError("Result is not a real number.")
+        return result
+
+class FloatConstants(ast.NodeTransformer):
+    """Turn integer constants into floats, so "**" cannot build unbounded integers."""
+    def visit_Constant(self, node):  # pylint: disable=invalid-name
+        """Replace an int constant with the equal float."""
+        if isinstance(node.value, int):
+            try:
+                return ast.copy_location(ast.Constant(float(node.value)), node)
+            except OverflowError as e:
+                raise ExpressionError("Number is too large.") from e
+        return node
+
+@lru_cache(maxsize=EXPRESSION_CACHE_SIZE)
+def compile_expression(source):
+    """Parse and validate an arithmetic expression, returning a cached CompiledExpression."""
+    try:
+        tree = ast.parse(source.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ExpressionError(f"Invalid expression: {source}") from e
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            raise ExpressionError(f"Unsupported syntax in expression: {type(node).__name__}")
+        if isinstance(node, ast.Constant) and (
+                isinstance(node.value, bool) or not isinstance(node.value, (int, float))):
+            raise ExpressionError(f"Unsupported constant in expression: {node.value!r}")
+    variables = frozenset(node.id for node in ast.walk(tree) if isinstance(node, ast.Name))
+    tree = ast.fix_missing_locations(FloatConstants().visit(tree))
+    return CompiledExpression(source, compile(tree, "<expression>", "eval"), variables)
@@ -0,0 +1,264 @@
+"""
+history module
+This module stores calculation history as typed records instead of formatted
+strings. Records live in a growable NumPy structured array (an int64 record id,
+an int8 operation code plus float64 operands, result and timestamp) and are
+rendered to the familiar "Added 4.0 + 1.0 = 5.0" text only when they are displayed.
+How records are persisted is up to the stores in calculator.backends.
+Pandas is only needed for CSV I/O and DataFrame views, so it is imported on first use
+to keep it off the application's startup path.
+"""
+import logging
+import re
+import time
+import numpy as np
+
+OPERATIONS = ("add", "subtract", "multiply", "divide", "power", "modulo", "sqrt")
+OPERATION_CODES = {name: code for code, name in enumerate(OPERATIONS)}
+TEMPLATES = (
+    "Added {a} + {b} = {result}",
+    "Subtracted {a} - {b} = {result}",
+    "Multiplied {a} * {b} = {result}",
+    "Divided {a} / {b} = {result}",
+    "Raised {a} ^ {b} = {result}",
+    "Took {a} mod {b} = {result}",
+    "Square root of {a} = {result}",
+)
+COLUMNS = ["operation", "a", "b", "result", "timestamp"]
+LOG_COLUMNS = ["id"] + COLUMNS
+RECORD_DTYPE = np.dtype([
+    ("id", "<i8"),
+    ("operation", "i1"),
+    ("a", "<f8"),
+    ("b", "<f8"),
+    ("result", "<f8"),
+    ("timestamp", "<f8"),
+])
+DIVIDE_BY_ZERO = "Cannot divide by zero."
+TOO_LARGE = "Result is too large."
+NOT_REAL = "Result is not a real number."
+LEGACY_PATTERN = re.compile(
+    r"^(Added|Subtracted|Multiplied|Divided) (\S+) [-+*/] (\S+) = (\S+)$")
+LEGACY_VERBS = {"Added": "add", "Subtracted": "subtract", "Multiplied": "multiply", "Divided": "divide"}
+
+def render_entry(operation, a, b, result):
+    """Return the human-readable text for a single history record."""
+    code = OPERATION_CODES.get(operation, -1) if isinstance(operation, str) else int(operation)
+    if not 0 <= code < len(OPERATIONS):
+        raise ValueError(f"Unknown operation: {operation}")
+    return TEMPLATES[code].format(a=float(a), b=float(b), result=float(result))
+
+def power_errors(a, b, results):
+    """Return, for each element of a power, the error power() raises for it, or "" if it is finite."""
+    with np.errstate(invalid="ignore"):
+        return np.where(np.isfinite(results), "",
+                        np.select([(a == 0.0) & (b < 0.0), np.isnan(results)],
+                                  [DIVIDE_BY_ZERO, NOT_REAL], TOO_LARGE))
+
+def iter_rendered(records):
+    """Yield the display text of each record, one line at a time."""
+    for record in records:
+        yield render_entry(int(record["operation"]), record["a"], record["b"], record["result"])
+
+class HistoryBuffer:
+    """Growable structured array of history records with amortized O(1) appends."""
+    def __init__(self, capacity=1024):
+        self._data = np.empty(capacity, dtype=RECORD_DTYPE)
+        self._size = 0
+        self.next_id = 0
+    def __len__(self):
+        return self._size
+    @classmethod
+    def wrap(cls, records):
+        """Return a buffer that uses `records` (e.g. a memory map) as its storage without copying.
+
+        The first append copies the records into a larger in-memory array.
+        """
+        buffer = cls(capacity=0)
+        buffer._data = records
+        buffer._size = len(records)
+        if len(records):
+            buffer.next_id = int(records["id"][-1]) + 1
+        return buffer
+    @property
+    def records(self):
+        """Return a view of the populated records."""
+        return self._data[:self._size]
+    def column(self, name):
+        """Return a view of a single typed column."""
+        return self._data[name][:self._size]
+    def _reserve(self, extra):
+        """Grow the backing array geometrically so it can hold `extra` more records."""
+        needed = self._size + extra
+        if needed > len(self._data):
+            grown = np.empty(max(needed, 2 * len(self._data)), dtype=RECORD_DTYPE)
+            grown[:self._size] = self._data[:self._size]
+            self._data = grown
+    def append(self, operation, a, b, result, timestamp=None):
+        """Append one record under the next record id."""
+        self._reserve(1)
+        self._data[self._size] = (self.next_id, OPERATION_CODES[operation], a, b, result,
+                                  time.time() if timestamp is None else timestamp)
+        self._size += 1
+        self.next_id += 1
+    def append_batch(self, operation, a, b, result, timestamp=None):
+        """Append equal-length operand and result arrays as new records in one copy."""
+        count = len(result)
+        self._reserve(count)
+        batch = self._data[self._size:self._size + count]
+        batch["id"] = np.arange(self.next_id, self.next_id + count)
+        batch["operation"] = OPERATION_CODES[operation]
+        batch["a"], batch["b"], batch["result"] = a, b, result
+        batch["timestamp"] = time.time() if timestamp is None else timestamp
+        self._size += count
+        self.next_id += count
+    def extend(self, records):
+        """Append a structured array of records, keeping their ids, in one copy."""
+        self._reserve(len(records))
+        self._data[self._size:self._size + len(records)] = records
+        self._size += len(records)
+        if len(records):
+            self.next_id = max(self.next_id, int(records["id"].max()) + 1)
+    def delete(self, index):
+        """Remove the record at `index` and return it."""
+        record = self._data[index].copy()
+        self._data[index:self._size - 1] = self._data[index + 1:self._size]
+        self._size -= 1
+        return record
+    def clear(self):
+        """Remove all records; ids keep increasing so they are never reused."""
+        self._size = 0
+    def unsaved_from(self, saved_id):
+        """Return the position of the first record whose id is newer than `saved_id`."""
+        return int(np.searchsorted(self.column("id"), saved_id, side="right"))
+    def render(self, index):
+        """Return the display text of the record at `index`."""
+        record = self._data[index]
+        return render_entry(int(record["operation"]), record["a"], record["b"], record["result"])
+    def render_all(self):
+        """Return the display text of every record."""
+        return [self.render(index) for index in range(self._size)]
+    def to_frame(self):
+        """Return the records as a DataFrame with operation names instead of codes."""
+        return records_to_frame(self.records)
+
+class HistoryStats:
+    """Running aggregates over history results, maintained in O(1) per append or delete.
+
+    The aggregates start stale and are rebuilt with one vectorized pass the first time
+    they are read. Deleting the current minimum or maximum only marks the bounds stale;
+    they are recomputed, again vectorized, on the next read.
+    """
+    def __init__(self):
+        self.counts = np.zeros(len(OPERATIONS), dtype=np.int64)
+        self.total = 0.0
+        self.minimum = np.inf
+        self.maximum = -np.inf
+        self.stale = True
+        self.bounds_stale = False
+    def add(self, operation_code, results):
+        """Account for newly appended results of one operation (a scalar or an array)."""
+        if self.stale:
+            return
+        results = np.asarray(results, dtype=np.float64)
+        if results.size:
+            self.counts[operation_code] += results.size
+            self.total += float(results.sum())
+            self.minimum = min(self.minimum, float(results.min()))
+            self.maximum = max(self.maximum, float(results.max()))
+    def remove(self, operation_code, result):
+        """Account for a deleted result."""
+        if self.stale:
+            return
+        self.counts[operation_code] -= 1
+        self.total -= float(result)
+        if result <= self.minimum or result >= self.maximum:
+            self.bounds_stale = True
+    def summary(self, history):
+        """Return count, per-operation counts, sum, mean, min and max for the buffer."""
+        results = history.column("result")
+        if self.stale:
+            self.counts = np.bincount(history.column("operation"), minlength=len(OPERATIONS))
+            self.total = float(results.sum())
+            self.stale, self.bounds_stale = False, True
+        if self.bounds_stale:
+            self.minimum = float(results.min()) if len(results) else np.inf
+            self.maximum = float(results.max()) if len(results) else -np.inf
+            self.bounds_stale = False
+        count = int(self.counts.sum())
+        return {
+            "count": count,
+            "counts": dict(zip(OPERATIONS, self.counts.tolist())),
+            "sum": self.total,
+            "mean": self.total / count if count else np.nan,
+            "min": self.minimum if count else np.nan,
+            "max": self.maximum if count else np.nan,
+        }
+
+def window_summary(history, start=-np.inf, end=np.inf):
+    """Return the same aggregates as HistoryStats.summary for records timestamped in [start, end]."""
+    timestamps = history.column("timestamp")
+    mask = (timestamps >= start) & (timestamps <= end)
+    results = history.column("result")[mask]
+    count = len(results)
+    return {
+        "count": count,
+        "counts": dict(zip(OPERATIONS, np.bincount(history.column("operation")[mask],
+                                                   minlength=len(OPERATIONS)).tolist())),
+        "sum": float(results.sum()),
+        "mean": float(results.mean()) if count else np.nan,
+        "min": float(results.min()) if count else np.nan,
+        "max": float(results.max()) if count else np.nan,
+    }
+
+def combine_summaries(summaries):
+    """Merge summaries of disjoint sets of records into one summary of all of them."""
+    summaries = [summary for summary in summaries if summary["count"]]
+    count = sum(summary["count"] for summary in summaries)
+    total = float(sum(summary["sum"] for summary in summaries))
+    return {
+        "count": count,
+        "counts": {name: sum(summary["counts"].get(name, 0) for summary in summaries) for name in OPERATIONS},
+        "sum": total,
+        "mean": total / count if count else np.nan,
+        "min": min((summary["min"] for summary in summaries), default=np.nan),
+        "max": max((summary["max"] for summary in summaries), default=np.nan),
+    }
+
+def format_summary(summary):
+    """Render an aggregate summary as two lines of text."""
+    counts = ", ".join(f"{name}: {count}" for name, count in summary["counts"].items())
+    return (f"Calculations: {summary['count']} ({counts})\n"
+            f"Sum: {summary['sum']}  Mean: {summary['mean']}  "
+            f"Min: {summary['min']}  Max: {summary['max']}")
+
+def records_to_frame(records):
+    """Convert structured records to a DataFrame with operation names instead of codes."""
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+    frame = pd.DataFrame({name: records[name] for name in LOG_COLUMNS})
+    frame["operation"] = pd.Categorical.from_codes(records["operation"], OPERATIONS)
+    return frame
+
+def records_from_frame(frame):
+    """Convert a history DataFrame, in the current or legacy format, to structured records."""
+    if "Calculation" in frame.columns:
+        return records_from_legacy(frame["Calculation"])
+    records = np.empty(len(frame), dtype=RECORD_DTYPE)
+    records["id"] = frame["id"].to_numpy() if "id" in frame.columns else np.arange(len(frame))
+    records["operation"] = frame["operation"].map(OPERATION_CODES).to_numpy()
+    for name in COLUMNS[1:]:
+        records[name] = frame[name].to_numpy(dtype=np.float64)
+    return records
+
+def records_from_legacy(calculations):
+    """Parse legacy "Calculation" strings into structured records, skipping unparseable rows."""
+    rows = []
+    for text in calculations.astype(str):
+        match = LEGACY_PATTERN.match(text)
+        if match is None:
+            logging.warning("Skipping unrecognized history entry: %s", text)
+            continue
+        verb, a, b, result = match.groups()
+        rows.append((len(rows), OPERATION_CODES[LEGACY_VERBS[verb]],
+                     float(a), float(b), float(result), np.nan))
+    return np.array(rows, dtype=RECORD_DTYPE)
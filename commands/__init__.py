@@ -4,11 +4,34 @@ and executing plugins through the Command base class
 and the CommandsFactory singleton class, which oversees command registration and execution. 
 To use it, define a plugin by subclassing Command, implement the execute method, and
  utilize CommandsFactory for loading and executing commands.
+Plugins are discovered lazily: a cheap source scan (cached in a manifest keyed by file
+mtimes) registers a LazyCommand per plugin module, and the module is only imported
+the first time its command is executed. The scan also records a plugin's literal
+`max_concurrency` and `cache_policy`, so the plugin pool can read them without
+importing the plugin in the calling process.
+Built-in operations are methods marked with @operation and a declared argument schema;
+operation_commands() turns them into OperationCommand objects that share the
+CommandsFactory registry with plugins, so dispatch is a single dictionary lookup.
+A plugin whose output depends only on its arguments (and optionally on some files or
+environment variables) can declare a `cache_policy = CachePolicy(...)` class
+attribute; CommandsFactory.execute_command then replays its printed output from a
+bounded LRU/TTL cache until one of those inputs changes.
 """
+import ast
+import collections
+import contextlib
 import importlib
+import io
+import json
 import logging
 import os
 import inspect
+import sys
+import threading
+import time
+
+PLUGIN_MANIFEST = ".plugin_manifest.json"
+DEFAULT_CACHE_SIZE = 128  # plugin outputs kept by CommandsFactory; PLUGIN_CACHE_SIZE overrides
 
 # pylint: disable=too-few-public-methods
 class Command:
@@ -17,6 +40,256 @@ class Command:
         """Execute the plugin command with given arguments."""
         raise NotImplementedError("Plugin must implement the execute method.")
 
+class ArgumentError(ValueError):
+    """Raised when a command's arguments do not match its schema."""
+
+class ArgumentSchema:
+    """Declared positional arguments of a command, compiled once into a fast parser.
+
+    `required` and `optional` are (name, type) pairs; with `rest`, the last required
+    argument takes every remaining word, joined by spaces.
+    """
+    TYPE_NAMES = {float: "a number", int: "an integer", str: "text"}
+
+    def __init__(self, *required, optional=(), rest=False):
+        self.arguments = tuple(required) + tuple(optional)
+        self.converters = tuple(convert for _, convert in self.arguments)
+        self.minimum = len(required)
+        self.maximum = float("inf") if rest else len(self.arguments)
+        self.rest = rest
+
+    def usage(self, name):
+        """Return a usage line such as "add A B" or "export_history [PATH]"."""
+        words = [argument.upper() for argument, _ in self.arguments[:self.minimum]]
+        words += [f"[{argument.upper()}]" for argument, _ in self.arguments[self.minimum:]]
+        if self.rest:
+            words[-1] += "..."
+        return " ".join([name] + words)
+
+    def parse(self, name, args):
+        """Check the argument count and convert each argument to its declared type."""
+        if not self.minimum <= len(args) <= self.maximum:
+            raise ArgumentError(f"Usage: {self.usage(name)}")
+        if self.rest:
+            args = tuple(args[:self.minimum - 1]) + (" ".join(args[self.minimum - 1:]),)
+        try:
+            return tuple(convert(arg) for convert, arg in zip(self.converters, args))
+        except ValueError:
+            expected = ", ".join(f"{argument.upper()} must be {self.TYPE_NAMES[convert]}"
+                                 for argument, convert in self.arguments[:len(args)] if convert is not str)
+            raise ArgumentError(f"Invalid arguments for {name}: {expected}.") from None
+
+def operation(*required, optional=(), rest=False, name=None):
+    """Mark a method as a built-in command with the given argument schema.
+
+    The command is named after the method unless `name` is given.
+    """
+    def mark(method):
+        method.operation = (name or method.__name__, ArgumentSchema(*required, optional=optional, rest=rest))
+        return method
+    return mark
+
+class OperationCommand(Command):
+    """A built-in command: a bound method plus the schema its arguments are parsed with."""
+    def __init__(self, name, function, schema):
+        self.name = name
+        self.function = function
+        self.schema = schema
+
+    def execute(self, *args):
+        """Parse the arguments against the schema and call the method, returning its result."""
+        return self.function(*self.schema.parse(self.name, args))
+
+def operation_commands(instance):
+    """Return name -> OperationCommand for every @operation method of `instance`."""
+    commands = {}
+    for _, method in inspect.getmembers(instance, inspect.ismethod):
+        if hasattr(method, "operation"):
+            name, schema = method.operation
+            commands[name] = OperationCommand(name, method, schema)
+    return commands
+
+class CachePolicy:
+    """Declares that a plugin's output may be memoized, and what it depends on.
+
+    Besides the arguments, the cache key includes the values of the `env` variables
+    and the modification time and size of `files` and of the files named by the
+    `file_env` variables, so editing an input file invalidates its entries. Entries
+    expire after `ttl` seconds if given, and commands whose first argument is in
+    `skip` (for example ones with side effects) always run.
+    """
+    def __init__(self, files=(), file_env=(), env=(), ttl=None, skip=()):
+        self.files = tuple(files)
+        self.file_env = tuple(file_env)
+        self.env = tuple(env)
+        self.ttl = ttl
+        self.skip = frozenset(skip)
+
+    def key(self, name, args):
+        """Return the cache key for running command `name` with `args` now, or None to skip the cache."""
+        if args and args[0] in self.skip:
+            return None
+        paths = self.files + tuple(os.getenv(variable) for variable in self.file_env)
+        return (name, tuple(args), tuple(os.getenv(variable) for variable in self.env),
+                tuple(file_signature(path) for path in paths))
+
+def file_signature(path):
+    """Return (path, mtime_ns, size), or (path, None, None) if the file cannot be read."""
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return (path, None, None)
+    return (path, stat.st_mtime_ns, stat.st_size)
+
+class OutputCache:
+    """Bounded LRU cache of plugin outputs, with optional per-entry expiry and hit/miss counts."""
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = collections.OrderedDict()  # key -> (expires at, output)
+        self.counts = collections.defaultdict(lambda: [0, 0])  # command -> [hits, misses]
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached output for key, or None, counting a hit or a miss."""
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self.entries[key]
+                entry = None
+            self.counts[key[0]][entry is None] += 1
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, output, ttl=None):
+        """Store output for key, evicting the least recently used entries beyond maxsize."""
+        with self._lock:
+            self.entries[key] = (time.monotonic() + ttl if ttl is not None else float("inf"), output)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every entry and reset the counts."""
+        with self._lock:
+            self.entries.clear()
+            self.counts.clear()
+
+    def report(self):
+        """Return one line of hit/miss counts per cached command."""
+        with self._lock:
+            counts = sorted(self.counts.items())
+        if not counts:
+            return "Plugin cache: no cacheable plugin commands run yet."
+        return "Plugin cache: " + ", ".join(f"{name} {hits} hits / {misses} misses"
+                                            for name, (hits, misses) in counts)
+
+@contextlib.contextmanager
+def capture_output():
+    """Collect what is printed inside the block, per thread if stdout supports it (server mode)."""
+    capture = getattr(sys.stdout, "capture", None)
+    if capture is not None:
+        with capture() as buffer:
+            yield buffer
+    else:
+        buffer = io.StringIO()
+        with contextlib.redirect_stdout(buffer):
+            yield buffer
+
+class LazyCommand(Command):
+    """Stand-in for a plugin command that imports and instantiates the plugin on first use.
+
+    `declared` holds the class attributes read from the plugin's source by
+    plugin_declarations, so attribute() can answer without importing the plugin.
+    """
+    def __init__(self, package, module_name, declared=None):
+        self.package = package
+        self.module_name = module_name
+        self.declared = dict(declared or {})
+        if "cache_policy" in self.declared:
+            policy = self.declared["cache_policy"]
+            self.declared["cache_policy"] = CachePolicy(*policy["args"], **policy["kwargs"])
+        self._command = None
+
+    def load(self):
+        """Import the plugin module and instantiate its Command subclass (once)."""
+        if self._command is None:
+            module = importlib.import_module(f"{self.package}.{self.module_name}")
+            plugin_classes = [cls for _, cls in inspect.getmembers(module, inspect.isclass)
+                              if issubclass(cls, Command) and cls not in (Command, LazyCommand, OperationCommand)]
+            if not plugin_classes:
+                raise ImportError(f"No Command subclass found in plugin '{self.module_name}'.")
+            self._command = plugin_classes[-1]()
+            logging.info("Plugin '%s' registered successfully.", self._command.__class__.__name__)
+        return self._command
+
+    def attribute(self, name, default=None):
+        """Return a class attribute of the plugin, as declared in its source until it is imported."""
+        if self._command is not None:
+            return getattr(self._command, name, default)
+        return self.declared.get(name, default)
+
+    def execute(self, *args):
+        """Load the plugin if needed and execute it."""
+        return self.load().execute(*args)
+
+def plugin_declarations(source):
+    """Return the attributes declared by the module's Command subclass, or None if it has none.
+
+    Only values that can be read without importing the module are kept: a literal
+    `max_concurrency` and a `cache_policy = CachePolicy(...)` built from literal arguments.
+    """
+    declared = None
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, ast.ClassDef) and any(
+                (isinstance(base, ast.Name) and base.id == "Command") or
+                (isinstance(base, ast.Attribute) and base.attr == "Command") for base in node.bases):
+            declared = {}
+            for statement in node.body:
+                if isinstance(statement, ast.Assign) and len(statement.targets) == 1 and \
+                        isinstance(statement.targets[0], ast.Name):
+                    with contextlib.suppress(ValueError, TypeError, SyntaxError):
+                        declared.update(declared_attribute(statement.targets[0].id, statement.value))
+    return declared
+
+def declared_attribute(name, value):
+    """Return {name: value} for a statically readable plugin attribute, or {}."""
+    if name == "max_concurrency":
+        return {name: ast.literal_eval(value)}
+    if name == "cache_policy" and isinstance(value, ast.Call) and \
+            getattr(value.func, "id", getattr(value.func, "attr", None)) == "CachePolicy":
+        return {name: {"args": [ast.literal_eval(arg) for arg in value.args],
+                       "kwargs": {keyword.arg: ast.literal_eval(keyword.value) for keyword in value.keywords}}}
+    return {}
+
+def discover_plugins(plugins_directory):
+    """Return plugin module name -> declared attributes, scanning only files changed since the cached manifest."""
+    manifest_path = os.path.join(plugins_directory, PLUGIN_MANIFEST)
+    try:
+        with open(manifest_path, encoding="utf-8") as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, ValueError):
+        manifest = {}
+    scanned = {}
+    for entry in os.scandir(plugins_directory):
+        if entry.name.endswith(".py") and not entry.name.startswith("_"):
+            stat = entry.stat()
+            cached = manifest.get(entry.name)
+            if cached and len(cached) == 4 and cached[:2] == [stat.st_mtime_ns, stat.st_size]:
+                scanned[entry.name] = cached
+            else:
+                with open(entry.path, encoding="utf-8") as source_file:
+                    declared = json.loads(json.dumps(plugin_declarations(source_file.read())))  # As reloaded
+                scanned[entry.name] = [stat.st_mtime_ns, stat.st_size, declared is not None, declared or {}]
+    if scanned != manifest:
+        try:
+            with open(manifest_path, "w", encoding="utf-8") as manifest_file:
+                json.dump(scanned, manifest_file)
+        except OSError as e:
+            logging.warning("Could not write plugin manifest %s: %s", manifest_path, e)
+    return {filename[:-3]: declared for filename, (_, _, is_plugin, declared) in sorted(scanned.items()) if is_plugin}
+
 class CommandsFactory: #factory
     """Singleton class to manage loading plugins dynamically."""
     _instance = None
@@ -31,6 +304,7 @@ class CommandsFactory: #factory
         """Initialize instance attributes."""
         if not hasattr(self, 'commands'):
             self.commands = {}
+            self.cache = OutputCache(int(os.getenv("PLUGIN_CACHE_SIZE", str(DEFAULT_CACHE_SIZE))))
 
     def register_command(self, command_name: str, command: Command):
         """Register a command with a given name.
@@ -41,26 +315,55 @@ class CommandsFactory: #factory
     """
         self.commands[command_name] = command
 
-    def execute_command(self, command_name: str):
+    def execute_command(self, command_name: str, *args):
         """Easier to ask for forgiveness than 
             permission (EAFP) - 
-            Use when it's most likely to work."""
+            Use when it's most likely to work.
+
+        Plugins with a cache_policy replay their cached output when their inputs are unchanged.
+        """
         try:
-            self.commands[command_name].execute()
+            command = self.commands[command_name]
             # depends on command_name calling the concrete command class
         except KeyError:
             logging.error("No such command: %s", command_name)
+            return None
+        if isinstance(command, LazyCommand):
+            command.load()  # It runs right away, so read its real attributes
+        policy, key = self.cache_key(command_name, args)
+        if key is None:
+            return command.execute(*args)
+        output = self.cache.get(key)
+        if output is None:
+            with capture_output() as buffer:
+                command.execute(*args)
+            output = buffer.getvalue()
+            self.cache.put(key, output, policy.ttl)
+        sys.stdout.write(output)
+        return None
+
+    def plugin_attribute(self, command_name, name, default=None):
+        """Return a class attribute of a command's plugin, without importing a plugin not loaded yet."""
+        command = self.commands[command_name]
+        if isinstance(command, LazyCommand):
+            return command.attribute(name, default)
+        return getattr(command, name, default)
+
+    def cache_key(self, command_name, args):
+        """Return (cache policy, key) for a command's output, or (None, None) if it is not cached."""
+        policy = self.plugin_attribute(command_name, "cache_policy")
+        key = policy.key(command_name, args) if policy is not None else None
+        return (policy, key) if key is not None else (None, None)
+
+    def register_commands(self, commands):
+        """Register several commands at once, e.g. a calculator's operation_commands()."""
+        self.commands.update(commands)
 
-    def import_plugins(self, plugins_directory):
-        """Dynamically load plugins from the specified directory."""
-        for filename in os.listdir(plugins_directory):
-            if filename.endswith(".py") and not filename.startswith("_"):
-                module_name = filename[:-3]  # removed .py which is of 3 characters
-                module = importlib.import_module(f"plugins.{module_name}")
-                # Register each class that inherits from Command
-                for _, cls in inspect.getmembers(module, inspect.isclass):
-                    if issubclass(cls, Command) and cls is not Command:
-                        self.create_plugin(module_name, cls())
+    def import_plugins(self, plugins_directory, package="plugins"):
+        """Register plugins from the specified directory; each is imported on first execution."""
+        for module_name, declared in discover_plugins(plugins_directory).items():
+            self.commands[module_name] = LazyCommand(package, module_name, declared)
+            logging.info("Plugin '%s' discovered.", module_name)
 
     def create_plugin(self, command_name, plugin):
         """Register a new plugin and its commands."""
@@ -69,5 +372,5 @@ class CommandsFactory: #factory
             self.commands[command_name] = plugin
 
     def all_plugins(self):
-        """List all available plugin commands."""
-        return list(self.commands.keys())
+        """List all available plugin commands (not the built-in operations)."""
+        return [name for name, command in self.commands.items() if not isinstance(command, OperationCommand)]
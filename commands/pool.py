@@ -0,0 +1,282 @@
+"""
+Plugin worker pool.
+
+PluginPool runs plugin commands off the caller's thread so a slow plugin (such as
+``csv`` on a huge file) never freezes the REPL or the server. Each submitted command
+becomes a Job that can be waited on, run in the background, or cancelled.
+
+- ``kind="thread"``: commands run in a thread pool, and what they print is captured
+  per thread. sys.stdout is only replaced by the capturing proxy while thread jobs
+  are running, so the REPL prompts on the real stdout (and keeps readline) otherwise.
+  A timed-out or cancelled thread cannot be interrupted. Its output is discarded,
+  and it keeps its slot until it returns.
+- ``kind="process"``: each command runs in its own child process, which is
+  terminated on timeout or cancellation, so a runaway plugin is really stopped.
+  Cacheable plugins are looked up in the parent's output cache before a child is
+  started, and the child's output is stored there afterwards. The plugin is never
+  imported in the calling process: its ``max_concurrency`` and ``cache_policy`` are
+  read from the discovery manifest, so only literal values count there.
+
+Each plugin runs at most ``per_plugin`` commands at once; a plugin class can lower
+that with a ``max_concurrency`` attribute. Further commands for it wait in a queue.
+Every job has a timeout (``timeout`` seconds, or None for no limit). Finished jobs
+stay listed in ``jobs`` (for the REPL's ``jobs``/``wait``/``cancel``) until
+``history`` newer ones have finished, so a long-running server does not keep
+every output it ever produced.
+"""
+import collections
+import concurrent.futures
+import contextlib
+import io
+import itertools
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+from commands import CommandsFactory, capture_output
+
+DEFAULT_WORKERS = 4
+DEFAULT_TIMEOUT = 30.0  # seconds
+DEFAULT_HISTORY = 100  # finished jobs kept in PluginPool.jobs
+
+class PluginTimeout(TimeoutError):
+    """Raised by a job that ran longer than its timeout and was cancelled."""
+
+class ThreadLocalStdout(io.TextIOBase):
+    """A sys.stdout stand-in that sends each thread's writes to its own capture buffer."""
+    def __init__(self, default):
+        super().__init__()
+        self.default = default
+        self._local = threading.local()
+
+    @property
+    def target(self):
+        """Return the calling thread's capture buffer, or the real stdout."""
+        buffer = getattr(self._local, "buffer", None)
+        return self.default if buffer is None else buffer
+
+    @property
+    def encoding(self):
+        return self.default.encoding
+
+    @property
+    def errors(self):
+        return self.default.errors
+
+    def fileno(self):
+        return self.default.fileno()
+
+    def isatty(self):
+        return self.default.isatty()
+
+    def write(self, text):
+        return self.target.write(text)
+
+    def flush(self):
+        self.target.flush()
+
+    @contextlib.contextmanager
+    def capture(self):
+        """Collect everything the calling thread prints inside the block (captures may nest)."""
+        previous = getattr(self._local, "buffer", None)
+        self._local.buffer = io.StringIO()
+        try:
+            yield self._local.buffer
+        finally:
+            self._local.buffer = previous
+
+class Job:
+    """One submitted plugin command; `future` resolves to the text it printed."""
+    def __init__(self, job_id, name, args):
+        self.id = job_id
+        self.name = name
+        self.args = args
+        self.status = "queued"  # queued, running, done, failed, cancelled, timed out
+        self.future = concurrent.futures.Future()
+        self.process = None
+        self.timer = None
+
+    def describe(self):
+        """Return a one-line summary such as "[2] running  csv page 3"."""
+        return f"[{self.id}] {self.status:<10} {' '.join((self.name,) + tuple(self.args))}"
+
+def run_in_child(name, args, connection):
+    """Child-process entry point: run one plugin command and send back (ok, output or error)."""
+    factory = CommandsFactory()
+    if name not in factory.commands:  # Not inherited when the child was not forked
+        factory.import_plugins(os.getenv("PLUGIN_FILE_PATH", "plugins"))
+    try:
+        with capture_output() as output:
+            factory.execute_command(name, *args)
+        connection.send((True, output.getvalue()))
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        connection.send((False, f"{type(e).__name__}: {e}"))
+    finally:
+        connection.close()
+
+class PluginPool:
+    """Runs plugin commands on worker threads or in child processes, with limits and timeouts."""
+    def __init__(self, factory=None, workers=DEFAULT_WORKERS, kind="thread",
+                 timeout=DEFAULT_TIMEOUT, per_plugin=None, history=DEFAULT_HISTORY):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown plugin pool kind: {kind} (expected thread or process)")
+        self.factory = factory or CommandsFactory()
+        self.kind = kind
+        self.timeout = timeout
+        self.per_plugin = per_plugin or workers
+        self.jobs = {}  # id -> Job, in submission order: unfinished ones and the latest finished ones
+        self.history = history
+        self._finished = collections.deque()  # ids of finished jobs still in `jobs`, oldest first
+        self._ids = itertools.count(1)
+        self._running = collections.Counter()  # plugin -> jobs holding a slot
+        self._waiting = collections.defaultdict(collections.deque)  # plugin -> queued jobs
+        self._lock = threading.RLock()  # _start may run _finish inline
+        # In process mode the threads only supervise child processes
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="plugin")
+        self._stdout = None  # The capturing proxy this pool installed, while thread jobs run
+        self._capturing = 0  # Thread jobs holding a slot
+        methods = multiprocessing.get_all_start_methods()
+        self._context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+    @classmethod
+    def from_environment(cls, factory=None):
+        """Build a pool configured by PLUGIN_POOL, PLUGIN_WORKERS, PLUGIN_TIMEOUT and PLUGIN_CONCURRENCY."""
+        timeout = float(os.getenv("PLUGIN_TIMEOUT", str(DEFAULT_TIMEOUT)))
+        return cls(factory, workers=int(os.getenv("PLUGIN_WORKERS", str(DEFAULT_WORKERS))),
+                   kind=os.getenv("PLUGIN_POOL", "thread").strip().lower(),
+                   timeout=timeout if timeout > 0 else None,
+                   per_plugin=int(os.getenv("PLUGIN_CONCURRENCY", "0")) or None)
+
+    def limit(self, name):
+        """Return how many commands of plugin `name` may run at once."""
+        return min(self.factory.plugin_attribute(name, "max_concurrency", self.per_plugin), self.per_plugin)
+
+    def submit(self, name, *args):
+        """Queue a plugin command and return its Job; it starts as soon as its plugin has a free slot."""
+        if name not in self.factory.commands:
+            raise KeyError(f"No such command: {name}")
+        limit = self.limit(name)
+        job = Job(next(self._ids), name, args)
+        with self._lock:
+            self.jobs[job.id] = job
+            if self._running[name] < limit:
+                self._start(job)
+            else:
+                self._waiting[name].append(job)
+        return job
+
+    def _start(self, job):
+        """Give a job a slot and hand it to a worker (called with the lock held)."""
+        self._running[job.name] += 1
+        job.status = "running"
+        if self.kind == "thread":
+            self._hold_stdout()
+        if self.timeout is not None:
+            job.timer = threading.Timer(self.timeout, self.cancel, (job, "timed out"))
+            job.timer.daemon = True
+            job.timer.start()
+        run = self._run_thread if self.kind == "thread" else self._run_process
+        self._executor.submit(run, job).add_done_callback(lambda inner: self._finish(job, inner))
+
+    def _hold_stdout(self):
+        """Install the per-thread capturing stdout for one more thread job (called with the lock held)."""
+        if self._capturing == 0 and not hasattr(sys.stdout, "capture"):
+            self._stdout = sys.stdout = ThreadLocalStdout(sys.stdout)
+        self._capturing += 1
+
+    def _release_stdout(self):
+        """Give the real stdout back once no thread job is left (called with the lock held)."""
+        self._capturing -= 1
+        if self._capturing == 0 and self._stdout is not None:
+            if sys.stdout is self._stdout:
+                sys.stdout = self._stdout.default
+            self._stdout = None
+
+    def _run_thread(self, job):
+        """Run the command on this worker thread and return what it printed."""
+        with capture_output() as output:
+            self.factory.execute_command(job.name, *job.args)
+        return output.getvalue()
+
+    def _run_process(self, job):
+        """Run the command in a child process, which cancel() may terminate, or replay its cached output."""
+        policy, key = self.factory.cache_key(job.name, job.args)
+        if key is not None:
+            output = self.factory.cache.get(key)
+            if output is not None:
+                return output
+        receiver, sender = self._context.Pipe(duplex=False)
+        with self._lock:
+            if job.status != "running":
+                return ""  # Cancelled before the worker picked it up
+            job.process = self._context.Process(target=run_in_child, args=(job.name, job.args, sender),
+                                                daemon=True)
+            job.process.start()
+        sender.close()
+        try:
+            ok, result = receiver.recv()
+        except EOFError as e:
+            raise RuntimeError(f"Plugin process exited with code {job.process.exitcode}") from e
+        finally:
+            job.process.join()
+            receiver.close()
+        if not ok:
+            raise RuntimeError(result)
+        if key is not None:
+            self.factory.cache.put(key, result, policy.ttl)
+        return result
+
+    def _finish(self, job, inner):
+        """Release the job's slot, start the next queued job and resolve the job's future."""
+        if job.timer is not None:
+            job.timer.cancel()
+        with self._lock:
+            self._running[job.name] -= 1
+            if self.kind == "thread":
+                self._release_stdout()
+            if self._waiting[job.name]:
+                self._start(self._waiting[job.name].popleft())
+            if job.future.done():
+                return  # Cancelled or timed out: the result is discarded
+            error = inner.exception()
+            job.status = "failed" if error else "done"
+            self._forget_oldest(job)
+        if error:
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(inner.result())
+
+    def _forget_oldest(self, job):
+        """Count `job` as finished and drop the oldest finished jobs beyond `history` (lock held)."""
+        self._finished.append(job.id)
+        while len(self._finished) > self.history:
+            del self.jobs[self._finished.popleft()]
+
+    def cancel(self, job, reason="cancelled"):
+        """Cancel a queued or running job; returns False if it had already finished."""
+        with self._lock:
+            if job.future.done():
+                return False
+            if job.status == "queued":
+                self._waiting[job.name].remove(job)
+            job.status = reason
+            if job.process is not None and job.process.is_alive():
+                job.process.terminate()
+            self._forget_oldest(job)
+        if reason == "timed out":
+            job.future.set_exception(PluginTimeout(f"'{job.name}' timed out after {self.timeout:g} s"))
+        else:
+            job.future.cancel()
+        logging.warning("Plugin job %s %s: %s", job.id, reason, job.name)
+        return True
+
+    def shutdown(self):
+        """Cancel every unfinished job, stop the workers and restore stdout."""
+        for job in list(self.jobs.values()):
+            self.cancel(job)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            if self._stdout is not None and sys.stdout is self._stdout:
+                sys.stdout = self._stdout.default
+            self._stdout = None
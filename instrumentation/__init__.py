@@ -0,0 +1,155 @@
+"""
+instrumentation module
+This module records where command time goes. Every command, whether an arithmetic or
+history operation or a plugin, is timed as a whole and by phase: "parse", "execute",
+and inside the calculator "history" (the record append) and "logging". Each
+(command, phase) pair keeps a log-scale latency histogram. Recording is O(1), and
+the p50/p95/p99 are read from the histogram to within about 12%.
+
+The `stats` command shows the table, and `stats export [FILE]` writes it as JSON.
+Setting PROFILE_COMMANDS=1 also runs each command under cProfile and dumps the
+profile to logs/profiles/ (PROFILE_DIR overrides the directory) for offline analysis.
+"""
+import contextlib
+import contextvars
+import cProfile
+import json
+import math
+import os
+import threading
+import time
+import numpy as np
+
+BUCKETS_PER_DECADE = 20
+MIN_EXPONENT = -7  # 100 ns
+MAX_EXPONENT = 3   # 1000 s
+PERCENTILES = (50, 95, 99)
+DEFAULT_EXPORT_FILE = "logs/command_stats.json"
+DEFAULT_PROFILE_DIR = "logs/profiles"
+NOT_TIMED = contextlib.nullcontext()  # Returned by phase() when no command is being timed
+
+class LatencyHistogram:
+    """Counts of durations in log-spaced buckets, with exact count, total and maximum."""
+    def __init__(self):
+        self.buckets = np.zeros((MAX_EXPONENT - MIN_EXPONENT) * BUCKETS_PER_DECADE + 1, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+    def record(self, seconds):
+        """Add one duration."""
+        index = int((math.log10(max(seconds, 1e-12)) - MIN_EXPONENT) * BUCKETS_PER_DECADE)
+        self.buckets[min(max(index, 0), len(self.buckets) - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        self.maximum = max(self.maximum, seconds)
+    def percentile(self, percent):
+        """Return the upper edge of the bucket holding the given percentile (capped at the maximum)."""
+        if not self.count:
+            return float("nan")
+        index = int(np.searchsorted(np.cumsum(self.buckets), math.ceil(self.count * percent / 100)))
+        return min(10 ** (MIN_EXPONENT + (index + 1) / BUCKETS_PER_DECADE), self.maximum)
+    def summary(self):
+        """Return count, mean, max and the PERCENTILES as a dict of seconds."""
+        summary = {"count": self.count, "mean": self.total / self.count if self.count else float("nan"),
+                   "max": self.maximum}
+        summary.update({f"p{percent}": self.percentile(percent) for percent in PERCENTILES})
+        return summary
+
+class CommandMetrics:
+    """Latency histograms per (command, phase), with the current command tracked per context."""
+    def __init__(self):
+        self.histograms = {}
+        self._lock = threading.Lock()
+        self._current = contextvars.ContextVar("command", default=None)
+        self._profiles = 0
+    def record(self, command, phase, seconds):
+        """Add one duration for a command's phase."""
+        with self._lock:
+            histogram = self.histograms.get((command, phase))
+            if histogram is None:
+                histogram = self.histograms[(command, phase)] = LatencyHistogram()
+            histogram.record(seconds)
+    @contextlib.contextmanager
+    def command(self, name):
+        """Time the enclosed block as one run of `name`, profiling it if PROFILE_COMMANDS is set."""
+        token = self._current.set(name)
+        profiler = cProfile.Profile() if profiling_enabled() else None
+        started = time.perf_counter()
+        try:
+            if profiler is not None:
+                profiler.enable()
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                self.dump_profile(name, profiler)
+            self.record(name, "total", time.perf_counter() - started)
+            self._current.reset(token)
+    def current(self):
+        """Return the name of the command being timed in this context, or None."""
+        return self._current.get()
+    def phase(self, phase, command=None):
+        """Time the enclosed block as a phase of `command`, or of the command currently running.
+
+        Without a command to charge it to, this is a no-op context manager.
+        """
+        command = command or self._current.get()
+        if command is None:
+            return NOT_TIMED
+        return self._timed_phase(command, phase)
+    @contextlib.contextmanager
+    def _timed_phase(self, command, phase):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(command, phase, time.perf_counter() - started)
+    def dump_profile(self, name, profiler):
+        """Write a command's profile to PROFILE_DIR as <sequence>-<command>.prof."""
+        directory = os.getenv("PROFILE_DIR", DEFAULT_PROFILE_DIR)
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            self._profiles += 1
+            sequence = self._profiles
+        profiler.dump_stats(os.path.join(directory, f"{sequence:06d}-{name}.prof"))
+    def reset(self):
+        """Forget every recorded duration."""
+        with self._lock:
+            self.histograms.clear()
+    def summaries(self):
+        """Return [(command, phase, summary)] sorted by command, with "total" first."""
+        with self._lock:
+            items = list(self.histograms.items())
+        return [(command, phase, histogram.summary()) for (command, phase), histogram
+                in sorted(items, key=lambda item: (item[0][0], item[0][1] != "total", item[0][1]))]
+    def report(self):
+        """Render the summaries as a table, in milliseconds."""
+        rows = self.summaries()
+        if not rows:
+            return "No commands recorded yet."
+        lines = [f"{'command':<24}{'phase':<10}{'count':>8}"
+                 + "".join(f"{'p' + str(percent):>10}" for percent in PERCENTILES) + f"{'max':>10}"]
+        for command, phase, summary in rows:
+            lines.append(f"{command:<24}{phase:<10}{summary['count']:>8}"
+                         + "".join(f"{summary[f'p{percent}'] * 1000:10.3f}" for percent in PERCENTILES)
+                         + f"{summary['max'] * 1000:10.3f}")
+        lines.append("(latencies in ms)")
+        return "\n".join(lines)
+    def export(self, path=DEFAULT_EXPORT_FILE):
+        """Write the summaries and raw bucket counts to a JSON file."""
+        with self._lock:
+            items = list(self.histograms.items())
+        data = {"bucket_edges": {"min_exponent": MIN_EXPONENT, "buckets_per_decade": BUCKETS_PER_DECADE},
+                "commands": [{"command": command, "phase": phase, **histogram.summary(),
+                              "buckets": histogram.buckets.tolist()}
+                             for (command, phase), histogram in items]}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as export_file:
+            json.dump(data, export_file, indent=2)
+        return path
+
+def profiling_enabled():
+    """Return True when PROFILE_COMMANDS asks for a cProfile capture of every command."""
+    return os.getenv("PROFILE_COMMANDS", "").strip().lower() in ("1", "true", "yes", "on")
+
+METRICS = CommandMetrics()
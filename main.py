@@ -1,4 +1,70 @@
-"""Start the application instance."""
-from app import App
-app = App()
-app.start()
\ No newline at end of file
+"""Start the application instance, interactively, in script mode or as a server."""
+import argparse
+import asyncio
+import contextlib
+import sys
+import time
+
+def parse_arguments(argv=None):
+    """Parse command-line options."""
+    parser = argparse.ArgumentParser(description="Command-line calculator.")
+    parser.add_argument("--script", metavar="FILE",
+                        help="run commands from FILE ('-' for stdin) without prompting")
+    parser.add_argument("--json", action="store_true",
+                        help="emit script-mode results as JSON lines")
+    parser.add_argument("--startup-profile", action="store_true",
+                        help="report import and initialization time per startup phase on stderr")
+    parser.add_argument("--bulk", metavar="FILE",
+                        help="evaluate a JSON lines job file of {op, a, b} requests in parallel")
+    parser.add_argument("--output", metavar="FILE",
+                        help="where --bulk writes its JSON lines results (default: stdout)")
+    parser.add_argument("--workers", type=int, help="--bulk worker processes (default: CPU count)")
+    parser.add_argument("--serve", action="store_true",
+                        help="serve commands as a JSON API over HTTP instead of reading stdin")
+    parser.add_argument("--host", default="127.0.0.1", help="server mode bind address")
+    parser.add_argument("--port", type=int, default=8080, help="server mode HTTP port")
+    parser.add_argument("--tcp-port", type=int,
+                        help="also serve line-delimited commands over TCP on this port")
+    return parser.parse_args(argv)
+
+def run_bulk_job(app, args):
+    """Run a --bulk job file and report its throughput on stderr."""
+    from calculator.bulk import run_bulk  # pylint: disable=import-outside-toplevel
+    with open(args.bulk, "rb") as job_file, \
+            (open(args.output, "wb") if args.output else contextlib.nullcontext(sys.stdout.buffer)) as output:
+        report = run_bulk(app.calculator, job_file, output, workers=args.workers)
+    rate = report.rows / report.seconds if report.seconds else 0.0
+    print(f"Processed {report.rows} requests ({report.errors} errors) in {report.seconds:.3f} s: "
+          f"{rate:,.0f} requests/s.", file=sys.stderr)
+
+def main(argv=None):
+    """Run the REPL, a server, or stream commands when a script is given or stdin is piped."""
+    args = parse_arguments(argv)
+    started = time.perf_counter()
+    from app import App  # pylint: disable=import-outside-toplevel  # Timed for --startup-profile
+    import_seconds = time.perf_counter() - started
+    interactive = args.script is None and args.bulk is None and not args.serve and sys.stdin.isatty()
+    app = App(script_mode=not interactive and not args.serve)
+    app.startup_timings.insert(0, ("import app", import_seconds))
+    app.load_plugins()
+    if args.startup_profile:
+        print(app.startup_report(), file=sys.stderr)
+    if args.bulk:
+        run_bulk_job(app, args)
+    elif args.serve:
+        from server import CalculatorServer  # pylint: disable=import-outside-toplevel
+        try:
+            asyncio.run(CalculatorServer(app).serve(args.host, args.port, args.tcp_port))
+        except KeyboardInterrupt:
+            pass
+    elif interactive:
+        app.start()
+    elif args.script in (None, "-"):
+        app.run_script(sys.stdin, json_lines=args.json)
+    else:
+        with open(args.script, encoding="utf-8") as script:
+            app.run_script(script, json_lines=args.json)
+    app.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Query engine behind the Csv plugin's filter, group-by and aggregate subcommands.
+
+A query such as ``where Category=Gadgets group Category sum Price*Stock`` is parsed
+into conditions, an optional group column and an aggregate over an arithmetic
+expression (compiled with calculator.expression). Queries stream the file in chunks,
+reading only the columns they need and filtering each chunk before aggregating it.
+Equality conditions on a column with a persistent index (built with
+``csv index COLUMN``) read just the matching lines instead of scanning the file.
+This module starts with an underscore so plugin discovery does not treat it as a plugin.
+"""
+import hashlib
+import io
+import json
+import os
+import re
+from collections import namedtuple
+import numpy as np
+from calculator.expression import compile_expression
+
+AGGREGATES = ("count", "sum", "mean", "min", "max")
+CHUNK_ROWS = 100_000
+CONDITION_PATTERN = re.compile(r"^(\w+)(!=|>=|<=|=|>|<)(.+)$")
+
+Condition = namedtuple("Condition", ["column", "operator", "value"])
+Query = namedtuple("Query", ["conditions", "group_by", "aggregate", "expression"])
+
+def parse_query(args):
+    """Parse `where C=V [and ...] [group COLUMN] [AGGREGATE [EXPRESSION]]` into a Query."""
+    args = list(args)
+    conditions, group_by, aggregate, expression = [], None, None, None
+    if args and args[0] == "where":
+        args.pop(0)
+        while args and args[0] not in AGGREGATES and args[0] != "group":
+            token = args.pop(0)
+            if token == "and":
+                continue
+            match = CONDITION_PATTERN.match(token)
+            if match is None:
+                raise ValueError(f"Invalid condition: {token}")
+            conditions.append(Condition(*match.groups()))
+    if len(args) >= 2 and args[0] == "group":
+        group_by = args[1]
+        args = args[2:]
+    if args and args[0] in AGGREGATES:
+        aggregate = args[0]
+        expression = " ".join(args[1:]) or None
+        if aggregate != "count" and expression is None:
+            raise ValueError(f"'{aggregate}' needs an expression, e.g. {aggregate} Price*Stock")
+        args = []
+    if args or not (conditions or aggregate):
+        raise ValueError("Usage: csv where COLUMN=VALUE [and ...] [group COLUMN] [count|sum|mean|min|max EXPR]")
+    return Query(conditions, group_by, aggregate, expression)
+
+def index_path(filename, column):
+    """Return the path of the persistent index for a column of a CSV file."""
+    return f"{filename}.{column}.idx"
+
+def index_keys(values, numeric):
+    """Return the index keys of column values: floats for numeric columns, 64-bit hashes of text otherwise.
+
+    Hash collisions only add candidate rows; queries re-check every condition on the rows they read.
+    """
+    if numeric:
+        return np.asarray(values, dtype=np.float64)
+    return np.fromiter((int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), "little")
+                        for value in values), dtype=np.uint64, count=len(values))
+
+def build_index(filename, column):
+    """Scan the file once and write the byte offset of every line, sorted by its value in `column`.
+
+    Values are parsed the way pandas parses the column, so an indexed lookup matches exactly the
+    rows a full scan compares equal. The index is a JSON header line followed by the sorted keys
+    and their offsets, which load_index memory-maps so a lookup reads only its own entries.
+    """
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+    stat = os.stat(filename)
+    series = pd.read_csv(filename, usecols=[column])[column]
+    numeric = pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+    if not (numeric or pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+        raise ValueError(f"Only text and numeric columns can be indexed; '{column}' is {series.dtype}.")
+    offsets = []
+    with open(filename, "rb") as source:
+        position = len(source.readline())
+        for line in source:
+            if line.strip():
+                offsets.append(position)
+            position += len(line)
+    if len(offsets) != len(series):
+        raise ValueError(f"Cannot index '{column}': some rows span several lines.")
+    present = series.notna().to_numpy()  # Missing values never compare equal
+    keys = index_keys(series[present].to_numpy(), numeric)
+    order = np.argsort(keys, kind="stable")  # Equal keys keep their offsets in file order
+    header = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "numeric": numeric, "rows": len(keys)}
+    with open(index_path(filename, column), "wb") as index_file:
+        index_file.write(json.dumps(header).encode() + b"\n")
+        index_file.write(keys[order].tobytes())
+        index_file.write(np.asarray(offsets, dtype=np.int64)[present][order].tobytes())
+    return len(np.unique(keys))
+
+class ColumnIndex:
+    """A column index loaded by load_index: sorted keys and line offsets, memory-mapped."""
+    def __init__(self, path, header, start):
+        self.numeric = header["numeric"]
+        rows = header["rows"]
+        key_dtype = np.float64 if self.numeric else np.uint64
+        if rows:
+            self.keys = np.memmap(path, dtype=key_dtype, mode="r", offset=start, shape=rows)
+            self.offsets = np.memmap(path, dtype=np.int64, mode="r", offset=start + 8 * rows, shape=rows)
+        else:  # Nothing to map
+            self.keys, self.offsets = np.empty(0, dtype=key_dtype), np.empty(0, dtype=np.int64)
+
+    def lookup(self, value):
+        """Return the offsets of the lines whose value may equal `value`, compared in the column's type."""
+        key = index_keys([float(value) if self.numeric else value], self.numeric)[0]
+        first, last = np.searchsorted(self.keys, key, "left"), np.searchsorted(self.keys, key, "right")
+        return self.offsets[first:last].tolist()
+
+def load_index(filename, column):
+    """Return the ColumnIndex for a column, or None if there is no up-to-date index."""
+    path = index_path(filename, column)
+    try:
+        with open(path, "rb") as index_file:
+            header = json.loads(index_file.readline())
+            start = index_file.tell()
+    except (OSError, ValueError):
+        return None
+    stat = os.stat(filename)
+    if (header.get("mtime_ns"), header.get("size")) != (stat.st_mtime_ns, stat.st_size) or "numeric" not in header:
+        return None
+    return ColumnIndex(path, header, start)
+
+def read_indexed_rows(filename, offsets):
+    """Read only the lines at the given byte offsets and parse them with the file's header."""
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+    with open(filename, "rb") as source:
+        lines = [source.readline()]
+        for offset in sorted(offsets):
+            source.seek(offset)
+            lines.append(source.readline())
+    return pd.read_csv(io.BytesIO(b"".join(line if line.endswith(b"\n") else line + b"\n"
+                                           for line in lines)))
+
+def condition_mask(frame, condition):
+    """Return a boolean mask of rows satisfying the condition, compared in the column's type."""
+    series = frame[condition.column]
+    value = float(condition.value) if series.dtype.kind in "iuf" else condition.value
+    operators = {"=": series.__eq__, "!=": series.__ne__, ">": series.__gt__,
+                 "<": series.__lt__, ">=": series.__ge__, "<=": series.__le__}
+    return operators[condition.operator](value)
+
+def iter_matching_chunks(filename, query):
+    """Yield filtered chunks, using a column index for an equality condition when available."""
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+    for condition in query.conditions:
+        if condition.operator == "=":
+            index = load_index(filename, condition.column)
+            if index is not None:
+                chunks = [read_indexed_rows(filename, index.lookup(condition.value))]
+                break
+    else:
+        compiled = compile_expression(query.expression) if query.expression else None
+        needed = {condition.column for condition in query.conditions}
+        needed |= {query.group_by} if query.group_by else set()
+        needed |= compiled.variables if compiled else set()
+        usecols = (sorted(needed) or [0]) if query.aggregate else None  # Plain filters print whole rows
+        chunks = pd.read_csv(filename, chunksize=CHUNK_ROWS, usecols=usecols)
+    for chunk in chunks:
+        mask = pd.Series(True, index=chunk.index)
+        for condition in query.conditions:
+            mask &= condition_mask(chunk, condition)
+        yield chunk[mask]
+
+def run_query(filename, query):
+    """Run a query and return a DataFrame of matching rows, a scalar or a grouped Series."""
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+    if query.aggregate is None:
+        pieces = list(iter_matching_chunks(filename, query))
+        return pd.concat(pieces) if pieces else pd.DataFrame()
+    compiled = compile_expression(query.expression) if query.expression else None
+    partials = []
+    for chunk in iter_matching_chunks(filename, query):
+        values = (compiled.evaluate({name: chunk[name].to_numpy() for name in compiled.variables})
+                  if compiled else 1.0)
+        partial = pd.DataFrame({"value": values}, index=chunk.index)
+        partial["group"] = chunk[query.group_by] if query.group_by else ""
+        partials.append(partial.groupby("group")["value"].agg(["count", "sum", "min", "max"]))
+    empty = 0 if query.aggregate in ("count", "sum") else float("nan")
+    if not partials:
+        return empty
+    combined = pd.concat(partials).groupby(level=0).agg(
+        {"count": "sum", "sum": "sum", "min": "min", "max": "max"})
+    result = combined["sum"] / combined["count"] if query.aggregate == "mean" else combined[query.aggregate]
+    result.index.name = query.group_by
+    return result if query.group_by else (result.iloc[0] if len(result) else empty)
@@ -1,25 +1,126 @@
 """
 Csv module.
 
-This module defines the Csv class, which is a plugin for the 
-Command framework. It provides functionality to read and display 
+This module defines the Csv class, which is a plugin for the
+Command framework. It provides functionality to read and display
 data from a specified CSV file.
+
+Output is paged (``csv``, ``csv head N``, ``csv page K [SIZE]``) rather than
+rendering the whole file. Files within CSV_MEMORY_BUDGET bytes are parsed once and
+cached until their modification time or size changes; larger files are streamed
+in chunks and only the requested rows are kept.
+
+Queries (``csv where Category=Gadgets sum Price*Stock``, ``csv group Category count``)
+and per-column indexes (``csv index Category``) are handled by plugins._csv_query.
+Printed output is memoized by CommandsFactory until the product file changes.
 """
 import logging
 import os
-import pandas as pd
-from commands import Command
+from commands import CachePolicy, Command
+from plugins._csv_query import AGGREGATES, build_index, parse_query, run_query
+
+DEFAULT_PAGE_SIZE = 20
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024  # bytes
+CHUNK_ROWS = 100_000
+USAGE = "Usage: csv [head N | page K [SIZE]]"
+QUERY_COMMANDS = ("where", "group", "index") + AGGREGATES
+
+def memory_budget():
+    """Return the largest file size, in bytes, that is parsed whole and cached."""
+    return int(os.getenv("CSV_MEMORY_BUDGET", str(DEFAULT_MEMORY_BUDGET)))
+
+def parse_page_arguments(args):
+    """Translate the plugin arguments into a (first row, row count) pair; N, K and SIZE must be positive."""
+    if not args:
+        return 0, DEFAULT_PAGE_SIZE
+    if args[0] == "head" and len(args) == 2:
+        page, size = 1, int(args[1])
+    elif args[0] == "page" and len(args) in (2, 3):
+        page = int(args[1])
+        size = int(args[2]) if len(args) == 3 else DEFAULT_PAGE_SIZE
+    else:
+        raise ValueError(USAGE)
+    if page < 1 or size < 1:
+        raise ValueError(USAGE)
+    return (page - 1) * size, size
+
 class Csv(Command):
     """A plugin that displays data from a CSV file."""
+    _cache = {}  # path -> (mtime_ns, size, DataFrame)
+    # Output depends only on the arguments and the product file; `index` writes a file, so it always runs
+    cache_policy = CachePolicy(file_env=("PRODUCT_FILE_PATH",), skip=("index",))
 
     @staticmethod
-    def execute():
-        """Execute the data command to display contents of a CSV file."""
+    def load(filename):
+        """Return the parsed file, reusing the cached frame while the file is unchanged."""
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+        stat = os.stat(filename)
+        cached = Csv._cache.get(filename)
+        if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+        df = pd.read_csv(filename)
+        Csv._cache[filename] = (stat.st_mtime_ns, stat.st_size, df)
+        return df
+
+    @staticmethod
+    def read_rows(filename, start, count):
+        """Return rows [start, start + count) of the file, streaming it in chunks if it is large."""
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+        if os.stat(filename).st_size <= memory_budget():
+            return Csv.load(filename).iloc[start:start + count]
+        pieces, seen = [], 0
+        with pd.read_csv(filename, chunksize=CHUNK_ROWS) as reader:
+            for chunk in reader:
+                if seen + len(chunk) > start:
+                    pieces.append(chunk.iloc[max(start - seen, 0):start + count - seen])
+                seen += len(chunk)
+                if seen >= start + count:
+                    break
+        return pd.concat(pieces) if pieces else pd.DataFrame()
+
+    @staticmethod
+    def query(filename, args):
+        """Run an index build or a filter/group/aggregate query and print its result."""
+        if args[0] == "index":
+            if len(args) != 2:
+                raise ValueError("Usage: csv index COLUMN")
+            values = build_index(filename, args[1])
+            print(f"Indexed column '{args[1]}': {values} distinct values.")
+            return
+        query = parse_query(args)
+        result = run_query(filename, query)
+        if query.aggregate is None:
+            print(result.head(DEFAULT_PAGE_SIZE).to_string())
+            print(f"{len(result)} matching rows.")
+        elif query.group_by:
+            print(result.to_string())
+        else:
+            print(f"{query.aggregate}({query.expression or ''}) = {result}")
+
+    @staticmethod
+    def execute(*args):
+        """Execute the data command to display one page of a CSV file, or run a query."""
         filename = os.getenv("PRODUCT_FILE_PATH")
+        if args and args[0] in QUERY_COMMANDS:
+            try:
+                Csv.query(filename, args)
+                logging.info("Ran csv query on %s: %s", filename, " ".join(args))
+            except (ValueError, KeyError) as e:
+                print(f"Error: {e}")
+                logging.error("Invalid csv query '%s': %s", " ".join(args), e)
+            except FileNotFoundError:
+                print(f"Error: The file '{filename}' was not found.")
+                logging.error("File not found: %s", filename)
+            return
+        try:
+            start, count = parse_page_arguments(args)
+        except ValueError:
+            print(USAGE)
+            logging.error("Invalid csv arguments: %s", " ".join(args))
+            return
         try:
-            df = pd.read_csv(filename)
-            logging.info(df)
-            print(df.to_string())
+            df = Csv.read_rows(filename, start, count)
+            print(df.to_string() if not df.empty else "No rows on this page.")
             logging.info("Displayed data from CSV file: %s", filename)
         except FileNotFoundError:
             print(f"Error: The file '{filename}' was not found.")
@@ -6,10 +6,11 @@ Command framework. It provides functionality to greet users by
 printing specified arguments along with a greeting message.
 """
 import logging
-from commands import Command
+from commands import CachePolicy, Command
 
 class Greet(Command):
     """An example plugin that provides additional functionality."""
+    cache_policy = CachePolicy()  # Pure: the output never changes
     @staticmethod
     def execute():
         """Execute the greet command with two arguments."""
@@ -0,0 +1,206 @@
+"""
+Server mode: the calculator and its plugins as a JSON API on one asyncio event loop.
+
+Two front ends share one dispatcher:
+- HTTP (aiohttp): POST /command with {"command": "add", "args": [1, 2]}, or a list
+  of such objects; GET /commands lists what is available.
+- Line-delimited TCP: one command per line, either plain text ("add 1 2") or a JSON
+  object, answered with one JSON line per command.
+
+Arithmetic is cheap and runs on the event loop. Everything that touches the disk
+runs on worker threads so it never stalls the loop: the history commands in
+FILE_COMMANDS go through asyncio.to_thread, and plugin commands (such as the
+pandas-based Csv plugin) run in a commands.pool.PluginPool, which captures their
+printed output and enforces the plugin timeout. History is not written per request:
+a background task appends everything calculated since the last flush in one write
+per interval, also on a worker thread, and save_history requests wait for, and
+share, the next flush.
+"""
+import asyncio
+import contextlib
+import logging
+from collections.abc import Iterator
+import orjson  # Third-party import
+from aiohttp import web  # Third-party import
+from commands.pool import PluginPool  # First-party import
+from instrumentation import METRICS  # First-party import
+
+DEFAULT_FLUSH_INTERVAL = 0.5  # seconds between batched history writes
+FILE_COMMANDS = frozenset({  # Calculator commands that read or write history files
+    "history", "history_stats", "load_history", "export_history", "compact_history",
+    "rotate_history", "clear_history", "delete_history_record"})
+
+class CalculatorServer:
+    """Serve an App's calculator and plugin commands to many concurrent clients."""
+    def __init__(self, app, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.app = app
+        self.app.calculator.echo = False
+        self.flush_interval = flush_interval
+        self.supported_commands = set(app.get_supported_commands())
+        self.pool = None
+        self._flush_task = None
+        self._flush_waiters = []
+
+    async def start(self):
+        """Start the plugin pool (configured by the PLUGIN_* settings) and the batched history writer."""
+        self.pool = PluginPool.from_environment(self.app.command_handler)
+        self._flush_task = asyncio.create_task(self.flush_periodically())
+
+    async def close(self):
+        """Write any pending history and stop the plugin pool."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._flush_task
+            self._flush_task = None
+        await self.flush_history()
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    async def flush_history(self):
+        """Append every record calculated since the last flush, off the loop, and wake save_history requests.
+
+        An idle flush writes and logs nothing.
+        """
+        facade = self.app.calculator.data_frame_facade
+        waiters, self._flush_waiters = self._flush_waiters, []
+        try:
+            written = await asyncio.to_thread(facade.flush_changes)
+        except asyncio.CancelledError:
+            self._flush_waiters[:0] = waiters  # Answered by the flush in close()
+            raise
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logging.error("Batched history write failed: %s", e)
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_exception(e)
+            return
+        if written or waiters:
+            logging.info("History saved to '%s'.", facade.history_file)
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result("History saved.")
+
+    async def flush_periodically(self):
+        """Flush the history every flush_interval seconds."""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush_history()
+
+    async def save_history(self):
+        """Wait for the next batched flush instead of writing the history right away."""
+        waiter = asyncio.get_running_loop().create_future()
+        self._flush_waiters.append(waiter)
+        return await waiter
+
+    async def dispatch(self, operation, arguments):
+        """Execute one command and return its result record; known commands are timed in METRICS."""
+        known = operation in self.supported_commands or operation in self.app.command_handler.commands
+        with METRICS.command(operation) if known else contextlib.nullcontext():
+            return await self._dispatch(operation, arguments)
+
+    async def _dispatch(self, operation, arguments):
+        """Run the command behind dispatch, turning exceptions into error records."""
+        record = {"command": operation}
+        try:
+            if operation == "stats":
+                record["output"] = self.app.stats_command(*arguments)
+            elif operation == "save_history":
+                record["result"] = await self.save_history()
+            elif operation in FILE_COMMANDS:
+                self._store_result(record, await asyncio.to_thread(self._execute, operation, arguments))
+            elif operation in self.supported_commands:
+                self._store_result(record, self._execute(operation, arguments))
+            elif operation in self.app.command_handler.commands:
+                job = self.pool.submit(operation, *arguments)
+                record["output"] = await asyncio.wrap_future(job.future)
+            else:
+                record["error"] = f"No such command: {operation}"
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            record["error"] = str(e)
+        return record
+
+    def _execute(self, operation, arguments):
+        """Run a calculator command, reading streamed rows (e.g. from history) to the end."""
+        result = self.app.calculator.execute(operation, *arguments)
+        return list(result) if isinstance(result, Iterator) else result
+
+    @staticmethod
+    def _store_result(record, result):
+        record["lines" if isinstance(result, list) else "result"] = result
+
+    async def dispatch_request(self, request):
+        """Execute a {"command": ..., "args": [...]} object and return its result record."""
+        if not isinstance(request, dict) or not isinstance(request.get("command"), str):
+            return {"error": 'Expected an object like {"command": "add", "args": [1, 2]}'}
+        return await self.dispatch(request["command"], [str(arg) for arg in request.get("args", [])])
+
+    async def handle_command(self, request):
+        """HTTP handler: run one command object, or a list of them concurrently."""
+        try:
+            payload = orjson.loads(await request.read())
+        except orjson.JSONDecodeError as e:
+            return web.json_response({"error": f"Invalid JSON: {e}"}, status=400, dumps=dumps)
+        if isinstance(payload, list):
+            records = await asyncio.gather(*(self.dispatch_request(item) for item in payload))
+            return web.json_response(list(records), dumps=dumps)
+        return web.json_response(await self.dispatch_request(payload), dumps=dumps)
+
+    async def handle_commands_list(self, _request):
+        """HTTP handler: list the calculator and plugin commands."""
+        return web.json_response({"commands": sorted(self.supported_commands),
+                                  "plugins": self.app.command_handler.all_plugins()}, dumps=dumps)
+
+    def web_app(self):
+        """Return the aiohttp application, starting and stopping the server with it."""
+        application = web.Application()
+        application.router.add_post("/command", self.handle_command)
+        application.router.add_get("/commands", self.handle_commands_list)
+        application.on_startup.append(lambda _: self.start())
+        application.on_cleanup.append(lambda _: self.close())
+        return application
+
+    async def handle_stream(self, reader, writer):
+        """TCP handler: answer each line (plain text or JSON) with one JSON line."""
+        try:
+            while line := await reader.readline():
+                text = line.decode().strip()
+                if not text:
+                    continue
+                if text.startswith("{"):
+                    try:
+                        record = await self.dispatch_request(orjson.loads(text))
+                    except orjson.JSONDecodeError as e:
+                        record = {"error": f"Invalid JSON: {e}"}
+                else:
+                    operation, *arguments = text.split()
+                    record = await self.dispatch(operation, arguments)
+                writer.write(orjson.dumps(record, option=orjson.OPT_SERIALIZE_NUMPY) + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8080, tcp_port=None):
+        """Serve HTTP on port (and line-delimited TCP on tcp_port) until cancelled."""
+        runner = web.AppRunner(self.web_app())
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        logging.info("Serving the calculator API on http://%s:%d", host, port)
+        tcp_server = None
+        if tcp_port is not None:
+            tcp_server = await asyncio.start_server(self.handle_stream, host, tcp_port)
+            logging.info("Serving line-delimited commands on %s:%d", host, tcp_port)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            if tcp_server is not None:
+                tcp_server.close()
+                await tcp_server.wait_closed()
+            await runner.cleanup()
+
+def dumps(value):
+    """Serialize a response body with orjson, including NumPy scalars."""
+    return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY).decode()
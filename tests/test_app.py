@@ -1,4 +1,8 @@
 """Unit tests for the App class and its REPL functionality."""
+import io
+import json
+import subprocess
+import sys
 import pytest
 from app import App
 
@@ -115,3 +119,24 @@ def test_divide(app, monkeypatch, capsys):
     # Capture the printed output
     captured = capsys.readouterr()
     assert "Result: 2.0" in captured.out
+def test_run_script(app):
+    """Test streaming commands through script mode without prompting."""
+    output = io.StringIO()
+    app.run_script(["add 2 3", "", "# comment", "unknown_command", "exit", "add 1 1"], output)
+    assert output.getvalue() == "Result: 5.0\nError: No such command: unknown_command\n"
+def test_run_script_json_lines(app):
+    """Test that script mode can emit results as JSON lines."""
+    output = io.StringIO()
+    app.run_script(["multiply 2 3", "divide 1 0"], output, json_lines=True)
+    first, second = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert first == {"line": 1, "command": "multiply", "result": 6.0}
+    assert second["error"] == "Cannot divide by zero."
+def test_startup_is_lazy():
+    """Test that constructing the App neither imports pandas nor reads the history file."""
+    code = ("import sys; from app import App; app = App(); "
+            "assert 'pandas' not in sys.modules; "
+            "assert app.calculator.data_frame_facade._history is None; "
+            "print(app.startup_report())")
+    completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert "calculator" in completed.stdout
+    assert "pandas loaded: no" in completed.stdout
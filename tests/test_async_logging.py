@@ -0,0 +1,39 @@
+"""Tests for queue-based asynchronous logging."""
+import io
+import logging
+from async_logging import (BatchingQueueListener, async_logging_settings,
+                           enable_async_logging, stop_async_logging)
+
+def test_async_logging_batches_and_flushes_on_stop():
+    """Test that queued records reach the original handler, in order, once stopped."""
+    logger = logging.getLogger("test_async_logging")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+    logger.addHandler(handler)
+    try:
+        listener = enable_async_logging(logger, batch_size=16)
+        assert isinstance(listener, BatchingQueueListener)
+        assert handler not in logger.handlers
+        for i in range(100):
+            logger.info("record %d", i)
+        stop_async_logging()
+        lines = stream.getvalue().splitlines()
+        assert lines == [f"INFO record {i}" for i in range(100)]
+        assert logger.handlers == [handler]
+    finally:
+        stop_async_logging()
+        logger.removeHandler(handler)
+
+def test_async_logging_settings(tmp_path, monkeypatch):
+    """Test reading the [async] section of logging.conf and the LOG_ASYNC override."""
+    config = tmp_path / "logging.conf"
+    config.write_text("[async]\nenabled=true\nbatch_size=32\n")
+    monkeypatch.delenv("LOG_ASYNC", raising=False)
+    assert async_logging_settings(str(config)) == (True, 32)
+    monkeypatch.setenv("LOG_ASYNC", "false")
+    assert async_logging_settings(str(config)) == (False, 32)
+    monkeypatch.setenv("LOG_ASYNC", "1")
+    assert async_logging_settings(str(tmp_path / "missing.conf")) == (True, 256)
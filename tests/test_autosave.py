@@ -0,0 +1,85 @@
+"""Tests for the background history autosaver."""
+import time
+from calculator import DataFrameFacade
+from calculator.autosave import Autosaver
+from calculator.backends import open_history_store
+
+def wait_for(condition, timeout=5.0):
+    """Poll until condition() is true or the timeout passes."""
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+def test_burst_is_coalesced_into_few_writes(tmp_path):
+    """Test that a burst of entries past max_pending is flushed early, in few writes."""
+    history_file = str(tmp_path / "history.csv")
+    facade = DataFrameFacade(history_file)
+    autosaver = Autosaver(facade, interval=60, max_pending=50, debounce=0.2).start()
+    for i in range(120):
+        facade.add_entry("add", i, i, 2 * i)
+    assert wait_for(lambda: autosaver.flushes >= 1)
+    assert autosaver.flushes == 1
+    records, _ = open_history_store(history_file).replay()
+    assert len(records) == 120
+    autosaver.stop()
+    assert facade.autosaver is None
+
+def test_deletes_and_clears_wait_for_the_flush(tmp_path):
+    """Test that deletes and clears are written by the autosaver, and stop() flushes them."""
+    history_file = str(tmp_path / "history.csv")
+    facade = DataFrameFacade(history_file)
+    facade.add_entry("add", 1, 1, 2)
+    facade.add_entry("add", 2, 2, 4)
+    facade.save_history()
+    autosaver = Autosaver(facade, interval=60).start()
+    facade.delete_entry(0)
+    assert len(open_history_store(history_file).replay()[0]) == 2  # Not written yet
+    autosaver.stop()
+    assert list(open_history_store(history_file).replay()[0]["id"]) == [1]
+    Autosaver(facade, interval=60).start()
+    facade.clear_history()
+    facade.add_entry("multiply", 3, 3, 9)
+    facade.autosaver.stop()
+    records, _ = open_history_store(history_file).replay()
+    assert list(records["operation"]) == [2] and list(records["id"]) == [2]
+
+def test_flush_follows_renumbering_by_another_writer(tmp_path):
+    """Test that ids stay sorted and unique when another process saved first."""
+    history_file = str(tmp_path / "history.csv")
+    mine, other = DataFrameFacade(history_file), DataFrameFacade(history_file)
+    mine.add_entry("add", 1, 1, 2)
+    other.add_entry("subtract", 5, 1, 4)
+    other.save_history()
+    assert mine.flush_changes()
+    mine.add_entry("add", 2, 2, 4)
+    mine.save_history()
+    assert list(mine.history.column("id")) == [1, 2]
+    assert list(open_history_store(history_file).replay()[0]["id"]) == [0, 1, 2]
+
+def test_from_environment(monkeypatch, tmp_path):
+    """Test that HISTORY_AUTOSAVE turns autosave on and sets the interval."""
+    facade = DataFrameFacade(str(tmp_path / "history.csv"))
+    monkeypatch.delenv("HISTORY_AUTOSAVE", raising=False)
+    assert Autosaver.from_environment(facade) is None
+    monkeypatch.setenv("HISTORY_AUTOSAVE", "2.5")
+    monkeypatch.setenv("HISTORY_AUTOSAVE_ENTRIES", "10")
+    autosaver = Autosaver.from_environment(facade)
+    assert (autosaver.interval, autosaver.max_pending) == (2.5, 10)
+
+def test_clear_drops_archived_segments_before_the_flush(tmp_path):
+    """Test that stats, tails and deletes see nothing archived right after a deferred clear."""
+    history_file = str(tmp_path / "history.csv")
+    facade = DataFrameFacade(history_file)
+    facade.store.segment_rows = 3
+    for i in range(4):
+        facade.add_entry("add", i, i, 2 * i)
+        facade.save_history()
+    assert (facade.archive.rows, len(facade.history)) == (3, 1)
+    autosaver = Autosaver(facade, interval=60).start()
+    facade.clear_history()
+    assert facade.history_stats()["count"] == 0
+    assert len(facade.recent_records(10)) == 0
+    assert facade.delete_entry(0) == "Invalid index. No record deleted."
+    autosaver.stop()
+    assert DataFrameFacade(history_file).history_stats()["count"] == 0
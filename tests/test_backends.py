@@ -0,0 +1,211 @@
+"""Tests for the pluggable history stores."""
+import multiprocessing
+import os
+import sqlite3
+import time
+import pytest
+from calculator import DataFrameFacade
+from calculator.backends import (BinaryHistoryFile, HistoryLog, SqliteHistoryStore,
+                                 default_history_file, open_history_store, read_lines_backwards)
+
+def test_open_history_store_by_extension(tmp_path):
+    """Test that the store type follows the history file's extension."""
+    assert isinstance(open_history_store(str(tmp_path / "h.csv")), HistoryLog)
+    assert isinstance(open_history_store(str(tmp_path / "h.bin")), BinaryHistoryFile)
+    assert isinstance(open_history_store(str(tmp_path / "h.db")), SqliteHistoryStore)
+
+def test_default_history_file(monkeypatch):
+    """Test choosing the history file from HISTORY_BACKEND and HISTORY_FILE."""
+    monkeypatch.delenv("HISTORY_FILE", raising=False)
+    monkeypatch.setenv("HISTORY_BACKEND", "sqlite")
+    assert default_history_file() == "calcHistory.db"
+    monkeypatch.setenv("HISTORY_FILE", "custom.bin")
+    assert default_history_file() == "custom.bin"
+    monkeypatch.setenv("HISTORY_BACKEND", "parquet")
+    with pytest.raises(ValueError, match="Unknown HISTORY_BACKEND"):
+        default_history_file()
+
+def test_sqlite_store_round_trip(tmp_path):
+    """Test appends, indexed deletes and reloads with the SQLite store in WAL mode."""
+    history_file = str(tmp_path / "history.db")
+    facade = DataFrameFacade(history_file)
+    for i in range(4):
+        facade.add_entry("subtract", 10, i, 10 - i, timestamp=100.0 + i)
+    facade.save_history()
+    facade.delete_entry(0)
+    reloaded = DataFrameFacade(history_file)
+    assert list(reloaded.history.column("id")) == [1, 2, 3]
+    assert reloaded.history_window(101.5, 200)["count"] == 2
+    connection = sqlite3.connect(history_file)
+    assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert connection.execute("SELECT COUNT(*) FROM history").fetchone()[0] == 3
+
+def test_sqlite_store_shared_between_writers(tmp_path):
+    """Test that two facades appending to one database never reuse an id."""
+    history_file = str(tmp_path / "shared.db")
+    first, second = DataFrameFacade(history_file), DataFrameFacade(history_file)
+    first.add_entry("add", 1, 1, 2)
+    second.add_entry("add", 2, 2, 4)
+    first.save_history()
+    second.save_history()
+    second.add_entry("add", 3, 3, 6)
+    second.save_history()
+    assert list(second.history.column("id")) == [1, 2]
+    results = DataFrameFacade(history_file).history.column("result")
+    assert list(results) == [2, 4, 6]
+
+def test_sqlite_compact_keeps_rows_saved_meanwhile(tmp_path):
+    """Test that compacting the SQLite store never rewrites the table over other writers' rows."""
+    history_file = str(tmp_path / "shared.db")
+    first, second = DataFrameFacade(history_file), DataFrameFacade(history_file)
+    first.add_entry("add", 1, 1, 2)
+    first.save_history()
+    second.add_entry("add", 2, 2, 4)
+    second.save_history()
+    assert first.compact_history() == 2
+    assert open_history_store(history_file).replay()[1] is False
+    assert len(DataFrameFacade(history_file).history) == 2
+
+@pytest.mark.parametrize("name", ["shared.csv", "shared.bin"])
+def test_file_stores_shared_between_writers(tmp_path, name):
+    """Test that interleaved saves and compaction from two facades keep every record."""
+    history_file = str(tmp_path / name)
+    first, second = DataFrameFacade(history_file), DataFrameFacade(history_file)
+    first.add_entry("add", 1, 1, 2)
+    second.add_entry("add", 2, 2, 4)
+    first.save_history()
+    second.save_history()
+    first.add_entry("add", 3, 3, 6)
+    first.save_history()
+    first.delete_entry(0)
+    assert second.compact_history() == 2  # Re-reads the file instead of trusting memory
+    reloaded = DataFrameFacade(history_file).history
+    assert sorted(reloaded.column("result")) == [4, 6]
+    assert len(set(reloaded.column("id"))) == 2
+
+def append_from_process(history_file, count):
+    """Save `count` records one at a time, as a separate process."""
+    facade = DataFrameFacade(history_file)
+    for i in range(count):
+        facade.add_entry("multiply", i, 2, 2 * i)
+        facade.save_history()
+
+@pytest.mark.parametrize("name", ["shared.csv", "shared.db"])
+def test_concurrent_processes_append(tmp_path, name):
+    """Test that processes appending to one store never lose or reuse ids."""
+    history_file = str(tmp_path / name)
+    processes = [multiprocessing.Process(target=append_from_process, args=(history_file, 25))
+                 for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    ids = DataFrameFacade(history_file).history.column("id")
+    assert sorted(ids) == list(range(100))
+
+@pytest.mark.parametrize("name", ["history.csv", "history.bin", "history.db"])
+def test_tail_and_range_without_loading(tmp_path, name):
+    """Test reading the newest records and a time range straight from each store."""
+    history_file = str(tmp_path / name)
+    facade = DataFrameFacade(history_file)
+    for i in range(10):
+        facade.add_entry("add", i, i, 2 * i, timestamp=100.0 + i)
+    facade.save_history()
+    facade.delete_entry(8)
+    store = open_history_store(history_file)
+    assert list(store.tail_records(3)["id"]) == [6, 7, 9]
+    assert list(store.tail_records(3, skip=3)["id"]) == [3, 4, 5]
+    assert list(store.tail_records(5, skip=7)["id"]) == [0, 1]
+    assert list(store.records_between(102.5, 108.5)["id"]) == [3, 4, 5, 6, 7]
+    assert store.tail_records(2)["result"][-1] == 18.0
+
+@pytest.mark.parametrize("name", ["history.csv", "history.bin", "history.db"])
+def test_range_with_records_out_of_time_order(tmp_path, name):
+    """Test that a time range finds records that were appended after newer ones."""
+    history_file = str(tmp_path / name)
+    facade = DataFrameFacade(history_file)
+    for i, timestamp in enumerate([100.0, 105.0, 101.0, 110.0, 99.0]):
+        facade.add_entry("add", i, i, 2 * i, timestamp=timestamp)
+    facade.save_history()
+    facade.delete_entry(1)
+    store = open_history_store(history_file)
+    assert list(store.records_between(100.0, 106.0)["id"]) == [0, 2]
+    assert list(store.records_between(98.0, 99.5)["id"]) == [4]
+
+def test_read_lines_backwards_across_blocks(tmp_path):
+    """Test that lines split across read blocks come back whole and in reverse order."""
+    path = tmp_path / "lines.txt"
+    path.write_bytes(b"".join(f"line {i}\n".encode() for i in range(50)))
+    assert list(read_lines_backwards(str(path), block_size=7)) == \
+        [f"line {i}".encode() for i in reversed(range(50))]
+
+def test_rotation_keeps_only_the_active_segment_in_memory(tmp_path):
+    """Test size-based rotation into gzip segments and lazy reads of archived records."""
+    history_file = str(tmp_path / "history.csv")
+    facade = DataFrameFacade(history_file)
+    facade.store.segment_rows = 4
+    for i in range(10):
+        facade.add_entry("add", i, 1, i + 1, timestamp=100.0 + i)
+        facade.save_history()
+    archive = facade.archive
+    assert [entry["rows"] for entry in archive.segments] == [4, 4]
+    assert all(os.path.exists(tmp_path / entry["file"]) for entry in archive.segments)
+    assert list(facade.history.column("id")) == [8, 9]
+    reloaded = DataFrameFacade(history_file)
+    assert len(reloaded.history) == 2 and reloaded.history_stats()["count"] == 10
+    assert list(reloaded.recent_records(3, skip=5)["id"]) == [2, 3, 4]
+    assert list(reloaded.records_between(102.5, 108.5)["id"]) == [3, 4, 5, 6, 7, 8]
+    assert reloaded.delete_entry(5) == "Deleted record: Added 5.0 + 1.0 = 6.0"
+    assert [entry["rows"] for entry in reloaded.archive.segments] == [4, 3]
+    reloaded.add_entry("add", 0, 0, 0)
+    reloaded.save_history()
+    assert int(reloaded.history.column("id")[-1]) == 10
+    export = tmp_path / "export.csv"
+    reloaded.export_history(str(export))
+    assert len(export.read_text().splitlines()) == 1 + 10
+    reloaded.clear_history()
+    assert reloaded.archive.rows == 0 and reloaded.history_stats()["count"] == 0
+
+def test_time_based_rotation(tmp_path):
+    """Test that an append rotates the log once its oldest record is too old."""
+    store = HistoryLog(str(tmp_path / "history.csv"), segment_rows=0, segment_seconds=3600)
+    facade = DataFrameFacade(store.path)
+    facade.store = store
+    facade.add_entry("multiply", 2, 3, 6, timestamp=time.time() - 7200)
+    facade.save_history()
+    assert store.archive.rows == 1 and store.rows == 0
+    facade.add_entry("multiply", 2, 4, 8)
+    facade.save_history()
+    assert store.archive.rows == 1 and store.rows == 1
+
+def test_binary_delete_skips_ids_no_longer_in_the_file(tmp_path):
+    """Test that deleting an id another process already compacted away leaves other records alone."""
+    history_file = str(tmp_path / "shared.bin")
+    first = DataFrameFacade(history_file)
+    first.add_entry("add", 1, 1, 2)
+    first.add_entry("add", 2, 2, 4)
+    first.save_history()
+    first.delete_entry(0)
+    first.compact_history()
+    store = open_history_store(history_file)
+    store.delete([0, 0, 7])  # Compacted away, repeated, and past the end
+    assert list(store.replay()[0]["id"]) == [1] and store.dead == 0
+    store.delete([1])
+    store.delete([1])
+    assert len(store.replay()[0]) == 0 and store.dead == 1
+
+def test_binary_delete_leaves_mapped_records_unchanged(tmp_path):
+    """Test that a delete by another writer never changes records a loaded history has mapped."""
+    history_file = str(tmp_path / "shared.bin")
+    writer = DataFrameFacade(history_file)
+    writer.add_entry("divide", 9, 3, 3)
+    writer.add_entry("add", 1, 1, 2)
+    writer.save_history()
+    reader = DataFrameFacade(history_file)
+    assert reader.history.render(0) == "Divided 9.0 / 3.0 = 3.0"
+    open_history_store(history_file).delete([0])
+    assert reader.history.render(0) == "Divided 9.0 / 3.0 = 3.0"
+    assert reader.history_stats()["counts"]["divide"] == 1
+    assert list(DataFrameFacade(history_file).history.column("id")) == [1]
+    assert writer.compact_history() == 1
+    assert not os.path.exists(f"{history_file}.deleted")
@@ -0,0 +1,20 @@
+"""Tests for the benchmark harness (not the benchmarks themselves)."""
+from benchmarks import compare, load_baseline, measure, save_baseline
+
+def test_measure_runs_setup_before_each_timed_call():
+    """Test that each repetition gets a fresh setup and only the returned callable is timed."""
+    calls = []
+    def setup():
+        calls.append("setup")
+        return lambda: calls.append("run")
+    assert measure(setup, repeat=2) >= 0
+    assert calls == ["setup", "run", "setup", "run"]
+
+def test_baseline_round_trip_and_compare(tmp_path):
+    """Test that stored baselines merge and that slowdowns past the threshold are flagged."""
+    path = str(tmp_path / "baseline.json")
+    save_baseline({"fast": 1.0, "slow": 2.0}, path)
+    save_baseline({"slow": 1.0}, path)
+    assert load_baseline(path) == {"fast": 1.0, "slow": 1.0}
+    rows = compare({"fast": 1.1, "slow": 1.5, "new": 9.0}, load_baseline(path), threshold=0.2)
+    assert [(name, regressed) for name, _, _, _, regressed in rows] == [("fast", False), ("slow", True)]
@@ -0,0 +1,49 @@
+"""Tests for the parallel bulk job runner."""
+import io
+import orjson
+import pytest
+from calculator import Calculator, DataFrameFacade
+from calculator.bulk import run_bulk
+
+def test_run_bulk_preserves_order_and_merges_history(tmp_path):
+    """Test that shards evaluated by several workers come back in input order."""
+    history_file = str(tmp_path / "bulk.csv")
+    calculator = Calculator()
+    calculator.data_frame_facade = DataFrameFacade(history_file)
+    requests = [{"op": "multiply", "a": i, "b": 2} for i in range(50)]
+    requests[7] = {"op": "divide", "a": 1, "b": 0}
+    requests[8] = {"op": "cube", "a": 1, "b": 2}
+    job_file = io.BytesIO(b"".join(orjson.dumps(request) + b"\n" for request in requests) + b"\nnot json\n")
+    output = io.BytesIO()
+    report = run_bulk(calculator, job_file, output, workers=2, shard_rows=6)
+    records = [orjson.loads(line) for line in output.getvalue().splitlines()]
+    assert [record["line"] for record in records] == list(range(1, 51)) + [52]
+    assert records[0] == {"line": 1, "command": "multiply", "result": 0.0}
+    assert records[7]["error"] == "Cannot divide by zero."
+    assert records[8]["error"] == "Unknown operation: cube"
+    assert records[49]["result"] == 98.0
+    assert "Invalid request" in records[50]["error"]
+    assert (report.rows, report.errors) == (51, 3)
+    saved = DataFrameFacade(history_file).history
+    assert len(saved) == 48
+    assert list(saved.column("id")) == list(range(48))
+    assert calculator.data_frame_facade.history_stats()["count"] == 48
+
+def test_run_bulk_power_errors_match_scalar_power(tmp_path):
+    """Test that powers without a finite real result report the scalar errors and are not saved."""
+    history_file = str(tmp_path / "bulk.csv")
+    calculator = Calculator()
+    calculator.data_frame_facade = DataFrameFacade(history_file)
+    requests = [{"op": "power", "a": -8, "b": 0.5}, {"op": "power", "a": 10, "b": 400},
+                {"op": "power", "a": 0, "b": -1}, {"op": "power", "a": 2, "b": 3}]
+    job_file = io.BytesIO(b"".join(orjson.dumps(request) + b"\n" for request in requests))
+    output = io.BytesIO()
+    report = run_bulk(calculator, job_file, output, workers=1)
+    records = [orjson.loads(line) for line in output.getvalue().splitlines()]
+    for record, request in zip(records[:3], requests):
+        with pytest.raises(ValueError) as raised:
+            calculator.power(float(request["a"]), float(request["b"]))
+        assert record["error"] == str(raised.value)
+    assert records[3]["result"] == 8.0
+    assert report.errors == 3
+    assert list(DataFrameFacade(history_file).history.column("result")) == [8.0]
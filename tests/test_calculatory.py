@@ -7,8 +7,10 @@ and DataFrameFacade classes, ensuring operations like addition, subtraction,
 history management, and persistence are working as expected.
 """
 import os  # Standard library imports
-import pytest  # Third-party imports
+import numpy as np  # Third-party imports
+import pytest
 from calculator import Calculator, DataFrameFacade  # Local application imports
+from calculator.history import render_entry
 
 
 # Helper function to reset the history file for test isolation
@@ -36,38 +38,104 @@ def test_add(calc_instance):
     """Test the addition functionality of the Calculator."""
     assert calc_instance.add(2, 3) == 5
     assert calc_instance.add(-1, 1) == 0
-    assert "Added 2 + 3 = 5" in calc_instance.show_history()
+    assert "Added 2.0 + 3.0 = 5.0" in calc_instance.show_history()
 
 def test_subtract(calc_instance):
     """Test the subtraction functionality of the Calculator."""
     assert calc_instance.subtract(5, 3) == 2
     assert calc_instance.subtract(-3, -2) == -1
-    assert "Subtracted 5 - 3 = 2" in calc_instance.show_history()
+    assert "Subtracted 5.0 - 3.0 = 2.0" in calc_instance.show_history()
 
 def test_multiply(calc_instance):
     """Test the multiplication functionality of the Calculator."""
     assert calc_instance.multiply(3, 4) == 12
     assert calc_instance.multiply(0, 10) == 0
-    assert "Multiplied 3 * 4 = 12" in calc_instance.show_history()
+    assert "Multiplied 3.0 * 4.0 = 12.0" in calc_instance.show_history()
 
 def test_divide(calc_instance):
     """Test the division functionality of the Calculator."""
     assert calc_instance.divide(10, 2) == 5
     assert calc_instance.divide(-10, 5) == -2
-    assert "Divided 10 / 2 = 5.0" in calc_instance.show_history()
+    assert "Divided 10.0 / 2.0 = 5.0" in calc_instance.show_history()
 
 def test_divide_by_zero(calc_instance):
     """Test that dividing by zero raises a ValueError."""
     with pytest.raises(ValueError, match="Cannot divide by zero."):
         calc_instance.divide(10, 0)
 
+def test_power_modulo_sqrt(calc_instance):
+    """Test the operations added through the command registry."""
+    assert calc_instance.execute("power", "2", "10") == 1024
+    assert calc_instance.execute("modulo", "-7", "3") == 2
+    assert calc_instance.execute("sqrt", "2.25") == 1.5
+    assert "Square root of 2.25 = 1.5" in calc_instance.show_history()
+    with pytest.raises(ValueError, match="square root of a negative"):
+        calc_instance.sqrt(-1)
+    with pytest.raises(ValueError, match="Cannot divide by zero."):
+        calc_instance.modulo(1, 0)
+
+def test_execute_validates_arguments(calc_instance, capsys):
+    """Test that argument schemas reject bad arity and types before the operation runs."""
+    assert calc_instance.execute("sqrt", "4", "9") is None
+    assert calc_instance.execute("add", "x", "1") is None
+    assert calc_instance.execute("no_such_operation") is None
+    output = capsys.readouterr().out
+    assert "Usage: sqrt A" in output and "A must be a number" in output
+    assert len(calc_instance.data_frame_facade.history) == 0
+
+def test_execute_batch(calc_instance):
+    """Test vectorized batch evaluation and its bulk history append."""
+    batch = calc_instance.execute_batch("multiply", [1, 2, 3], [4, 5, 6])
+    assert list(batch.results) == [4, 10, 18]
+    assert not batch.invalid.any()
+    assert len(calc_instance.data_frame_facade.history) == 3
+    assert "Multiplied 3.0 * 6.0 = 18.0" in calc_instance.show_history()
+
+def test_execute_batch_divide_by_zero(calc_instance):
+    """Test that batch division masks zero divisors instead of raising."""
+    batch = calc_instance.execute_batch("divide", np.array([6.0, 1.0, 8.0]), np.array([3.0, 0.0, 2.0]))
+    assert list(batch.invalid) == [False, True, False]
+    assert np.isnan(batch.results[1])
+    assert batch.results[0] == 2.0 and batch.results[2] == 4.0
+    assert len(calc_instance.data_frame_facade.history) == 2
+
+def test_execute_batch_power_without_real_result(calc_instance):
+    """Test that batch powers with no finite real result are masked like the scalar errors."""
+    batch = calc_instance.execute_batch("power", [2.0, -8.0, 10.0, 0.0], [3.0, 0.5, 400.0, -1.0])
+    assert list(batch.invalid) == [False, True, True, True]
+    assert batch.results[0] == 8.0 and np.isnan(batch.results[1:]).all()
+    assert list(calc_instance.data_frame_facade.history.column("result")) == [8.0]
+
+def test_execute_batch_sqrt(calc_instance):
+    """Test that batch square roots ignore b and mask negative operands like the scalar error."""
+    batch = calc_instance.execute_batch("sqrt", [4.0, -1.0, 9.0])
+    assert list(batch.invalid) == [False, True, False]
+    assert batch.results[0] == 2.0 and np.isnan(batch.results[1]) and batch.results[2] == 3.0
+    records = calc_instance.data_frame_facade.history.records
+    assert list(records["result"]) == [2.0, 3.0] and np.isnan(records["b"]).all()
+
 def test_show_history(calc_instance):
     """Test the history display functionality of the Calculator."""
     calc_instance.add(1, 2)
     calc_instance.multiply(3, 4)
     history = calc_instance.show_history()
-    assert "Added 1 + 2 = 3" in history
-    assert "Multiplied 3 * 4 = 12" in history
+    assert "Added 1.0 + 2.0 = 3.0" in history
+    assert "Multiplied 3.0 * 4.0 = 12.0" in history
+
+def test_history_views(calc_instance):
+    """Test streaming the history with the tail, page and range views."""
+    calc_instance.clear_history()
+    for i in range(5):
+        calc_instance.data_frame_facade.add_entry("add", i, 1, i + 1, timestamp=100.0 + i)
+    assert list(calc_instance.execute("history", "tail", "2")) == \
+        ["Added 3.0 + 1.0 = 4.0", "Added 4.0 + 1.0 = 5.0"]
+    assert list(calc_instance.execute("history", "page", "2", "2")) == \
+        ["Added 1.0 + 1.0 = 2.0", "Added 2.0 + 1.0 = 3.0"]
+    assert list(calc_instance.execute("history", "range", "100", "101")) == \
+        ["Added 0.0 + 1.0 = 1.0", "Added 1.0 + 1.0 = 2.0"]
+    assert list(calc_instance.execute("history", "page", "9", "2")) == ["No history available."]
+    assert len(list(calc_instance.execute("history"))) == 5
+    assert calc_instance.execute("history", "tail", "x") is None
 
 def test_clear_history(calc_instance):
     """Test clearing the history in the Calculator."""
@@ -79,8 +147,8 @@ def test_delete_history_record(calc_instance):
     """Test deleting a specific history record in the Calculator."""
     calc_instance.add(1, 1)
     calc_instance.add(2, 2)
-    assert calc_instance.delete_history_record(1) == "Deleted record: Added 2 + 2 = 4"
-    assert "Added 2 + 2 = 4" not in calc_instance.show_history()
+    assert calc_instance.delete_history_record(1) == "Deleted record: Added 2.0 + 2.0 = 4.0"
+    assert "Added 2.0 + 2.0 = 4.0" not in calc_instance.show_history()
 
 def test_delete_invalid_index(calc_instance):
     """Test attempting to delete an invalid history record index."""
@@ -96,44 +164,154 @@ def test_save_and_load_history(calc_instance):
     # Create a new instance to test loading
     new_calc = Calculator()
     loaded_history = new_calc.load_history()
-    assert "Added 5 + 5 = 10" in loaded_history
+    assert "Added 5.0 + 5.0 = 10.0" in loaded_history
 
 ### Tests for the DataFrameFacade class ###
 
 def test_add_entry(data_frame_facade_instance):
     """Test adding an entry to the history via DataFrameFacade."""
-    data_frame_facade_instance.add_entry("Test Entry")
-    assert "Test Entry" in data_frame_facade_instance.show_history()
+    data_frame_facade_instance.add_entry("add", 1, 2, 3)
+    assert "Added 1.0 + 2.0 = 3.0" in data_frame_facade_instance.show_history()
+
+def test_add_entry_typed_columns(data_frame_facade_instance):
+    """Test that entries are stored as typed columns and kept in order."""
+    for i in range(1000):
+        data_frame_facade_instance.add_entry("add", i, 1, i + 1)
+    history = data_frame_facade_instance.history
+    assert len(history) == 1000
+    assert history.column("operation").dtype == np.int8
+    assert history.column("result").dtype == np.float64
+    assert history.column("a")[0] == 0
+    assert history.column("result")[-1] == 1000
+
+def test_load_legacy_history(data_frame_facade_instance):
+    """Test that the legacy "Calculation" text format is migrated on load."""
+    with open("calcHistory.csv", "w", encoding="utf-8") as history_file:
+        history_file.write("Calculation\nAdded 4.0 + 1.0 = 5.0\nDivided 9.0 / 3.0 = 3.0\n")
+    history_df = data_frame_facade_instance.load_history()
+    assert list(history_df["operation"]) == ["add", "divide"]
+    assert list(history_df["result"]) == [5.0, 3.0]
+    assert "Added 4.0 + 1.0 = 5.0" in data_frame_facade_instance.show_history()
 
 def test_save_history(data_frame_facade_instance):
     """Test saving the history via DataFrameFacade."""
-    data_frame_facade_instance.add_entry("Entry to Save")
+    data_frame_facade_instance.add_entry("subtract", 5, 3, 2)
     data_frame_facade_instance.save_history()
     assert os.path.exists("calcHistory.csv")
 
 def test_load_history(data_frame_facade_instance):
     """Test loading history entries via DataFrameFacade."""
-    data_frame_facade_instance.add_entry("Entry to Load")
+    data_frame_facade_instance.add_entry("multiply", 2, 4, 8)
     data_frame_facade_instance.save_history()
 
     new_facade = DataFrameFacade()
-    assert "Entry to Load" in new_facade.show_history()
+    assert "Multiplied 2.0 * 4.0 = 8.0" in new_facade.show_history()
 
 def test_clear_history_facade(data_frame_facade_instance):
     """Test clearing the history via DataFrameFacade."""
-    data_frame_facade_instance.add_entry("Clear This Entry")
+    data_frame_facade_instance.add_entry("add", 1, 1, 2)
     data_frame_facade_instance.clear_history()
     assert data_frame_facade_instance.show_history() == "No history available."
 
 
 def test_delete_entry(data_frame_facade_instance):
     """Test deleting an entry in the history via DataFrameFacade."""
-    data_frame_facade_instance.add_entry("Delete Me")
-    assert data_frame_facade_instance.delete_entry(0) == "Deleted record: Delete Me"
+    data_frame_facade_instance.add_entry("divide", 9, 3, 3)
+    assert data_frame_facade_instance.delete_entry(0) == "Deleted record: Divided 9.0 / 3.0 = 3.0"
     assert data_frame_facade_instance.show_history() == "No history available."
 
 def test_delete_invalid_entry(data_frame_facade_instance):
     """Test attempting to delete a non-existent entry in the history."""
     assert data_frame_facade_instance.delete_entry(5) == "Invalid index. No record deleted."
 
+def test_delete_entry_appends_tombstone():
+    """Test that deleting a saved record appends a tombstone instead of rewriting the log."""
+    reset_history_file()
+    facade = DataFrameFacade(compact_ratio=1.0)
+    for i in range(4):
+        facade.add_entry("add", i, i, 2 * i)
+    facade.save_history()
+    facade.delete_entry(1)
+    with open("calcHistory.csv", encoding="utf-8") as history_file:
+        lines = history_file.read().splitlines()
+    assert len(lines) == 6  # Header, four records and one tombstone
+    assert lines[-1].startswith("1,delete,")
+    replayed = DataFrameFacade()
+    assert list(replayed.history.column("id")) == [0, 2, 3]
+    assert "Added 1.0 + 1.0 = 2.0" not in replayed.show_history()
+
+def test_compact_history_drops_tombstones():
+    """Test that compaction rewrites the log with only live records."""
+    reset_history_file()
+    facade = DataFrameFacade(compact_ratio=1.0)
+    for i in range(3):
+        facade.add_entry("multiply", i, 2, 2 * i)
+    facade.save_history()
+    facade.delete_entry(0)
+    assert facade.compact_history() == 2
+    with open("calcHistory.csv", encoding="utf-8") as history_file:
+        assert "delete" not in history_file.read()
+    assert list(DataFrameFacade().history.column("id")) == [1, 2]
+
+def test_binary_history_file(tmp_path):
+    """Test the memory-mapped binary history format, in-place deletes and CSV export."""
+    history_file = str(tmp_path / "history.bin")
+    facade = DataFrameFacade(history_file, compact_ratio=1.0)
+    for i in range(5):
+        facade.add_entry("add", i, 10, i + 10)
+    facade.save_history()
+    size = os.path.getsize(history_file)
+    reopened = DataFrameFacade(history_file, compact_ratio=1.0)
+    assert isinstance(reopened.history.records, np.memmap)
+    assert reopened.delete_entry(2) == "Deleted record: Added 2.0 + 10.0 = 12.0"
+    assert os.path.getsize(history_file) == size  # Deleted in place, nothing appended
+    assert list(DataFrameFacade(history_file).history.column("id")) == [0, 1, 3, 4]
+    reopened.add_entry("divide", 1, 4, 0.25)
+    reopened.save_history()
+    assert list(DataFrameFacade(history_file).history.column("result")) == [10, 11, 13, 14, 0.25]
+    export_file = tmp_path / "export.csv"
+    reopened.export_history(str(export_file))
+    assert export_file.read_text().splitlines()[0] == "id,operation,a,b,result,timestamp"
+    assert reopened.compact_history() == 5
+
+def test_history_stats_incremental(data_frame_facade_instance):
+    """Test that aggregates follow appends and deletes without a rescan."""
+    facade = data_frame_facade_instance
+    facade.add_entry("add", 1, 1, 2)
+    assert facade.history_stats()["count"] == 1
+    facade.add_entry("multiply", 3, 4, 12)
+    facade.add_entries("subtract", [5, 9], [1, 1], [4, 8])
+    stats = facade.history_stats()
+    assert stats["counts"] == {"add": 1, "subtract": 2, "multiply": 1, "divide": 0,
+                              "power": 0, "modulo": 0, "sqrt": 0}
+    assert (stats["sum"], stats["min"], stats["max"], stats["mean"]) == (26, 2, 12, 6.5)
+    facade.delete_entry(1)  # Removes the maximum
+    stats = facade.history_stats()
+    assert (stats["count"], stats["sum"], stats["max"]) == (3, 14, 8)
+
+def test_history_stats_time_window(calc_instance):
+    """Test summaries restricted to a time window."""
+    facade = calc_instance.data_frame_facade
+    facade.add_entry("add", 1, 1, 2, timestamp=100.0)
+    facade.add_entry("add", 2, 2, 4, timestamp=200.0)
+    facade.add_entry("divide", 9, 3, 3, timestamp=300.0)
+    window = facade.history_window(150, 300)
+    assert (window["count"], window["sum"]) == (2, 7)
+    text = calc_instance.execute("history_stats", "1970-01-01T00:02:30+00:00", "250")
+    assert text.startswith("Calculations: 1 (add: 1,")
+
+@pytest.mark.parametrize("window", [("abc",), ("2024-13-01", "250")])
+def test_history_stats_bad_window(calc_instance, capsys, window):
+    """Test that an unparsable window prints the usage line instead of raising."""
+    assert calc_instance.execute("history_stats", *window) is None
+    assert "Error: Usage: history_stats [SECONDS | FROM TO]" in capsys.readouterr().out
+
 # pylint: disable=redefined-outer-name
+
+def test_render_entry_rejects_unknown_operations():
+    """Test that a record with an unknown operation code is not rendered as another operation."""
+    assert render_entry(3, 9, 3, 3) == "Divided 9.0 / 3.0 = 3.0"
+    with pytest.raises(ValueError, match="Unknown operation"):
+        render_entry(-1, 0, 0, 0)
+    with pytest.raises(ValueError, match="Unknown operation"):
+        render_entry("cube", 2, 0, 8)
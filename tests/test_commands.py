@@ -0,0 +1,109 @@
+"""Tests for lazy plugin discovery, argument schemas, memoization and the CommandsFactory registry."""
+import json
+import time
+import pytest
+from commands import (ArgumentError, ArgumentSchema, CachePolicy, Command, CommandsFactory, LazyCommand,
+                      OperationCommand, OutputCache, discover_plugins, operation, operation_commands)
+
+def test_import_plugins_defers_loading(capfd):
+    """Test that plugins are registered by name and only instantiated on first execution."""
+    factory = CommandsFactory()
+    factory.import_plugins("plugins")
+    assert {"csv", "greet", "random_quote"} <= set(factory.all_plugins())
+    greet = factory.commands["greet"]
+    assert isinstance(greet, LazyCommand)
+    assert greet._command is None  # pylint: disable=protected-access
+    greet.execute()
+    assert "Hello World" in capfd.readouterr().out
+    assert greet.load().__class__.__name__ == "Greet"
+
+def test_discover_plugins_uses_manifest(tmp_path):
+    """Test that discovery scans sources once and reuses the manifest for unchanged files."""
+    (tmp_path / "hello.py").write_text("from commands import Command\nclass Hello(Command):\n    pass\n")
+    (tmp_path / "helper.py").write_text("def helper():\n    return 1\n")
+    (tmp_path / "_private.py").write_text("class Hidden(Command):\n    pass\n")
+    assert list(discover_plugins(str(tmp_path))) == ["hello"]
+    manifest = json.loads((tmp_path / ".plugin_manifest.json").read_text())
+    assert set(manifest) == {"hello.py", "helper.py"}
+    manifest["helper.py"][2] = True  # A cached entry for an unchanged file is trusted
+    (tmp_path / ".plugin_manifest.json").write_text(json.dumps(manifest))
+    assert list(discover_plugins(str(tmp_path))) == ["hello", "helper"]
+
+def test_plugin_attributes_are_read_without_importing(tmp_path):
+    """Test that literal max_concurrency and cache_policy come from the source scan, not an import."""
+    (tmp_path / "broken.py").write_text(
+        "from commands import CachePolicy, Command\nraise RuntimeError('imported')\n"
+        "class Broken(Command):\n    max_concurrency = 2\n"
+        "    cache_policy = CachePolicy(env=('HOME',), ttl=5)\n")
+    declared = discover_plugins(str(tmp_path))["broken"]
+    assert declared == {"max_concurrency": 2, "cache_policy": {"args": [], "kwargs": {"env": ["HOME"], "ttl": 5}}}
+    command = LazyCommand("nowhere", "broken", declared)
+    assert command.attribute("max_concurrency") == 2
+    assert command.attribute("cache_policy").key("broken", ()) is not None
+    assert command.attribute("missing", 7) == 7
+
+def test_argument_schema_parse():
+    """Test arity checks, type conversion, optional arguments and free text."""
+    schema = ArgumentSchema(("index", int), optional=(("path", str),))
+    assert schema.parse("cmd", ["3"]) == (3,)
+    assert schema.parse("cmd", ["3", "out.csv"]) == (3, "out.csv")
+    with pytest.raises(ArgumentError, match=r"Usage: cmd INDEX \[PATH\]"):
+        schema.parse("cmd", [])
+    with pytest.raises(ArgumentError, match="INDEX must be an integer"):
+        schema.parse("cmd", ["x"])
+    assert ArgumentSchema(("expression", str), rest=True).parse("eval", ["1", "+", "2"]) == ("1 + 2",)
+
+def test_operation_commands_share_the_registry():
+    """Test that @operation methods become registered commands that are not listed as plugins."""
+    class Doubler:
+        """A tiny object exposing one operation."""
+        @operation(("x", float), name="double")
+        def twice(self, x):
+            """Return 2x."""
+            return 2 * x
+    commands = operation_commands(Doubler())
+    assert isinstance(commands["double"], OperationCommand)
+    assert commands["double"].execute("4") == 8.0
+    factory = CommandsFactory()
+    factory.register_commands(commands)
+    assert "double" in factory.commands and "double" not in factory.all_plugins()
+    del factory.commands["double"]
+
+def test_execute_command_memoizes_cacheable_plugins(tmp_path, capsys):
+    """Test that cached output is replayed until an input file changes, and skipped subcommands run."""
+    data_file = tmp_path / "data.txt"
+    data_file.write_text("one")
+    runs = []
+    class Echo(Command):
+        """A plugin that prints the contents of a file."""
+        cache_policy = CachePolicy(files=(str(data_file),), skip=("refresh",))
+        def execute(self, *args):
+            runs.append(args)
+            print(data_file.read_text(), *args)
+    factory = CommandsFactory()
+    factory.create_plugin("echo_file", Echo())
+    factory.cache.clear()
+    for _ in range(3):
+        factory.execute_command("echo_file", "x")
+    data_file.write_text("two!")
+    factory.execute_command("echo_file", "x")
+    factory.execute_command("echo_file", "refresh")
+    factory.execute_command("echo_file", "refresh")
+    del factory.commands["echo_file"]
+    assert capsys.readouterr().out.splitlines() == ["one x"] * 3 + ["two! x", "two! refresh", "two! refresh"]
+    assert runs == [("x",), ("x",), ("refresh",), ("refresh",)]
+    assert factory.cache.counts["echo_file"] == [2, 2]
+    assert "echo_file 2 hits / 2 misses" in factory.cache.report()
+
+def test_output_cache_lru_and_ttl(monkeypatch):
+    """Test eviction of the least recently used entry and expiry after the TTL."""
+    cache = OutputCache(maxsize=2)
+    cache.put(("a",), "A")
+    cache.put(("b",), "B")
+    assert cache.get(("a",)) == "A"
+    cache.put(("c",), "C")
+    assert cache.get(("b",)) is None and cache.get(("a",)) == "A"
+    now = time.monotonic()
+    cache.put(("d",), "D", ttl=10)
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+    assert cache.get(("d",)) is None
@@ -0,0 +1,50 @@
+"""Tests for the expression compiler and the Calculator eval command."""
+import numpy as np
+import pytest
+from calculator import Calculator
+from calculator.expression import ExpressionError, compile_expression
+
+def test_compile_expression_evaluates():
+    """Test evaluating a compound expression with precedence and parentheses."""
+    assert compile_expression("(3 + 4) * 2 / 7").evaluate() == 2.0
+    assert compile_expression("-2 ** 2 + 7 % 4").evaluate() == -1
+
+def test_compile_expression_is_cached():
+    """Test that repeated formulas reuse the compiled expression."""
+    first = compile_expression("x * y + 1")
+    assert compile_expression("x * y + 1") is first
+    assert first.evaluate({"x": 2, "y": 3}) == 7
+    assert first.evaluate({"x": 4, "y": 5}) == 21
+
+def test_compile_expression_over_arrays():
+    """Test that compiled expressions evaluate element-wise over NumPy arrays."""
+    result = compile_expression("(a + b) / 2").evaluate({"a": np.array([1.0, 3.0]), "b": np.array([3.0, 5.0])})
+    assert list(result) == [2.0, 4.0]
+
+@pytest.mark.parametrize("source", ["__import__('os')", "x.y", "'text'", "1 +", "[1, 2]"])
+def test_compile_expression_rejects_unsafe_syntax(source):
+    """Test that anything beyond arithmetic is rejected."""
+    with pytest.raises(ExpressionError):
+        compile_expression(source)
+
+def test_evaluate_errors():
+    """Test undefined variables and division by zero."""
+    with pytest.raises(ExpressionError, match="Undefined variable"):
+        compile_expression("z + 1").evaluate()
+    with pytest.raises(ExpressionError, match="Division by zero"):
+        compile_expression("1 / 0").evaluate()
+
+@pytest.mark.parametrize("source, message", [
+    ("9 ** 9 ** 9", "too large"), ("10.0 ** 400", "too large"), ("1" + "0" * 400, "too large"),
+    ("(-8) ** 0.5", "not a real number"), ("(-8) ** 0.5 % 2", "not a real number")])
+def test_evaluate_rejects_huge_and_complex_results(source, message):
+    """Test that integer powers cannot grow unbounded and non-real results are rejected."""
+    with pytest.raises(ExpressionError, match=message):
+        compile_expression(source).evaluate()
+
+def test_calculator_eval_uses_last_result():
+    """Test the eval command and the "_" variable holding the last result."""
+    calculator = Calculator()
+    calculator.add(2, 3)
+    assert calculator.execute("eval", "_", "*", "2") == 10.0
+    assert calculator.execute("eval", "(_ + 2) / 4") == 3.0
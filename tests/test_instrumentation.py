@@ -0,0 +1,41 @@
+"""Tests for per-command latency instrumentation."""
+import json
+import os
+from app import App
+from instrumentation import CommandMetrics, LatencyHistogram
+
+def test_histogram_percentiles():
+    """Test that percentiles land within one bucket of the true value."""
+    histogram = LatencyHistogram()
+    for millisecond in range(1, 101):
+        histogram.record(millisecond / 1000)
+    summary = histogram.summary()
+    assert summary["count"] == 100
+    assert 0.050 <= summary["p50"] <= 0.050 * 1.13
+    assert 0.095 <= summary["p95"] <= 0.095 * 1.13
+    assert summary["p99"] <= summary["max"] == 0.1
+
+def test_phases_are_recorded_under_the_current_command(tmp_path):
+    """Test that nested phases are attributed to the enclosing command and exported."""
+    metrics = CommandMetrics()
+    with metrics.command("add"):
+        with metrics.phase("history"):
+            pass
+    with metrics.phase("logging"):
+        pass  # No command running: not recorded
+    assert [(command, phase) for command, phase, _ in metrics.summaries()] == [("add", "total"), ("add", "history")]
+    path = metrics.export(str(tmp_path / "stats.json"))
+    with open(path, encoding="utf-8") as export_file:
+        assert json.load(export_file)["commands"][0]["count"] == 1
+
+def test_stats_command_in_script_mode(tmp_path, monkeypatch):
+    """Test that script commands are timed, shown by `stats` and profiled when enabled."""
+    monkeypatch.setenv("PROFILE_COMMANDS", "1")
+    monkeypatch.setenv("PROFILE_DIR", str(tmp_path))
+    app = App()
+    app.load_plugins()
+    app.stats_command("reset")
+    records = list(app.dispatch_commands(app.parse_commands(["multiply 6 7", "greet", "stats"])))
+    report = records[-1]["output"]
+    assert "multiply" in report and "history" in report and "greet" in report
+    assert any(name.endswith("-multiply.prof") for name in os.listdir(tmp_path))
@@ -6,7 +6,9 @@ generic exception handling.
 """
 import logging
 import pandas as pd
+import pytest
 from plugins.csv import Csv
+from plugins._csv_query import load_index, parse_query, run_query
 
 # Test case for successfully reading the CSV file
 def test_data_plugin_execute_success(monkeypatch, capfd, caplog, tmpdir):
@@ -71,3 +73,107 @@ def test_data_plugin_execute_exception(monkeypatch, capfd, caplog):
 
         # Verify the log output
         assert "Error reading CSV file /" in caplog.text
+def write_numbers_csv(path, rows):
+    """Write a CSV with a single Number column holding 0..rows-1."""
+    pd.DataFrame({"Number": range(rows)}).to_csv(path, index=False)
+
+def test_data_plugin_pages(monkeypatch, capfd, tmpdir):
+    """Test that output is paged instead of rendering the whole file."""
+    test_csv = tmpdir.join("numbers.csv")
+    write_numbers_csv(test_csv, 50)
+    monkeypatch.setenv("PRODUCT_FILE_PATH", str(test_csv))
+    Csv.execute()
+    out, _ = capfd.readouterr()
+    assert len(out.splitlines()) == 21  # Header plus the default page of 20 rows
+    Csv.execute("head", "3")
+    out, _ = capfd.readouterr()
+    assert out.split() == ["Number", "0", "0", "1", "1", "2", "2"]
+    Csv.execute("page", "3", "10")
+    out, _ = capfd.readouterr()
+    assert out.split()[1:3] == ["20", "20"]
+    Csv.execute("page", "x")
+    out, _ = capfd.readouterr()
+    assert "Usage: csv" in out
+
+@pytest.mark.parametrize("args", [("head", "-2"), ("head", "0"), ("page", "-1", "2"), ("page", "0"), ("page", "2", "0")])
+def test_data_plugin_rejects_non_positive_pages(monkeypatch, capfd, tmpdir, args):
+    """Test that row counts, page numbers and page sizes below 1 print the usage line."""
+    test_csv = tmpdir.join("numbers.csv")
+    write_numbers_csv(test_csv, 50)
+    monkeypatch.setenv("PRODUCT_FILE_PATH", str(test_csv))
+    Csv.execute(*args)
+    assert capfd.readouterr()[0].strip() == "Usage: csv [head N | page K [SIZE]]"
+
+def test_data_plugin_caches_until_file_changes(tmpdir):
+    """Test that the parsed frame is reused until the file's mtime or size changes."""
+    test_csv = tmpdir.join("cached.csv")
+    write_numbers_csv(test_csv, 5)
+    first = Csv.load(str(test_csv))
+    assert Csv.load(str(test_csv)) is first
+    write_numbers_csv(test_csv, 500)
+    assert len(Csv.load(str(test_csv))) == 500
+
+def test_data_plugin_streams_large_files(monkeypatch, tmpdir):
+    """Test that files over the memory budget are read in chunks without caching."""
+    test_csv = tmpdir.join("large.csv")
+    write_numbers_csv(test_csv, 1000)
+    monkeypatch.setenv("CSV_MEMORY_BUDGET", "100")
+    monkeypatch.setattr("plugins.csv.CHUNK_ROWS", 64)
+    rows = Csv.read_rows(str(test_csv), 190, 20)
+    assert list(rows["Number"]) == list(range(190, 210))
+    assert str(test_csv) not in Csv._cache  # pylint: disable=protected-access
+def write_products_csv(path):
+    """Write a small product file for query tests."""
+    pd.DataFrame({
+        "ProductID": [1, 2, 3, 4],
+        "Category": ["Widgets", "Gadgets", "Gadgets", "Widgets"],
+        "Price": [10.0, 20.0, 30.0, 40.0],
+        "Stock": [1, 2, 3, 4],
+    }).to_csv(path, index=False)
+
+def test_data_plugin_query_aggregates(monkeypatch, capfd, tmpdir):
+    """Test filter, group-by and aggregate queries."""
+    test_csv = tmpdir.join("products.csv")
+    write_products_csv(test_csv)
+    monkeypatch.setenv("PRODUCT_FILE_PATH", str(test_csv))
+    Csv.execute("where", "Category=Gadgets", "sum", "Price*Stock")
+    out, _ = capfd.readouterr()
+    assert "sum(Price*Stock) = 130.0" in out
+    Csv.execute("where", "Price>15", "and", "Stock<4", "count")
+    out, _ = capfd.readouterr()
+    assert "count() = 2" in out
+    Csv.execute("group", "Category", "max", "Price")
+    out, _ = capfd.readouterr()
+    assert "Gadgets" in out and "30.0" in out and "40.0" in out
+    Csv.execute("where", "Category")
+    out, _ = capfd.readouterr()
+    assert "Error: Invalid condition: Category" in out
+
+def test_data_plugin_query_uses_index(monkeypatch, capfd, tmpdir):
+    """Test that an index is built once and used for equality conditions until the file changes."""
+    test_csv = tmpdir.join("products.csv")
+    write_products_csv(test_csv)
+    monkeypatch.setenv("PRODUCT_FILE_PATH", str(test_csv))
+    Csv.execute("index", "Category")
+    assert "2 distinct values" in capfd.readouterr()[0]
+    assert len(load_index(str(test_csv), "Category").lookup("Widgets")) == 2
+    rows = run_query(str(test_csv), parse_query(["where", "Category=Widgets"]))
+    assert list(rows["ProductID"]) == [1, 4]
+    with open(test_csv, "a", encoding="utf-8") as product_file:
+        product_file.write("5,Widgets,50.0,5\n")
+    assert load_index(str(test_csv), "Category") is None
+    Csv.execute("where", "Category=Widgets", "sum", "Stock")
+    assert "sum(Stock) = 10" in capfd.readouterr()[0]
+
+def test_index_matches_a_full_scan_in_the_column_type(monkeypatch, capfd, tmpdir):
+    """Test that numeric columns are indexed by value, so an index never changes a query's answer."""
+    test_csv = tmpdir.join("products.csv")
+    write_products_csv(test_csv)
+    monkeypatch.setenv("PRODUCT_FILE_PATH", str(test_csv))
+    queries = [["where", "ProductID=1.0", "count"], ["where", "Price=20.000", "count"],
+               ["where", "Category=Gadgets", "count"], ["where", "Stock=7", "count"]]
+    scanned = [run_query(str(test_csv), parse_query(query)) for query in queries]
+    for column in ("ProductID", "Price", "Category", "Stock"):
+        Csv.execute("index", column)
+    capfd.readouterr()
+    assert [run_query(str(test_csv), parse_query(query)) for query in queries] == scanned == [1, 1, 2, 0]
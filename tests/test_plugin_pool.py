@@ -0,0 +1,93 @@
+"""Tests for the plugin worker pool and the REPL's background jobs."""
+import sys
+import threading
+import time
+import pytest
+from app import App
+from commands import Command, CommandsFactory
+from commands.pool import PluginPool, PluginTimeout, ThreadLocalStdout
+
+class Slow(Command):
+    """A plugin that blocks until released."""
+    max_concurrency = 1
+    def __init__(self):
+        self.release = threading.Event()
+    def execute(self, *args):
+        self.release.wait(5)
+        print("slow", *args)
+
+@pytest.fixture
+def slow_plugin():
+    """Register the blocking plugin for one test."""
+    factory = CommandsFactory()
+    plugin = Slow()
+    factory.create_plugin("slow", plugin)
+    yield plugin
+    plugin.release.set()
+    del factory.commands["slow"]
+
+def test_thread_pool_limits_cancels_and_times_out(slow_plugin):
+    """Test per-plugin concurrency, cancelling a queued job and the timeout of a running one."""
+    pool = PluginPool(workers=4, timeout=0.3)
+    first, second, third = (pool.submit("slow", str(i)) for i in range(3))
+    assert (first.status, second.status, third.status) == ("running", "queued", "queued")
+    assert pool.cancel(second)
+    with pytest.raises(PluginTimeout):
+        first.future.result(timeout=5)
+    assert first.status == "timed out"
+    slow_plugin.release.set()  # The abandoned thread returns and hands its slot to the third job
+    assert third.future.result(timeout=5) == "slow 2\n"
+    assert second.future.cancelled()
+    pool.shutdown()
+
+def test_process_pool_runs_and_terminates_children():
+    """Test that process-mode jobs print through a child, use the parent's cache and are killed on timeout."""
+    factory = CommandsFactory()
+    factory.import_plugins("plugins")
+    factory.cache.clear()
+    pool = PluginPool(kind="process", workers=2, timeout=30)
+    assert pool.submit("greet").future.result(timeout=30) == "Hello World\n"
+    assert pool.submit("greet").future.result(timeout=30) == "Hello World\n"
+    assert factory.cache.counts["greet"] == [1, 1]  # One hit, one miss
+    factory.cache.clear()
+    pool.timeout = 0.001
+    job = pool.submit("greet")
+    with pytest.raises(PluginTimeout):
+        job.future.result(timeout=30)
+    time.sleep(0.1)
+    assert job.process is None or not job.process.is_alive()
+    pool.shutdown()
+
+def test_thread_pool_swaps_stdout_only_while_jobs_run(slow_plugin):
+    """Test that the capturing stdout is installed for running thread jobs only, and keeps fileno."""
+    real_stdout = sys.stdout
+    pool = PluginPool(workers=2, timeout=None)
+    assert sys.stdout is real_stdout
+    job = pool.submit("slow", "x")
+    assert isinstance(sys.stdout, ThreadLocalStdout)
+    assert sys.stdout.encoding == real_stdout.encoding
+    slow_plugin.release.set()
+    assert job.future.result(timeout=5) == "slow x\n"
+    assert sys.stdout is real_stdout
+    pool.shutdown()
+
+def test_finished_jobs_are_forgotten_beyond_the_history():
+    """Test that only the latest finished jobs stay listed, so the pool does not grow forever."""
+    CommandsFactory().import_plugins("plugins")
+    pool = PluginPool(workers=2, history=5)
+    jobs = [pool.submit("greet") for _ in range(50)]
+    assert all(job.future.result(timeout=5) == "Hello World\n" for job in jobs)
+    assert len(pool.jobs) == 5
+    pool.shutdown()
+
+def test_repl_background_jobs(monkeypatch, capsys):
+    """Test running a plugin with "&", listing it with jobs and collecting it with wait."""
+    inputs = iter(["greet &", "jobs", "wait 1", "cancel 1", "exit"])
+    monkeypatch.setattr('builtins.input', lambda _: next(inputs))
+    app = App()
+    with pytest.raises(SystemExit):
+        app.start()
+    output = capsys.readouterr().out
+    assert "[1] greet running in the background." in output
+    assert "[1] " in output and "Hello World" in output
+    assert "[1] greet already finished." in output
@@ -0,0 +1,125 @@
+"""Tests for the asyncio server mode."""
+import asyncio
+import logging
+import orjson
+from aiohttp.test_utils import TestClient, TestServer
+from app import App
+from calculator import DataFrameFacade
+from server import CalculatorServer
+
+def make_server(tmp_path, flush_interval=0.05):
+    """Return a server whose history goes to a temporary log."""
+    app = App()
+    app.load_plugins()
+    app.calculator.data_frame_facade = DataFrameFacade(str(tmp_path / "h.csv"))
+    return CalculatorServer(app, flush_interval=flush_interval)
+
+def test_http_commands_and_plugins(tmp_path):
+    """Test calculator and plugin commands over HTTP, including a concurrent list of requests."""
+    server = make_server(tmp_path)
+
+    async def scenario():
+        async with TestClient(TestServer(server.web_app())) as client:
+            response = await client.post("/command", json={"command": "add", "args": [2, 3]})
+            assert await response.json() == {"command": "add", "result": 5.0}
+            response = await client.post("/command", json=[
+                {"command": "greet"}, {"command": "divide", "args": [1, 0]}, {"command": "nope"}])
+            greet, divide, unknown = await response.json()
+            assert "Hello" in greet["output"]
+            assert divide["error"] == "Cannot divide by zero."
+            assert unknown["error"] == "No such command: nope"
+            response = await client.get("/commands")
+            assert "greet" in (await response.json())["plugins"]
+
+    asyncio.run(scenario())
+
+def test_history_writes_are_batched(tmp_path):
+    """Test that calculations are appended together and save_history waits for the flush."""
+    server = make_server(tmp_path, flush_interval=3600)
+    facade = server.app.calculator.data_frame_facade
+
+    async def scenario():
+        await server.start()
+        await asyncio.gather(*(server.dispatch("multiply", [i, 2]) for i in range(5)))
+        assert facade.store.rows == 0
+        save = asyncio.create_task(server.dispatch("save_history", []))
+        await asyncio.sleep(0)
+        assert not save.done()
+        await server.flush_history()
+        assert (await save)["result"] == "History saved."
+        assert facade.store.rows == 5
+        await server.close()
+
+    asyncio.run(scenario())
+
+def test_idle_flushes_do_not_log(tmp_path, caplog):
+    """Test that the periodic flush logs a save only when it wrote something."""
+    server = make_server(tmp_path, flush_interval=3600)
+
+    async def scenario():
+        await server.flush_history()
+        await server.flush_history()
+        assert "History saved" not in caplog.text
+        await server.dispatch("add", [1, 2])
+        await server.flush_history()
+        assert caplog.text.count("History saved") == 1
+
+    logging.getLogger().addHandler(caplog.handler)  # App() replaced the root handlers
+    try:
+        with caplog.at_level(logging.INFO):
+            asyncio.run(scenario())
+    finally:
+        logging.getLogger().removeHandler(caplog.handler)
+
+def test_history_commands_run_off_the_event_loop(tmp_path, monkeypatch):
+    """Test that history file commands and the batched flush run on worker threads."""
+    server = make_server(tmp_path, flush_interval=3600)
+    facade = server.app.calculator.data_frame_facade
+    loop_threads = []
+    for method in ("flush_changes", "export_history"):
+        original = getattr(facade, method)
+        def spy(*args, original=original):
+            loop_threads.append(_running_loop_here())
+            return original(*args)
+        monkeypatch.setattr(facade, method, spy)
+
+    async def scenario():
+        await server.start()
+        await server.dispatch("add", [1, 2])
+        await server.flush_history()
+        record = await server.dispatch("export_history", [str(tmp_path / "export.csv")])
+        assert record["result"].startswith("History exported")
+        assert (await server.dispatch("history", ["tail", "1"]))["lines"] == ["Added 1.0 + 2.0 = 3.0"]
+        await server.close()
+
+    asyncio.run(scenario())
+    assert loop_threads and not any(loop_threads)
+
+def _running_loop_here():
+    """Return True if the calling thread is running an event loop."""
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+def test_line_delimited_tcp(tmp_path):
+    """Test plain-text and JSON commands over the line-delimited TCP protocol."""
+    server = make_server(tmp_path)
+
+    async def scenario():
+        await server.start()
+        tcp_server = await asyncio.start_server(server.handle_stream, "127.0.0.1", 0)
+        port = tcp_server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b'subtract 9 4\n{"command": "greet"}\n')
+        first = orjson.loads(await reader.readline())
+        second = orjson.loads(await reader.readline())
+        writer.close()
+        tcp_server.close()
+        await tcp_server.wait_closed()
+        await server.close()
+        assert first == {"command": "subtract", "result": 5.0}
+        assert "Hello" in second["output"]
+
+    asyncio.run(scenario())